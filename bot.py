@@ -7,23 +7,9 @@ from discord.ext import commands
 from dotenv import load_dotenv
 
 from helpers.SimplePointsManager import PointsManagerSingleton
+from helpers.WebServer import WebServer
 from cogs import EXTENSIONS
 
-from aiohttp import web
-
-
-async def handler(request: web.Request) -> web.Response:
-    return web.Response(text="Hello world")
-
-
-async def init_app() -> web.Application:
-    app = web.Application()
-    app.add_routes([web.get("/", handler)])
-    return app
-
-
-web.run_app(init_app())
-
 intents = discord.Intents.default()
 
 
@@ -90,6 +76,12 @@ class DiscordBot(commands.Bot):
             api_key=os.getenv("API_KEY"),
             realm_id=os.getenv("REALM_ID")
         )
+        # Health, metrics and market data, served from this bot's event loop
+        self.web = WebServer(
+            self,
+            host=os.getenv("WEB_HOST", "127.0.0.1"),
+            port=int(os.getenv("WEB_PORT", "8080"))
+        )
 
     async def load_cogs(self) -> None:
         """
@@ -118,8 +110,16 @@ class DiscordBot(commands.Bot):
             f"Running on: {platform.system()} {platform.release()} ({os.name})"
         )
         self.logger.info("-------------------")
+        # Open the DRIP connection pool before the first bet needs it
+        await self.points_manager.initialize()
+        await self.points_manager.warm()
         for cog in EXTENSIONS:
             await self.load_extension(cog)
+        try:
+            await self.web.start()
+        except OSError as e:
+            # The bot is still useful without its web endpoints
+            self.logger.error(f"Failed to start web server: {e}")
 
     async def on_ready(self) -> None:
         """|coro|
@@ -137,10 +137,12 @@ class DiscordBot(commands.Bot):
     async def close(self) -> None:
         """
         This is called when the bot is shutting down.
-        Clean up the points manager session.
+        Stop serving requests first, then clean up the points manager session
+        once the cogs have unloaded, they may still settle points on the way out.
         """
-        await self.points_manager.cleanup()
+        await self.web.stop()
         await super().close()
+        await self.points_manager.cleanup()
 
 
 load_dotenv(override= True)
@@ -3,54 +3,114 @@ import discord
 from discord import app_commands
 import datetime
 import asyncio
+import heapq
+import logging
 import math
+import os
+import sys
+import time
+from array import array
 from tabulate import tabulate
 
+import aiohttp
+
+from helpers.SimplePointsManager import CircuitBreaker, CircuitOpenError, ThrottledError
+
+from .accounting import Journal, JournalEntry, NetSettler, escrow_account
+from .betting import DYNAMIC_ITEMS, CategoryButtonView, OptionButtonView
+from .board import MarketBoard, MarketBoardView
+from .ledger import BetLedger, BetsView, StakeTable
+from .market_maker import LMSRMarketMaker
+from .notifications import NotificationDispatcher, OutcomeDigest
+from .quotes import QuoteBook
+from .registry import MarketRegistry, SnowflakeGenerator
+from .search import MarketSearch
+from .refresh import ViewRefresher
+from .scheduler import DeadlineScheduler
+from .settlement import SettlementExecutor
+from .state import MarketState
+from .storage import MarketStore
+from .views import ViewRegistry
+
+logger = logging.getLogger("discord_bot")
+
+# Unresolved markets are refunded this long after betting ends
+REFUND_DELAY = datetime.timedelta(hours=48)
+
 def is_admin():
     def predicate(interaction: discord.Interaction) -> bool:
         return interaction.user.guild_permissions.administrator
     return app_commands.check(predicate)
 
 class Prediction:
-    def __init__(self, question, end_time, options, creator_id, category=None):
+    __slots__ = (
+        "market_id", "guild_id", "question", "end_time", "options", "creator_id", "category",
+        "state", "result", "total_bets", "ledger", "market_maker",
+        "_option_index", "_option_totals", "_stakes", "version",
+    )
+
+    def __init__(self, question, end_time, options, creator_id, category=None, market_maker=None, market_id=None, guild_id=None):
+        self.market_id = market_id
+        self.guild_id = guild_id
         self.question = question
         self.end_time = end_time
-        self.options = options
+        # Interned option table, bets refer to options by index
+        self.options = [sys.intern(option) for option in options]
         self.creator_id = creator_id
         self.category = category
-        self.bets = {option: {} for option in options}
-        self.resolved = False
+        # open -> closed -> resolved/refunded, see MarketState
+        self.state = MarketState.OPEN
         self.result = None
-        self.refunded = False
         self.total_bets = 0
-        # Start with smaller initial liquidity to make price movements more noticeable
-        self.liquidity_pool = {option: 100 for option in options}
-        self.k_constant = 100 * 100  # Adjusted constant product
+        # Raw trade ledger, one typed array per column
+        self.ledger = BetLedger()
+        # Running totals, updated on every bet so reads are O(1)
+        self._option_index = {option: index for index, option in enumerate(self.options)}
+        self._option_totals = array('q', [0] * len(self.options))
+        self._stakes = StakeTable(len(self.options))
+        # Pricing engine, LMSR prices any number of options
+        self.market_maker = market_maker or LMSRMarketMaker(len(self.options), liquidity=100)
+        # Bumped on every trade and status change, lets renderers cache per market
+        self.version = 0
+
+    @property
+    def is_open(self):
+        return self.state == MarketState.OPEN
+
+    @property
+    def resolved(self):
+        """True once resolved or refunded, no more payouts or refunds can happen"""
+        return MarketState.is_final(self.state)
+
+    @property
+    def refunded(self):
+        return self.state == MarketState.REFUNDED
+
+    def transition(self, state):
+        """Move to `state` if the state machine allows it from the current one"""
+        if not MarketState.can_transition(self.state, state):
+            return False
+        self.state = state
+        self.version += 1
+        return True
+
+    def close(self):
+        return self.transition(MarketState.CLOSED)
+
+    @property
+    def bets(self):
+        """{option: {user_id: points}} view over the stake table"""
+        return BetsView(self._stakes, self._option_index)
 
     def get_price(self, option, shares_to_buy):
-        """Calculate price for buying shares using constant product formula"""
-        if option not in self.liquidity_pool:
+        """Calculate the points needed to buy shares of an option"""
+        if option not in self._option_index:
             return 0
-        
-        current_shares = self.liquidity_pool[option]
-        other_shares = self.liquidity_pool[self.get_opposite_option(option)]
-        
-        # Using constant product formula: x * y = k
-        new_shares = current_shares - shares_to_buy
-        if new_shares <= 0:
-            return float('inf')
-        
-        new_other_shares = self.k_constant / new_shares
-        cost = new_other_shares - other_shares
-        return max(0, cost)
-
-    def get_opposite_option(self, option):
-        """Get the opposite option in a binary market"""
-        return [opt for opt in self.options if opt != option][0]
+        return max(0, self.market_maker.cost_for_shares(self._option_index[option], shares_to_buy))
 
     def place_bet(self, user_id, option, points):
-        """Place a bet using AMM pricing"""
-        if option not in self.liquidity_pool:
+        """Place a bet using AMM pricing, refused once betting has ended"""
+        if not self.is_open or option not in self._option_index:
             return False
 
         # Calculate shares user can buy with their points
@@ -58,37 +118,44 @@ class Prediction:
         if shares <= 0:
             return False
 
-        # Update liquidity pool
-        self.liquidity_pool[option] -= shares
-        opposite_option = self.get_opposite_option(option)
-        self.liquidity_pool[opposite_option] += points
+        # Update the market maker
+        option_index = self._option_index[option]
+        self.market_maker.buy(option_index, shares)
 
-        # Record user's bet amount (not shares) for payout calculation
-        if user_id in self.bets[option]:
-            self.bets[option][user_id] += points
-        else:
-            self.bets[option][user_id] = points
+        self.ledger.append(user_id, option_index, points, shares, time.time())
+        self._apply_to_totals(user_id, option_index, points)
+        return True
+
+    def restore_trade(self, user_id, option_index, points, shares, timestamp):
+        """Replay a persisted trade without re-pricing it"""
+        self.market_maker.buy(option_index, shares)
+        self.ledger.append(user_id, option_index, points, shares, timestamp)
+        self._apply_to_totals(user_id, option_index, points)
 
+    def reverse_trade(self, index):
+        """Undo the trade at ledger row `index` by booking its opposite"""
+        user_id, option_index, points, shares, _ = self.ledger[index]
+        self.market_maker.buy(option_index, -shares)
+        self.ledger.append(user_id, option_index, -points, -shares, time.time())
+        self._apply_to_totals(user_id, option_index, -points)
+
+    def _apply_to_totals(self, user_id, option_index, points):
+        # Record user's bet amount (not shares) for payout calculation
+        self._stakes.add(user_id, option_index, points)
+        self._option_totals[option_index] += points
         self.total_bets += points
-        return True
+        self.version += 1
 
     def calculate_shares_for_points(self, option, points):
         """Calculate how many shares user gets for their points"""
-        current_shares = self.liquidity_pool[option]
-        other_shares = self.liquidity_pool[self.get_opposite_option(option)]
-        
-        # Using constant product formula: x * y = k
-        new_other_shares = other_shares + points
-        new_shares = self.k_constant / new_other_shares
-        shares_received = current_shares - new_shares
-        return shares_received
+        return self.market_maker.shares_for_points(self._option_index[option], points)
 
     def get_odds(self):
-        """Calculate current odds based on liquidity pool ratios"""
-        total_shares = sum(self.liquidity_pool.values())
+        """Calculate current decimal odds from the market maker's prices"""
+        prices = self.market_maker.prices()
         return {
-            option: total_shares / (amount * len(self.options)) 
-            for option, amount in self.liquidity_pool.items()
+            option: 1 / prices[index] if prices[index] > 0 else float('inf')
+            for option, index in self._option_index.items()
         }
 
     def get_user_payout(self, user_id):
@@ -96,18 +163,31 @@ class Prediction:
         if not self.resolved or self.result is None:
             return 0
         
-        shares = self.bets[self.result].get(user_id, 0)
+        result_index = self._option_index[self.result]
+        shares = self._stakes.user_option_total(user_id, result_index)
         if shares == 0:
             return 0
             
         # Calculate payout based on final pool state
-        total_pool = sum(sum(user_bets.values()) for user_bets in self.bets.values())
-        share_value = total_pool / sum(self.bets[self.result].values())
+        share_value = self.total_bets / self._option_totals[result_index]
         return int(shares * share_value)
 
+    def get_payouts(self):
+        """Payout for every winning user, in one pass over the winners"""
+        if not self.resolved or self.result is None:
+            return {}
+        result_index = self._option_index[self.result]
+        winning_total = self._option_totals[result_index]
+        if winning_total == 0:
+            return {}
+        share_value = self.total_bets / winning_total
+        return {
+            user_id: int(amount * share_value)
+            for user_id, amount in self._stakes.iter_option(result_index)
+        }
+
     def resolve(self, result):
-        if result in self.options and not self.resolved:
-            self.resolved = True
+        if result in self.options and self.transition(MarketState.RESOLVED):
             self.result = result
             return True
         return False
@@ -115,19 +195,65 @@ class Prediction:
     def get_total_bets(self):
         return self.total_bets
 
+    def get_refunds(self):
+        """Points staked by every user, across all options"""
+        return dict(self._stakes.iter_users())
+
     def get_option_total_bets(self, option):
-        return sum(self.bets[option].values()) if option in self.bets else 0
+        index = self._option_index.get(option)
+        return 0 if index is None else self._option_totals[index]
+
+    def get_user_total_bets(self, user_id):
+        return self._stakes.user_total(user_id)
+
+    def get_user_option_bets(self, user_id, option):
+        index = self._option_index.get(option)
+        return 0 if index is None else self._stakes.user_option_total(user_id, index)
+
+    def check_consistency(self):
+        """Recompute every running total from the ledger.
+
+        Returns a list of human readable mismatches, empty when the
+        incremental totals agree with the raw trades.
+        """
+        option_totals = [0] * len(self.options)
+        user_totals = {}
+        user_option_totals = {}
+        for user_id, option_index, points, _, _ in self.ledger:
+            option_totals[option_index] += points
+            user_totals[user_id] = user_totals.get(user_id, 0) + points
+            key = (user_id, option_index)
+            user_option_totals[key] = user_option_totals.get(key, 0) + points
+
+        problems = []
+        total = sum(option_totals)
+        if total != self.total_bets:
+            problems.append(f"total_bets is {self.total_bets}, ledger has {total}")
+        for option, index in self._option_index.items():
+            if self._option_totals[index] != option_totals[index]:
+                problems.append(f"option '{option}' total is {self._option_totals[index]}, ledger has {option_totals[index]}")
+            stakes = dict(self._stakes.iter_option(index))
+            expected = {user_id: points for (user_id, i), points in user_option_totals.items() if i == index and points}
+            if stakes != expected:
+                problems.append(f"per-user bets on option '{option}' don't match the ledger")
+        if dict(self._stakes.iter_users()) != {user_id: points for user_id, points in user_totals.items() if points}:
+            problems.append("per-user totals don't match the ledger")
+        return problems
 
     def get_bet_history(self):
-        history = []
-        for option, bets in self.bets.items():
-            for user_id, amount in bets.items():
-                history.append((user_id, option, amount))
-        return history
+        """Yield (user_id, option, amount) per user and option, without building a list"""
+        for option, index in self._option_index.items():
+            for user_id, amount in self._stakes.iter_option(index):
+                yield user_id, option, amount
+
+    def get_trades(self):
+        """Yield every raw trade as (user_id, option, points, shares, timestamp)"""
+        options = self.options
+        for user_id, option_index, points, shares, timestamp in self.ledger:
+            yield user_id, options[option_index], points, shares, timestamp
 
     def mark_as_refunded(self):
-        self.refunded = True
-        self.resolved = True
+        return self.transition(MarketState.REFUNDED)
 
     def get_current_prices(self, points_to_spend=100):
         """Calculate current prices and potential shares for a given point amount"""
@@ -143,41 +269,97 @@ class Prediction:
             }
         return prices
 
-class OptionButtonView(discord.ui.View):
-    def __init__(self, prediction, cog):
-        super().__init__(timeout=None)  # Make the view persistent
-        self.prediction = prediction
-        self.cog = cog
-        self.stored_interaction = None  # Store single interaction reference
-        self.update_buttons()
-        
-        # Store view reference
-        cog.active_views[prediction] = self
-
-    def update_buttons(self):
-        # Clear existing buttons
-        self.clear_items()
-        # Add updated buttons
-        for option in self.prediction.options:
-            button = OptionButton(label=option, prediction=self.prediction, cog=self.cog, view=self)
-            self.add_item(button)
-
-    async def refresh_view(self, interaction: discord.Interaction):
-        self.update_buttons()
-        if self.stored_interaction:
-            try:
-                await self.stored_interaction.edit_original_response(view=self)
-            except discord.NotFound:
-                # If the message was deleted, remove this view
-                if self.prediction in self.cog.active_views:
-                    del self.cog.active_views[self.prediction]
-
 class Economy(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.points_manager = bot.points_manager
-        self.predictions = []
-        self.active_views = {}
+        # Every market by snowflake ID, indexed by guild, category, creator, status and end time
+        # Its on_transition hook applies the side effects of every market state change
+        self.markets = MarketRegistry(on_transition=self.on_market_transition)
+        self.market_ids = SnowflakeGenerator(int(os.getenv("MARKET_ID_WORKER", "0")))
+        # Word prefix index over unresolved markets, answers the `market` autocomplete
+        self.search = MarketSearch()
+        # Pools of every market, for batch quoting
+        self.quote_book = QuoteBook()
+        # Paginated /list_predictions with per-market field caching
+        self.board = MarketBoard(self.quote_book)
+        self.store = MarketStore(os.getenv("DATABASE_PATH", "predictions.db"))
+        # One task owns every close and refund deadline
+        self.scheduler = DeadlineScheduler()
+        # Open betting menus per market, weakly held and bounded
+        self.active_views = ViewRegistry(self.scheduler)
+        # Live price views are edited at most once per interval
+        self.view_refresher = ViewRefresher(
+            self.scheduler, interval=float(os.getenv("VIEW_REFRESH_INTERVAL", "2")), on_error=self.drop_view
+        )
+        # Pays out and refunds many users concurrently
+        self.settlement = SettlementExecutor(self.points_manager, concurrency=20)
+        # Bets, payouts and refunds are booked locally and netted to DRIP periodically
+        self.journal = Journal(on_entry=self.store.record_journal_entry)
+        self.net_settler = NetSettler(
+            self.journal, self.settlement, self.points_manager, lambda: self.bot.user.id,
+            interval=float(os.getenv("SETTLEMENT_INTERVAL", "30")),
+            threshold=int(os.getenv("SETTLEMENT_THRESHOLD", "100")),
+            on_rejected=self.roll_back_bets
+        )
+        # DMs go through a queue so notifying many bettors never blocks settlement
+        self.notifier = NotificationDispatcher(bot)
+        # Wins, losses and refunds close together reach a user as one digest
+        self.digest = OutcomeDigest(self.notifier, self.scheduler, window=float(os.getenv("DIGEST_WINDOW", "60")))
+
+    async def cog_load(self):
+        """Open the database and bring back every stored market"""
+        await self.store.open()
+        predictions = await self.store.load_predictions(
+            lambda market_id, question, end_time, options, creator_id, category, guild_id: Prediction(
+                question, end_time, options, creator_id, category, market_id=market_id, guild_id=guild_id
+            )
+        )
+        now = datetime.datetime.utcnow()
+        for prediction in predictions:
+            # Close whatever ended while the bot was offline, its creator hasn't been told yet
+            if prediction.is_open and prediction.end_time <= now:
+                prediction.close()
+                self.store.record_status(prediction)
+                self.notify_betting_closed(prediction)
+            self.markets.add(prediction)
+            if not prediction.resolved:
+                self.search.add(prediction)
+            if prediction.is_open:
+                self.quote_book.add(prediction)
+            self.schedule_prediction_resolution(prediction)
+        entries = await self.store.load_journal(JournalEntry)
+        for entry in entries:
+            self.journal.restore(entry)
+        # Bets DRIP may not have confirmed can still be rolled back after a restart
+        self.journal.restore_unconfirmed(entries, self.markets)
+        for prediction in self.markets:
+            # Resolved or refunded before its payouts could be booked
+            if prediction.resolved and self.journal.balance(escrow_account(prediction.market_id)) > 0:
+                self.schedule_outcome(prediction)
+        # Bet buttons and selects are routed by custom_id, including ones sent before a restart
+        self.bot.add_dynamic_items(*DYNAMIC_ITEMS)
+        self.scheduler.start()
+        self.active_views.start()
+        self.net_settler.start()
+        self.notifier.start()
+        logger.info(f"Loaded {len(self.markets)} predictions from {self.store.path}")
+        report = self.journal.reconcile(self.markets)
+        if report["problems"]:
+            logger.error(f"Journal reconciliation found problems: {report['problems']}")
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(*DYNAMIC_ITEMS)
+        await self.scheduler.stop()
+        await self.net_settler.stop()
+        # Push whatever is still pending before shutting down
+        try:
+            await self.net_settler.flush()
+        except Exception as e:
+            logger.error(f"Final settlement failed: {type(e).__name__}: {e}")
+        self.digest.flush()
+        await self.notifier.stop()
+        await self.store.close()
 
     @app_commands.guild_only()
     @app_commands.command(name="create_prediction", description="Create a new prediction market")
@@ -225,13 +407,19 @@ class Economy(commands.Cog):
             
             # Create prediction object
             end_time = datetime.datetime.utcnow() + datetime.timedelta(minutes=total_minutes)
-            new_prediction = Prediction(question, end_time, options_list, interaction.user.id, category)
+            new_prediction = Prediction(
+                question, end_time, options_list, interaction.user.id, category,
+                market_id=self.market_ids.next_id(), guild_id=interaction.guild_id
+            )
             
-            # Add to predictions list
-            self.predictions.append(new_prediction)
+            # Add to the market registry
+            self.markets.add(new_prediction)
+            self.search.add(new_prediction)
+            self.quote_book.add(new_prediction)
+            self.store.record_market(new_prediction)
             
             # Schedule prediction resolution
-            asyncio.create_task(self.schedule_prediction_resolution(new_prediction))
+            self.schedule_prediction_resolution(new_prediction)
             
             # Format duration string
             duration_parts = []
@@ -261,351 +449,226 @@ class Economy(commands.Cog):
             except:
                 print(f"Failed to send error message: {str(e)}")
 
-    async def schedule_prediction_resolution(self, prediction: Prediction):
+    def schedule_prediction_resolution(self, prediction: Prediction):
+        """Register the close and auto-refund deadlines of a market with the scheduler"""
+        if prediction.resolved:
+            return
+        if prediction.is_open:
+            self.scheduler.schedule(
+                (prediction.market_id, "close"), prediction.end_time,
+                lambda: self.on_betting_closed(prediction)
+            )
+        self.scheduler.schedule(
+            (prediction.market_id, "refund"), prediction.end_time + REFUND_DELAY,
+            lambda: self.auto_refund(prediction)
+        )
+
+    def schedule_outcome(self, prediction: Prediction, delay=0):
+        """Book a resolved or refunded market's payouts from the scheduler in `delay` seconds"""
+        self.scheduler.schedule(
+            (prediction.market_id, "payout"), time.time() + delay,
+            lambda: self.book_scheduled_outcome(prediction)
+        )
+
+    def cancel_prediction_deadlines(self, prediction: Prediction):
+        self.scheduler.cancel((prediction.market_id, "close"))
+        self.scheduler.cancel((prediction.market_id, "refund"))
+
+    def on_market_transition(self, prediction: Prediction, old, new):
+        """Side effects of a market changing state, called by the registry"""
+        if old == MarketState.OPEN:
+            # Betting menus for the market are useless now, and its prices stop moving
+            self.active_views.discard_market(prediction.market_id)
+            self.quote_book.remove(prediction)
+        self.store.record_status(prediction)
+        if MarketState.is_final(new):
+            self.cancel_prediction_deadlines(prediction)
+            self.search.remove(prediction)
+        if new == MarketState.CLOSED:
+            self.notify_betting_closed(prediction)
+        # Other cogs can listen with on_market_state_change
+        self.bot.dispatch("market_state_change", prediction, old, new)
+
+    def notify_betting_closed(self, prediction: Prediction):
+        """Remind the creator to resolve a market that stopped taking bets"""
+        self.notifier.send(
+            prediction.creator_id,
+            f"🎲 Betting has ended for your prediction: '{prediction.question}'\n"
+            f"Please use `/resolve_prediction` to resolve the market.\n"
+            f"If not resolved within 48 hours, all bets will be automatically refunded.",
+            kind="betting_closed"
+        )
+
+    async def on_betting_closed(self, prediction: Prediction):
+        # Don't proceed if already resolved
+        if not prediction.close():
+            logger.debug(f"Market {prediction.market_id} was resolved before betting ended")
+            return
+
+        logger.info(f"Betting period ended for market {prediction.market_id}")
+        self.markets.update_status(prediction)
+
+    async def auto_refund(self, prediction: Prediction):
+        # Check if resolved during wait
+        if not prediction.mark_as_refunded():
+            logger.debug(f"Market {prediction.market_id} was resolved during the 48-hour wait")
+            return
+
+        logger.info(f"Refunding unresolved market {prediction.market_id}")
+        self.markets.update_status(prediction)
+
+        # Return all bets to users, credited to DRIP by the next net settlement
+        await self.book_scheduled_outcome(prediction)
+
+    async def book_scheduled_outcome(self, prediction: Prediction):
+        """book_outcome for deadlines, a failure is logged and retried after the settlement interval"""
         try:
-            # Wait for betting period to end
-            time_until_betting_ends = (prediction.end_time - datetime.datetime.utcnow()).total_seconds()
-            if time_until_betting_ends > 0:
-                print(f"DEBUG: Waiting {time_until_betting_ends} seconds for betting to end")
-                await asyncio.sleep(time_until_betting_ends)
-            
-            # Don't proceed if already resolved
-            if prediction.resolved:
-                print("DEBUG: Prediction already resolved before betting end")
-                return
-                
-            print(f"DEBUG: Betting period ended for {prediction.question}")
-            
-            # Notify creator that betting period has ended
-            try:
-                creator = await self.bot.fetch_user(prediction.creator_id)
-                await creator.send(
-                    f"🎲 Betting has ended for your prediction: '{prediction.question}'\n"
-                    f"Please use `/resolve_prediction` to resolve the market.\n"
-                    f"If not resolved within 48 hours, all bets will be automatically refunded."
+            await self.book_outcome(prediction)
+        except Exception:
+            logger.exception(f"Booking the outcome of market {prediction.market_id} failed, retrying")
+            self.schedule_outcome(prediction, self.net_settler.interval)
+
+    async def confirm_market_bets(self, prediction: Prediction):
+        """Settle the bets in a market DRIP hasn't confirmed yet, True once none are left.
+
+        A debit DRIP refuses goes to roll_back_bets, which can still reverse
+        bets in this market as long as its escrow hasn't been paid out.
+        """
+        user_ids = self.journal.unconfirmed_users(prediction.market_id)
+        if user_ids:
+            await self.net_settler.flush(user_ids)
+        return not self.journal.unconfirmed_users(prediction.market_id)
+
+    async def book_outcome(self, prediction: Prediction):
+        """Book a resolved market's payouts or a refunded market's refunds and tell its bettors.
+
+        Every bet in the market is confirmed with DRIP first, so a stake DRIP
+        refuses is reversed instead of being paid out to winners. While DRIP
+        can't confirm them, booking is retried every settlement interval.
+        Returns {user_id: points} booked, or None when deferred.
+        """
+        market_id = prediction.market_id
+        if self.journal.is_paid_out(market_id):
+            return None
+        confirmed = await self.confirm_market_bets(prediction)
+        # Another booking may have finished while DRIP was being asked
+        if self.journal.is_paid_out(market_id):
+            return None
+        if not confirmed:
+            logger.warning(f"Payouts of market {market_id} wait for DRIP to confirm its bets")
+            self.schedule_outcome(prediction, self.net_settler.interval)
+            return None
+
+        question = prediction.question
+        if prediction.refunded:
+            refunds = prediction.get_refunds()
+            self.journal.record_refunds(market_id, refunds)
+            self.net_settler.notify()
+            for user_id, amount in refunds.items():
+                self.digest.add(
+                    user_id, "refund", question, amount, amount,
+                    f"💰 Your bet of {amount:,} Points has been refunded for the expired market:\n"
+                    f"'{question}'"
                 )
-                print(f"DEBUG: Sent notification to creator {prediction.creator_id}")
-            except Exception as e:
-                print(f"DEBUG: Error notifying creator: {e}")
+            return refunds
+
+        # Book payouts locally, the net settler credits them to DRIP
+        result = prediction.result
+        payouts = prediction.get_payouts()
+        self.journal.record_payouts(market_id, payouts)
+        self.net_settler.notify()
+
+        # Notify winners, outcomes are batched into per-user digests
+        for user_id, original_bet in prediction.bets[result].items():
+            payout_amount = payouts[user_id]
+            profit = payout_amount - original_bet
+            self.digest.add(
+                user_id, "win", question, original_bet, payout_amount,
+                f"🎉 You won {profit:,} Points on '{question}'!\n"
+                f"Bet: {original_bet:,} → Payout: {payout_amount:,}"
+            )
 
-            # Wait 48 hours
-            print("DEBUG: Starting 48-hour wait")
-            await asyncio.sleep(48 * 3600)  # 48 hours in seconds
-            
-            # Check if resolved during wait
-            if prediction.resolved:
-                print("DEBUG: Prediction resolved during 48-hour wait")
-                return
-                
-            print("DEBUG: Starting auto-refund process")
-            
-            # If we reach here, it's time to auto-refund
-            prediction.mark_as_refunded()
-            
-            # Return all bets to users
-            for option in prediction.bets:
-                for user_id, amount in prediction.bets[option].items():
-                    await self.points_manager.add_points(user_id, amount)
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                        await user.send(
-                            f"💰 Your bet of {amount:,} Points has been refunded for the expired market:\n"
-                            f"'{prediction.question}'"
-                        )
-                    except Exception as e:
-                        print(f"DEBUG: Error sending refund notification: {e}")
-                    
-        except Exception as e:
-            print(f"DEBUG: Error in schedule_prediction_resolution: {e}")
+        # Notify losing users
+        for option, bets in prediction.bets.items():
+            if option != result:  # This is a losing option
+                for user_id, bet_amount in bets.items():
+                    self.digest.add(
+                        user_id, "loss", question, bet_amount, 0,
+                        f"❌ You lost {bet_amount:,} Points on '{question}'.\n"
+                        f"The winning option was: {result}"
+                    )
+        return payouts
 
     @app_commands.guild_only()
     @app_commands.command(name="bet", description="Place a bet on a prediction")
-    async def bet(self, interaction: discord.Interaction):
+    @app_commands.describe(market="Search for a prediction to bet on (optional)")
+    async def bet(self, interaction: discord.Interaction, market: str = None):
         await interaction.response.defer(ephemeral=True)
 
-        # If there are no active predictions, inform the user
-        active_predictions = [prediction for prediction in self.predictions if not prediction.resolved and prediction.end_time > datetime.datetime.utcnow()]
-        if not active_predictions:
-            await interaction.followup.send("No active predictions at the moment.", ephemeral=True)
+        # Fail fast while the Points service is down instead of timing out in the modal
+        breaker = self.points_manager.breaker
+        if breaker.state == CircuitBreaker.OPEN:
+            await interaction.followup.send(
+                f"The Points service is temporarily unavailable, please try again in {math.ceil(breaker.retry_after())}s.",
+                ephemeral=True
+            )
             return
 
-        # Get all unique categories
-        categories = list(set(prediction.category for prediction in active_predictions if prediction.category))
-        categories.append("All")
-
-        # Create buttons for each category
-        class CategoryButton(discord.ui.Button):
-            def __init__(self, label, cog):
-                super().__init__(label=label, style=discord.ButtonStyle.primary)
-                self.cog = cog
-                self.category = label
+        # A market picked through autocomplete goes straight to its options
+        if market is not None:
+            prediction = self.find_market(interaction, market, (MarketState.OPEN,))
+            if prediction is None:
+                await interaction.followup.send("No open prediction matches that.", ephemeral=True)
+                return
+            view = OptionButtonView(prediction, self)
+            await interaction.edit_original_response(content="Please select an option to bet on:", view=view)
+            view.track(interaction)
+            return
 
-            async def callback(self, button_interaction: discord.Interaction):
-                if self.category == "All":
-                    filtered_predictions = active_predictions
-                else:
-                    filtered_predictions = [prediction for prediction in active_predictions if prediction.category == self.category]
+        # If there are no active predictions, inform the user
+        if not self.markets.count(interaction.guild_id, (MarketState.OPEN,)):
+            await interaction.followup.send("No active predictions at the moment.", ephemeral=True)
+            return
 
-                if not filtered_predictions:
-                    await button_interaction.response.send_message("No predictions available for this category.", ephemeral=True)
-                    return
+        # One button per category plus "All", the buttons route by custom_id and survive restarts
+        categories = self.markets.categories(interaction.guild_id)
+        await interaction.followup.send("Please select a category:", view=CategoryButtonView(categories))
 
-                # Create a Select menu to allow the user to choose an active prediction
-                class PredictionSelect(discord.ui.Select):
-                    def __init__(self, predictions):
-                        options = [
-                            discord.SelectOption(label=prediction.question, description=f"Ends at {prediction.end_time.strftime('%Y-%m-%d %H:%M:%S UTC')} (Category: {prediction.category if prediction.category else 'None'})", value=str(index))
-                            for index, prediction in enumerate(predictions)
-                        ]
-                        super().__init__(placeholder="Select a prediction to bet on...", min_values=1, max_values=1, options=options)
-
-                    async def callback(self, interaction: discord.Interaction):
-                        selected_index = int(self.values[0])
-                        selected_prediction = filtered_predictions[selected_index]
-
-                        # Check if the prediction is still active
-                        if selected_prediction.end_time <= datetime.datetime.utcnow():
-                            await interaction.response.send_message("This prediction has already ended!", ephemeral=True)
-                            return
-
-                        # Update the odds before showing the buttons
-                        odds = selected_prediction.get_odds()
-
-                        # Create buttons for the user to choose an option to bet on
-                        class OptionButton(discord.ui.Button):
-                            def __init__(self, label, prediction, cog, view):
-                                prices = prediction.get_current_prices(100)
-                                price_info = prices[label]
-                                
-                                detailed_label = (
-                                    f"{label}\n"
-                                    f"Price: {price_info['price_per_share']:.2f} pts/share"
-                                )
-                                super().__init__(label=detailed_label, style=discord.ButtonStyle.primary)
-                                self.prediction = prediction
-                                self.cog = cog
-                                self.option = label
-                                self.parent_view = view
-
-                            async def callback(self, interaction: discord.Interaction):
-                                class AmountInput(discord.ui.Modal, title="Place Your Bet"):
-                                    def __init__(self, prediction, option, cog):
-                                        super().__init__()
-                                        self.prediction = prediction
-                                        self.option = option
-                                        self.cog = cog
-                                        
-                                        self.amount = discord.ui.TextInput(
-                                            label=f"Enter amount to bet on {option}",
-                                            style=discord.TextStyle.short,
-                                            placeholder="Enter bet amount",
-                                            required=True,
-                                            min_length=1,
-                                            max_length=10,
-                                            default="100"
-                                        )
-                                        self.add_item(self.amount)
-
-                                    async def on_submit(self, modal_interaction: discord.Interaction):
-                                        try:
-                                            amount = int(self.amount.value)
-                                            if amount <= 0:
-                                                await modal_interaction.response.send_message("Amount must be positive!", ephemeral=True)
-                                                return
-
-                                            # Check if prediction is still active
-                                            if self.prediction.end_time <= datetime.datetime.utcnow():
-                                                await modal_interaction.response.send_message("This prediction has already ended!", ephemeral=True)
-                                                return
-
-                                            # Check user's balance
-                                            balance = await self.cog.points_manager.get_balance(modal_interaction.user.id)
-                                            if balance < amount:
-                                                await modal_interaction.response.send_message(f"You don't have enough Points! Your balance: {balance:,} Points", ephemeral=True)
-                                                return
-
-                                            # Calculate potential shares and payout
-                                            pre_bet_prices = self.prediction.get_current_prices(amount)
-                                            potential_shares = pre_bet_prices[self.option]['potential_shares']
-                                            potential_payout = pre_bet_prices[self.option]['potential_payout']
-
-                                            # Transfer points and place bet
-                                            await self.cog.points_manager.transfer_points(modal_interaction.user.id, self.cog.bot.user.id, amount)
-                                            if await self.cog.place_bet(modal_interaction.user.id, self.prediction, self.option, amount):
-                                                await modal_interaction.response.send_message(
-                                                    f"Bet placed successfully!\n"
-                                                    f"Amount: {amount:,} Points\n"
-                                                    f"Potential shares: {potential_shares:.2f}\n"
-                                                    f"Potential payout: {potential_payout:.2f} Points",
-                                                    ephemeral=True
-                                                )
-                                        except ValueError:
-                                            await modal_interaction.response.send_message("Invalid amount entered!", ephemeral=True)
-
-                                # Show the modal
-                                await interaction.response.send_modal(AmountInput(self.prediction, self.option, self.cog))
-
-                        class OptionButtonView(discord.ui.View):
-                            def __init__(self, prediction, cog):
-                                super().__init__(timeout=None)  # Make the view persistent
-                                self.prediction = prediction
-                                self.cog = cog
-                                self.stored_interaction = None  # Store single interaction reference
-                                self.update_buttons()
-                                
-                                # Store view reference
-                                cog.active_views[prediction] = self
-
-                            def update_buttons(self):
-                                # Clear existing buttons
-                                self.clear_items()
-                                # Add updated buttons
-                                for option in self.prediction.options:
-                                    button = OptionButton(label=option, prediction=self.prediction, cog=self.cog, view=self)
-                                    self.add_item(button)
-
-                            async def refresh_view(self, interaction: discord.Interaction):
-                                self.update_buttons()
-                                if self.stored_interaction:
-                                    try:
-                                        await self.stored_interaction.edit_original_response(view=self)
-                                    except discord.NotFound:
-                                        # If the message was deleted, remove this view
-                                        if self.prediction in self.cog.active_views:
-                                            del self.cog.active_views[self.prediction]
-
-                        await interaction.response.send_message(content="Please select an option to bet on:", view=OptionButtonView(selected_prediction, self.cog), ephemeral=True)
-                        # Store the interaction reference
-                        OptionButtonView.stored_interaction = await interaction.original_response()
-
-                class PredictionSelectView(discord.ui.View):
-                    def __init__(self, predictions, cog):
-                        super().__init__()
-                        select = PredictionSelect(predictions)
-                        select.cog = cog
-                        self.add_item(select)
-
-                await button_interaction.response.send_message(content="Please select a prediction to bet on:", view=PredictionSelectView(filtered_predictions, self.cog), ephemeral=True)
-
-        class CategoryButtonView(discord.ui.View):
-            def __init__(self, categories, cog):
-                super().__init__()
-                for category in categories:
-                    button = CategoryButton(label=category, cog=cog)
-                    self.add_item(button)
-
-        await interaction.followup.send("Please select a category:", view=CategoryButtonView(categories, self))
+    @bet.autocomplete("market")
+    async def bet_market_autocomplete(self, interaction: discord.Interaction, current: str):
+        return self.market_choices(interaction, current, (MarketState.OPEN,))
 
     @app_commands.guild_only()
     @app_commands.command(name="list_predictions", description="List all active predictions")
     async def list_predictions(self, interaction: discord.Interaction):
         try:
-            if not self.predictions:
+            guild_id = interaction.guild_id
+            if not self.markets.count(guild_id):
                 await interaction.response.send_message("No active predictions at the moment.", ephemeral=True)
                 return
-            
-            current_embed = discord.Embed(
-                title="🎲 Prediction Markets",
-                color=discord.Color.blue(),
-                timestamp=datetime.datetime.utcnow()
-            )
 
-            # Group predictions by status
-            active_markets = []
-            inactive_markets = []
-            resolved_markets = []
-            refunded_markets = []
-
-            def calculate_normalized_probabilities(prices):
-                """Calculate normalized probabilities that sum to 100%"""
-                raw_odds = {opt: 1/price['price_per_share'] if price['price_per_share'] > 0 else 0 
-                           for opt, price in prices.items()}
-                total_odds = sum(raw_odds.values())
-                return {opt: (odds/total_odds * 100) if total_odds > 0 else 0 
-                       for opt, odds in raw_odds.items()}
-
-            def create_market_display(prediction, prices):
-                """Create a PolyMarket-style display for a prediction"""
-                probabilities = calculate_normalized_probabilities(prices)
-                
-                market_text = (
-                    f"**Category:** {prediction.category or 'None'}\n"
-                    f"**Total Volume:** {prediction.get_total_bets():,} Points\n"
-                    f"**Ends:** <t:{int(prediction.end_time.timestamp())}:R>\n\n"
-                    "**Current Odds:**\n"
-                )
-
-                # Create PolyMarket-style odds display
-                for opt in prediction.options:
-                    prob = probabilities[opt]
-                    price = prices[opt]['price_per_share']
-                    market_text += (
-                        f"```\n"
-                        f"{opt}\n"
-                        f"Price: {price:.3f} Points\n"
-                        f"Prob:  {prob:.1f}%\n"
-                        f"```\n"
-                    )
-
-                return market_text
-
-            def add_markets_to_embed(markets, title, embed):
-                if not markets:
-                    return embed
-                
-                for question, prediction, prices in markets:
-                    embed.add_field(
-                        name=f"📊 {question}",
-                        value=create_market_display(prediction, prices),
-                        inline=False  # Make each market take full width
-                    )
-                return embed
-
-            # Process each prediction
-            for prediction in self.predictions:
-                prices = prediction.get_current_prices(100)
-                combined_data = (prediction.question, prediction, prices)
-
-                if prediction.resolved:
-                    if prediction.refunded:
-                        refunded_markets.append(combined_data)
-                    else:
-                        resolved_markets.append(combined_data)
-                elif prediction.end_time <= datetime.datetime.utcnow():
-                    inactive_markets.append(combined_data)
-                else:
-                    active_markets.append(combined_data)
-
-            # Add section headers and markets
-            if active_markets:
-                current_embed.add_field(name="🟢 Active Markets", value="\u200b", inline=False)
-                current_embed = add_markets_to_embed(active_markets, "Active Markets", current_embed)
-            if inactive_markets:
-                current_embed.add_field(name="🟡 Pending Resolution", value="\u200b", inline=False)
-                current_embed = add_markets_to_embed(inactive_markets, "Pending Resolution", current_embed)
-            if resolved_markets:
-                current_embed.add_field(name="⭐ Resolved Markets", value="\u200b", inline=False)
-                current_embed = add_markets_to_embed(resolved_markets, "Resolved Markets", current_embed)
-            if refunded_markets:
-                current_embed.add_field(name="💰 Refunded Markets", value="\u200b", inline=False)
-                current_embed = add_markets_to_embed(refunded_markets, "Refunded Markets", current_embed)
-
-            current_embed.set_footer(text="Use /bet to place bets on active markets")
-            await interaction.response.send_message(embed=current_embed, ephemeral=True)
+            # Only this guild's markets are listed and only the visible page is looked up and rendered,
+            # unchanged markets come from the board's cache
+            view = MarketBoardView(
+                self.board,
+                lambda status: self.markets.count(guild_id, (status,) if status else MarketState.ALL),
+                lambda status, start, stop: self.board_markets(guild_id, status, start, stop)
+            )
+            await interaction.response.send_message(embed=view.render(), view=view, ephemeral=True)
 
         except Exception as e:
             await interaction.response.send_message(f"An error occurred: {str(e)}", ephemeral=True)
 
     @app_commands.guild_only()
     @app_commands.command(name="resolve_prediction", description="Resolve a prediction")
-    async def resolve_prediction_command(self, interaction: discord.Interaction):
+    @app_commands.describe(market="Search for one of your predictions (optional)")
+    async def resolve_prediction_command(self, interaction: discord.Interaction, market: str = None):
         await interaction.response.defer(ephemeral=True)
 
         # Only show unresolved predictions created by this user
-        unresolved_predictions = [
-            pred for pred in self.predictions 
-            if not pred.resolved and pred.creator_id == interaction.user.id
-        ]
+        unresolved_predictions = self.markets.query(
+            guild_id=interaction.guild_id, statuses=(MarketState.OPEN, MarketState.CLOSED), creator_id=interaction.user.id
+        )[:25]
         
         if not unresolved_predictions:
             await interaction.followup.send(
@@ -615,6 +678,61 @@ class Economy(commands.Cog):
             )
             return
 
+        class ResultSelect(discord.ui.Select):
+            def __init__(self, prediction, cog):
+                self.prediction = prediction
+                self.cog = cog
+                options = [
+                    discord.SelectOption(label=option, value=option)
+                    for option in prediction.options
+                ]
+                super().__init__(placeholder="Select the winning option...", min_values=1, max_values=1, options=options)
+
+            async def callback(self, interaction: discord.Interaction):
+                result = self.values[0]
+                if not self.prediction.resolve(result):
+                    await interaction.response.send_message("This prediction has already been resolved!", ephemeral=True)
+                    return
+                self.cog.markets.update_status(self.prediction)
+                # Confirming the market's bets with DRIP can take longer than an interaction allows
+                await interaction.response.defer(ephemeral=True)
+
+                problems = self.prediction.check_consistency()
+                if problems:
+                    logger.error(f"Bet totals out of sync for '{self.prediction.question}': {problems}")
+
+                payouts = await self.cog.book_outcome(self.prediction)
+                if payouts is None:
+                    await interaction.followup.send(
+                        f"Prediction '{self.prediction.question}' resolved with result: '{result}'. "
+                        f"Payouts will be recorded once the Points service has confirmed every bet.",
+                        ephemeral=True
+                    )
+                    return
+
+                await interaction.followup.send(
+                    f"Prediction '{self.prediction.question}' resolved with result: '{result}'. "
+                    f"Payouts of {sum(payouts.values()):,} Points to {len(payouts):,} winners have been recorded.",
+                    ephemeral=True
+                )
+
+        # A market picked through autocomplete skips the prediction menu
+        if market is not None:
+            prediction = self.find_market(
+                interaction, market, (MarketState.OPEN, MarketState.CLOSED), creator_id=interaction.user.id
+            )
+            if prediction is None:
+                await interaction.followup.send(
+                    "That isn't one of your unresolved predictions. "
+                    "Only the creator of a prediction can resolve it.",
+                    ephemeral=True
+                )
+                return
+            view = discord.ui.View()
+            view.add_item(ResultSelect(prediction, self))
+            await interaction.followup.send("Please select the winning option:", view=view, ephemeral=True)
+            return
+
         class PredictionSelect(discord.ui.Select):
             def __init__(self, predictions, cog):
                 self.cog = cog
@@ -622,71 +740,17 @@ class Economy(commands.Cog):
                     discord.SelectOption(
                         label=prediction.question, 
                         description=f"Ended at {prediction.end_time.strftime('%Y-%m-%d %H:%M:%S UTC')}", 
-                        value=str(index)
+                        value=str(prediction.market_id)
                     )
-                    for index, prediction in enumerate(predictions)
+                    for prediction in predictions
                 ]
                 super().__init__(placeholder="Select a prediction to resolve...", min_values=1, max_values=1, options=options)
 
             async def callback(self, interaction: discord.Interaction):
-                selected_index = int(self.values[0])
-                selected_prediction = unresolved_predictions[selected_index]
-
-                class ResultSelect(discord.ui.Select):
-                    def __init__(self, prediction, cog):
-                        self.prediction = prediction
-                        self.cog = cog
-                        options = [
-                            discord.SelectOption(label=option, value=option)
-                            for option in prediction.options
-                        ]
-                        super().__init__(placeholder="Select the winning option...", min_values=1, max_values=1, options=options)
-
-                    async def callback(self, interaction: discord.Interaction):
-                        result = self.values[0]
-                        if not self.prediction.resolve(result):
-                            await interaction.response.send_message("This prediction has already been resolved!", ephemeral=True)
-                            return
-
-                        # Distribute payouts and notify winners
-                        total_payout = self.prediction.get_total_bets()
-                        winning_users = self.prediction.bets[result].items()
-                        
-                        # Process payouts and notifications for winners
-                        for user_id, original_bet in winning_users:
-                            payout = self.prediction.get_user_payout(user_id)
-                            if payout > 0:
-                                payout_amount = int(payout)
-                                await self.cog.points_manager.add_points(user_id, payout_amount)
-                                profit = payout_amount - original_bet
-                                
-                                try:
-                                    user = await self.cog.bot.fetch_user(user_id)
-                                    await user.send(
-                                        f"🎉 You won {profit:,} Points on '{self.prediction.question}'!\n"
-                                        f"Bet: {original_bet:,} → Payout: {payout_amount:,}"
-                                    )
-                                except Exception as e:
-                                    print(f"Error sending winning notification to user {user_id}: {e}")
-
-                        # Notify losing users
-                        for option, bets in self.prediction.bets.items():
-                            if option != result:  # This is a losing option
-                                for user_id, bet_amount in bets.items():
-                                    try:
-                                        user = await self.cog.bot.fetch_user(user_id)
-                                        await user.send(
-                                            f"❌ You lost {bet_amount:,} Points on '{self.prediction.question}'.\n"
-                                            f"The winning option was: {result}"
-                                        )
-                                    except Exception as e:
-                                        print(f"Error sending losing notification to user {user_id}: {e}")
-
-                        await interaction.response.send_message(
-                            f"Prediction '{self.prediction.question}' resolved with result: '{result}'. "
-                            f"Payouts have been distributed.", 
-                            ephemeral=True
-                        )
+                selected_prediction = self.cog.get_market(int(self.values[0]))
+                if selected_prediction is None or selected_prediction.resolved:
+                    await interaction.response.send_message("This prediction has already been resolved!", ephemeral=True)
+                    return
 
                 view = discord.ui.View()
                 view.add_item(ResultSelect(selected_prediction, self.cog))
@@ -696,34 +760,179 @@ class Economy(commands.Cog):
         view.add_item(PredictionSelect(unresolved_predictions, self))
         await interaction.followup.send("Please select a prediction to resolve:", view=view, ephemeral=True)
 
+    @resolve_prediction_command.autocomplete("market")
+    async def resolve_market_autocomplete(self, interaction: discord.Interaction, current: str):
+        return self.market_choices(
+            interaction, current, (MarketState.OPEN, MarketState.CLOSED), creator_id=interaction.user.id
+        )
+
+    def _market_filter(self, guild_id, states, creator_id=None):
+        def matches(prediction):
+            return (
+                prediction.state in states
+                and prediction.guild_id in (guild_id, None)
+                and (creator_id is None or prediction.creator_id == creator_id)
+            )
+        return matches
+
+    def market_choices(self, interaction: discord.Interaction, current, states, creator_id=None):
+        """Autocomplete choices for a `market` argument, soonest to close first"""
+        if current.strip():
+            predictions = self.search.search(current, self._market_filter(interaction.guild_id, states, creator_id))
+        else:
+            predictions = heapq.nsmallest(
+                25, self.markets.query(guild_id=interaction.guild_id, statuses=states, creator_id=creator_id),
+                key=lambda prediction: prediction.end_time
+            )
+        # Snowflake IDs don't fit in a JavaScript number, so values are strings
+        return [
+            app_commands.Choice(name=prediction.question[:100], value=str(prediction.market_id))
+            for prediction in predictions
+        ]
+
+    def find_market(self, interaction: discord.Interaction, market, states, creator_id=None):
+        """The market an autocomplete value refers to, or the best search match for typed text"""
+        matches = self._market_filter(interaction.guild_id, states, creator_id)
+        if market.isdigit():
+            prediction = self.markets.get(int(market))
+            if prediction is not None:
+                return prediction if matches(prediction) else None
+        found = self.search.search(market, matches, limit=1)
+        return found[0] if found else None
+
     @commands.Cog.listener()
     async def on_prediction_update(self, prediction: Prediction):
         """Event listener for when a prediction is updated"""
-        if prediction in self.active_views:
-            view = self.active_views[prediction]
+        for view in self.active_views.views(prediction.market_id):
             if view.stored_interaction:
-                try:
-                    await view.refresh_view(view.stored_interaction)
-                except:
-                    # If update fails, clean up the view
-                    del self.active_views[prediction]
+                # Edits are debounced, a burst of bets costs one message edit
+                self.view_refresher.mark_dirty(view)
+
+    def drop_view(self, view):
+        """Forget a view whose message can't be edited anymore"""
+        self.active_views.discard(view)
+
+    def get_market(self, market_id):
+        return self.markets.get(market_id)
+
+    def open_markets(self, guild_id=None, category=None):
+        """Markets of a guild still taking bets"""
+        return self.markets.query(guild_id=guild_id, statuses=(MarketState.OPEN,), category=category)
+
+    def board_markets(self, guild_id, status, start, stop):
+        """(status, prediction) pairs at positions [start, stop) of the market board, in board order"""
+        markets = []
+        for key in ((status,) if status else MarketState.ALL):
+            count = self.markets.count(guild_id, (key,))
+            if start < count and stop > 0:
+                markets.extend((key, prediction) for prediction in self.markets.page(guild_id, key, max(start, 0), min(stop, count)))
+            start -= count
+            stop -= count
+        return markets
 
     async def update_prediction(self, prediction: Prediction):
         """Call this method whenever a bet is placed"""
         await self.on_prediction_update(prediction)
 
+    async def reserve_points(self, user_id, amount):
+        """Hold `amount` of a user's points for a bet, False if they can't cover it"""
+        balance = await self.points_manager.get_balance(user_id)
+        if self.journal.hold(user_id, amount, balance):
+            return True
+        # A stale cached balance is re-read before rejecting
+        balance = await self.points_manager.get_balance(user_id, use_cache=False)
+        return self.journal.hold(user_id, amount, balance)
+
     # Modify the bet placement logic to trigger updates
-    async def place_bet(self, user_id, prediction, option, amount):
-        success = prediction.place_bet(user_id, option, amount)
+    async def place_bet(self, user_id, prediction, option, amount, held=False):
+        """Book a bet; with `held`, the hold taken by reserve_points is released once it's booked"""
+        try:
+            success = prediction.place_bet(user_id, option, amount)
+            if success:
+                self.quote_book.update(prediction)
+                self.store.record_trade(prediction, *prediction.ledger[-1])
+                # Remember the trade so it can be reversed if DRIP refuses the debit
+                trade = (prediction, len(prediction.ledger) - 1)
+                self.journal.record_bet(prediction.market_id, user_id, amount, trade)
+        finally:
+            if held:
+                self.journal.release(user_id, amount)
         if success:
+            self.net_settler.notify()
             await self.update_prediction(prediction)
         return success
 
-    async def cleanup_old_views(self):
-        """Remove views for resolved or expired predictions"""
-        for prediction in list(self.active_views.keys()):
-            if prediction.resolved or prediction.end_time <= datetime.datetime.utcnow():
-                del self.active_views[prediction]
+    async def roll_back_bets(self, user_id, amount):
+        """DRIP refused to debit a user's net bets, reverse the newest ones their balance can't cover"""
+        try:
+            balance = await self.points_manager.get_balance(user_id, use_cache=False)
+        except (ThrottledError, CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError):
+            # Left pending, the next settlement tries again
+            return
+        shortfall = -self.journal.available(user_id, balance)
+        reversed_bets = []
+        for trade in reversed(self.journal.unconfirmed_bets(user_id)):
+            if shortfall <= 0:
+                break
+            prediction, index = trade
+            # Once the stake has been paid out of escrow it can't be returned
+            if self.journal.is_paid_out(prediction.market_id):
+                continue
+            prediction.reverse_trade(index)
+            points = prediction.ledger.points[index]
+            self.quote_book.update(prediction)
+            self.store.record_trade(prediction, *prediction.ledger[-1])
+            self.journal.record_reversal(prediction.market_id, user_id, points, trade)
+            shortfall -= points
+            reversed_bets.append((prediction, prediction.options[prediction.ledger.option_indices[index]], points))
+
+        if not reversed_bets:
+            return
+        logger.info(f"Reversed {len(reversed_bets)} bets of {user_id} after DRIP refused a {-amount} debit")
+        for prediction in {prediction for prediction, _, _ in reversed_bets}:
+            await self.update_prediction(prediction)
+        self.notifier.send(
+            user_id,
+            "⚠️ Your Points balance couldn't cover these bets, so they were cancelled:\n" +
+            "\n".join(f"- {points:,} Points on '{option}' in '{prediction.question}'" for prediction, option, points in reversed_bets),
+            kind="reversal"
+        )
+
+    def component_stats(self):
+        """Counters of every moving part, for /settlement_status and /metrics"""
+        return {
+            "settlement": self.net_settler.stats(),
+            "notifications": self.notifier.stats(),
+            "digest": self.digest.stats(),
+            "view_refresh": self.view_refresher.stats(),
+            "views": self.active_views.stats(),
+            "markets": self.markets.stats(),
+            "search": self.search.stats(),
+            "scheduler": self.scheduler.stats(),
+            "board": self.board.stats(),
+            "points": self.points_manager.metrics(),
+        }
+
+    @app_commands.guild_only()
+    @is_admin()
+    @app_commands.command(name="settlement_status", description="Show the points ledger reconciliation report")
+    async def settlement_status(self, interaction: discord.Interaction):
+        report = self.journal.reconcile(self.markets)
+        lines = [f"**{key}:** {value}" for key, value in report.items() if key != "problems"]
+        for component, stats in self.component_stats().items():
+            prefix = "" if component == "settlement" else f"{component}_"
+            lines += [f"**{prefix}{key}:** {value}" for key, value in stats.items()]
+        if report["problems"]:
+            lines.append("**Problems:**\n" + "\n".join(f"- {problem}" for problem in report["problems"]))
+        # Split at line boundaries to stay under Discord's 2000 character limit
+        chunks = [""]
+        for line in lines:
+            if len(chunks[-1]) + len(line) + 1 > 2000:
+                chunks.append("")
+            chunks[-1] += line[:1999] + "\n"
+        await interaction.response.send_message(chunks[0], ephemeral=True)
+        for chunk in chunks[1:]:
+            await interaction.followup.send(chunk, ephemeral=True)
 
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(Economy(bot))
@@ -0,0 +1,409 @@
+import asyncio
+import functools
+import logging
+import time
+
+logger = logging.getLogger("discord_bot")
+
+# Counterpart of every settlement: points that actually moved on DRIP
+REMOTE_ACCOUNT = "remote"
+# Rounding left in escrow after payouts
+HOUSE_ACCOUNT = "house"
+
+
+def user_account(user_id):
+    return f"user:{user_id}"
+
+
+def escrow_account(market_id):
+    return f"escrow:{market_id}"
+
+
+class JournalEntry:
+    __slots__ = ("id", "kind", "market_id", "postings", "timestamp")
+
+    def __init__(self, entry_id, kind, market_id, postings, timestamp):
+        self.id = entry_id
+        self.kind = kind
+        self.market_id = market_id
+        self.postings = postings
+        self.timestamp = timestamp
+
+
+class Journal:
+    """Double-entry journal of every points movement the bot makes.
+
+    A user's account holds what the bot owes them (positive) or what they
+    owe the bot (negative) that hasn't been pushed to DRIP yet. Bets move
+    points from the user into a market's escrow, payouts and refunds move
+    them back, and settlements zero the user against the remote account.
+    Every entry's postings sum to zero.
+
+    Holds reserve points for bets that are being placed. They are checked
+    and taken synchronously, so two concurrent bets can't both spend the
+    same balance.
+    """
+
+    def __init__(self, on_entry=None):
+        self.balances = {}
+        self.entries = 0
+        self._next_id = 1
+        # Called with every new entry, used to persist it
+        self._on_entry = on_entry
+        # Users with a non-zero account, i.e. something to settle
+        self._unsettled = set()
+        # user_id -> points reserved by bets not booked yet
+        self.holds = {}
+        # user_id -> amount currently being written to DRIP
+        self._settling = {}
+        # user_id -> [(entry_id, market_id, trade)] bets DRIP hasn't confirmed yet
+        self._unconfirmed = {}
+        # Markets whose escrow has been paid out or refunded
+        self._paid_out = set()
+
+    def post(self, kind, postings, market_id=None):
+        """Record an entry; postings is a list of (account, amount)"""
+        postings = tuple((account, amount) for account, amount in postings if amount)
+        if sum(amount for _, amount in postings) != 0:
+            raise ValueError(f"Unbalanced journal entry: {postings}")
+        entry = JournalEntry(self._next_id, kind, market_id, postings, time.time())
+        self._apply(entry)
+        if self._on_entry:
+            self._on_entry(entry)
+        return entry
+
+    def restore(self, entry):
+        """Replay a persisted entry"""
+        self._apply(entry)
+
+    def _apply(self, entry):
+        self._next_id = max(self._next_id, entry.id + 1)
+        self.entries += 1
+        if entry.kind in ("payout", "refund"):
+            self._paid_out.add(entry.market_id)
+        for account, amount in entry.postings:
+            balance = self.balances.get(account, 0) + amount
+            if balance:
+                self.balances[account] = balance
+            else:
+                self.balances.pop(account, None)
+            if account.startswith("user:"):
+                user_id = int(account[5:])
+                if balance:
+                    self._unsettled.add(user_id)
+                else:
+                    self._unsettled.discard(user_id)
+
+    def balance(self, account):
+        return self.balances.get(account, 0)
+
+    def pending(self, user_id):
+        """Net points not yet settled with DRIP for a user"""
+        return self.balances.get(user_account(user_id), 0)
+
+    def unsettled_users(self):
+        return list(self._unsettled)
+
+    def unsettled_count(self):
+        return len(self._unsettled)
+
+    def is_paid_out(self, market_id):
+        """True once a market's payouts or refunds are booked, its bets can't be reversed anymore"""
+        return market_id in self._paid_out
+
+    @property
+    def next_entry_id(self):
+        return self._next_id
+
+    def available(self, user_id, remote_balance):
+        """Points a user can still commit, given their balance on DRIP.
+
+        A credit that is being settled may not have reached DRIP yet, so it
+        isn't counted; a debit in flight may be counted twice, which only
+        errs on the safe side.
+        """
+        in_flight_credit = max(self._settling.get(user_id, 0), 0)
+        return remote_balance + self.pending(user_id) - self.holds.get(user_id, 0) - in_flight_credit
+
+    def hold(self, user_id, amount, remote_balance):
+        """Reserve `amount` if the user can cover it, returns whether it was reserved"""
+        if amount <= 0 or self.available(user_id, remote_balance) < amount:
+            return False
+        self.holds[user_id] = self.holds.get(user_id, 0) + amount
+        return True
+
+    def release(self, user_id, amount):
+        held = self.holds.get(user_id, 0) - amount
+        if held > 0:
+            self.holds[user_id] = held
+        else:
+            self.holds.pop(user_id, None)
+
+    def begin_settlement(self, user_id, amount):
+        self._settling[user_id] = amount
+
+    def end_settlement(self, user_id):
+        self._settling.pop(user_id, None)
+
+    def record_bet(self, market_id, user_id, amount, trade=None):
+        """Book a bet; `trade` is kept until DRIP confirms it, so it can be reversed"""
+        entry = self.post("bet", [(user_account(user_id), -amount), (escrow_account(market_id), amount)], market_id)
+        if trade is not None:
+            self._unconfirmed.setdefault(user_id, []).append((entry.id, market_id, trade))
+        return entry
+
+    def unconfirmed_bets(self, user_id):
+        """Trades booked for a user since their last settlement, oldest first"""
+        return [trade for _, _, trade in self._unconfirmed.get(user_id, ())]
+
+    def unconfirmed_users(self, market_id):
+        """Users with a bet in a market that DRIP hasn't confirmed yet"""
+        return [
+            user_id for user_id, bets in self._unconfirmed.items()
+            if any(bet_market_id == market_id for _, bet_market_id, _ in bets)
+        ]
+
+    def restore_unconfirmed(self, entries, markets):
+        """Rebuild the unconfirmed bets after `entries` were replayed with restore.
+
+        `markets` maps market IDs to Predictions. Settlements don't record
+        which entry they covered up to, so every bet after a user's
+        second-to-last settlement counts as unconfirmed: confirming a bet
+        twice costs a settlement, losing one leaves a debit that can never
+        be rolled back. Bet entries are matched to the user's newest trades
+        in their market, trades that were already reversed are dropped.
+        """
+        settlements = {}
+        bets = {}
+        for entry in entries:
+            if entry.kind not in ("settlement", "bet"):
+                continue
+            user_id = next((int(account[5:]) for account, _ in entry.postings if account.startswith("user:")), None)
+            if user_id is None:
+                continue
+            if entry.kind == "settlement":
+                settlements.setdefault(user_id, []).append(entry.id)
+            else:
+                bets.setdefault(entry.market_id, {}).setdefault(user_id, []).append(entry.id)
+
+        self._unconfirmed = {}
+        for market_id, users in bets.items():
+            prediction = markets.get(market_id)
+            if prediction is None or self.is_paid_out(market_id):
+                continue
+            # Ledger rows of every bet per user, a reversal cancels the newest row it mirrors
+            rows = {}
+            live = {}
+            for index, (user_id, _, points, shares, _) in enumerate(prediction.ledger):
+                if points > 0:
+                    rows.setdefault(user_id, []).append(index)
+                    live.setdefault((user_id, shares), []).append(index)
+                elif live.get((user_id, -shares)):
+                    live[(user_id, -shares)].pop()
+            live_rows = {index for indices in live.values() for index in indices}
+            for user_id, entry_ids in users.items():
+                covered = settlements.get(user_id, ())
+                since = covered[-2] if len(covered) >= 2 else 0
+                # Trades from before the journal existed have no bet entry, so pair from the newest
+                for entry_id, index in zip(reversed(entry_ids), reversed(rows.get(user_id, ()))):
+                    if entry_id > since and index in live_rows:
+                        self._unconfirmed.setdefault(user_id, []).append((entry_id, market_id, (prediction, index)))
+        for user_bets in self._unconfirmed.values():
+            user_bets.sort(key=lambda bet: bet[0])
+
+    def record_reversal(self, market_id, user_id, amount, trade):
+        """Return a bet's stake from escrow after DRIP refused to debit it"""
+        bets = self._unconfirmed.get(user_id, [])
+        bets[:] = [bet for bet in bets if bet[2] is not trade]
+        if not bets:
+            self._unconfirmed.pop(user_id, None)
+        return self.post("reversal", [(escrow_account(market_id), -amount), (user_account(user_id), amount)], market_id)
+
+    def record_payouts(self, market_id, payouts):
+        """Pay winners out of escrow and sweep the rounding left over to the house"""
+        escrow = escrow_account(market_id)
+        paid = sum(payouts.values())
+        postings = [(user_account(user_id), amount) for user_id, amount in payouts.items()]
+        postings.append((escrow, -paid))
+        entry = self.post("payout", postings, market_id)
+        leftover = self.balance(escrow)
+        if leftover > 0:
+            self.post("house", [(escrow, -leftover), (HOUSE_ACCOUNT, leftover)], market_id)
+        return entry
+
+    def record_refunds(self, market_id, refunds):
+        postings = [(user_account(user_id), amount) for user_id, amount in refunds.items()]
+        postings.append((escrow_account(market_id), -sum(refunds.values())))
+        return self.post("refund", postings, market_id)
+
+    def record_settlement(self, user_id, amount, as_of=None):
+        """`amount` moved on DRIP: positive credited the user, negative debited them.
+
+        Bets booked before entry `as_of` were covered by it and are confirmed.
+        """
+        if as_of is not None:
+            self._confirm(user_id, as_of)
+        return self.post("settlement", [(user_account(user_id), -amount), (REMOTE_ACCOUNT, amount)])
+
+    def confirm_netted(self, as_of):
+        """Confirm bets before entry `as_of` of users whose account nets to zero.
+
+        Their stakes were covered by credits that never had to reach DRIP,
+        so no settlement will ever confirm them.
+        """
+        for user_id in [user_id for user_id in self._unconfirmed if not self.pending(user_id)]:
+            self._confirm(user_id, as_of)
+
+    def _confirm(self, user_id, as_of):
+        if user_id in self._unconfirmed:
+            bets = [bet for bet in self._unconfirmed[user_id] if bet[0] >= as_of]
+            if bets:
+                self._unconfirmed[user_id] = bets
+            else:
+                del self._unconfirmed[user_id]
+
+    def reconcile(self, predictions=()):
+        """Consistency report for the journal and the markets' escrow"""
+        problems = []
+        imbalance = sum(self.balances.values())
+        if imbalance:
+            problems.append(f"journal doesn't balance, off by {imbalance}")
+        for prediction in predictions:
+            if prediction.resolved:
+                continue
+            escrow = self.balance(escrow_account(prediction.market_id))
+            if escrow != prediction.total_bets:
+                problems.append(f"market {prediction.market_id} escrow is {escrow}, bets total {prediction.total_bets}")
+
+        pending = [self.pending(user_id) for user_id in self._unsettled]
+        return {
+            "entries": self.entries,
+            "accounts": len(self.balances),
+            "unsettled_users": len(pending),
+            "pending_debits": -sum(amount for amount in pending if amount < 0),
+            "pending_credits": sum(amount for amount in pending if amount > 0),
+            "escrow": sum(amount for account, amount in self.balances.items() if account.startswith("escrow:")),
+            "house": self.balance(HOUSE_ACCOUNT),
+            "settled_remote": self.balance(REMOTE_ACCOUNT),
+            "held": sum(self.holds.values()),
+            "unconfirmed_bets": sum(len(bets) for bets in self._unconfirmed.values()),
+            "problems": problems,
+        }
+
+
+class NetSettler:
+    """Pushes each user's net journal balance to DRIP in one write.
+
+    Runs every `interval` seconds, or sooner once `threshold` users have
+    something to settle. A user who bet ten times and won once costs a
+    single remote call per settlement instead of eleven.
+
+    When DRIP refuses a debit, `on_rejected(user_id, amount)` is awaited so
+    the bets behind it can be rolled back.
+    """
+
+    def __init__(self, journal, executor, points_manager, get_bot_user_id, interval=30.0, threshold=100,
+                 on_rejected=None):
+        self.journal = journal
+        self.executor = executor
+        self.points_manager = points_manager
+        self.get_bot_user_id = get_bot_user_id
+        self.interval = interval
+        self.threshold = threshold
+        self.on_rejected = on_rejected
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._stopping = False
+        self.flushes = 0
+        self.remote_writes = 0
+        self.failed_writes = 0
+        self.rejected_debits = 0
+        self.last_flush = None
+        self.last_report = None
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop, a flush already running completes first"""
+        if self._task:
+            # Not cancelled: wait_for can swallow a cancel that lands as the wakeup fires
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def notify(self):
+        """Call after posting entries, wakes the settler early past the threshold"""
+        if self.journal.unsettled_count() >= self.threshold:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Net settlement failed: {type(e).__name__}: {e}")
+
+    async def _apply(self, user_id, amount, as_of):
+        self.journal.begin_settlement(user_id, amount)
+        try:
+            if amount > 0:
+                outcome = await self.points_manager.add_points(user_id, amount)
+            else:
+                outcome = await self.points_manager.transfer_points(user_id, self.get_bot_user_id(), -amount)
+            if outcome:
+                # Posted before the in-flight marker is dropped, so a credit that
+                # reached DRIP is never also counted as pending
+                self.journal.record_settlement(user_id, amount, as_of)
+            return outcome
+        finally:
+            self.journal.end_settlement(user_id)
+
+    async def flush(self, user_ids=None):
+        """Settle every user's current net balance, or only `user_ids`', returns the SettlementReport"""
+        async with self._lock:
+            # Snapshot the amounts, bets placed during the flush stay pending
+            as_of = self.journal.next_entry_id
+            self.journal.confirm_netted(as_of)
+            if user_ids is None:
+                user_ids = self.journal.unsettled_users()
+            net = [(user_id, self.journal.pending(user_id)) for user_id in user_ids]
+            net = [(user_id, amount) for user_id, amount in net if amount]
+            report = await self.executor.run(net, apply=functools.partial(self._apply, as_of=as_of))
+            for result in report.failed:
+                if result.rejected and result.amount < 0:
+                    self.rejected_debits += 1
+                    if self.on_rejected:
+                        try:
+                            await self.on_rejected(result.user_id, result.amount)
+                        except Exception as e:
+                            logger.error(f"Rolling back bets of {result.user_id} failed: {type(e).__name__}: {e}")
+            self.flushes += 1
+            self.remote_writes += sum(result.attempts for result in report.results)
+            self.failed_writes += len(report.failed)
+            self.last_flush = time.time()
+            self.last_report = report
+            if report.results:
+                logger.info(f"Net settlement: {report.summary()}")
+            return report
+
+    def stats(self):
+        return {
+            "flushes": self.flushes,
+            "remote_writes": self.remote_writes,
+            "failed_writes": self.failed_writes,
+            "rejected_debits": self.rejected_debits,
+            "last_flush": self.last_flush,
+            "unsettled_users": self.journal.unsettled_count(),
+        }
@@ -0,0 +1,270 @@
+"""Components of the /bet flow.
+
+Every button and select is a DynamicItem whose custom_id carries what it
+needs (a category, a market ID, an option index), so clicks are routed by
+pattern and keep working after a restart. Nothing is captured from the
+command invocation; markets are looked up by ID when the click arrives.
+"""
+import asyncio
+import heapq
+import math
+
+import aiohttp
+import discord
+
+from helpers.SimplePointsManager import CircuitOpenError, ThrottledError
+
+from .views import INTERACTION_TOKEN_TTL
+
+CATEGORY_PREFIX = "bet:category:"
+# custom_ids are capped at 100 characters
+CATEGORY_ID_LENGTH = 100 - len(CATEGORY_PREFIX)
+# Discord allows 25 buttons per message and 25 options per select
+MAX_COMPONENTS = 25
+
+
+def get_cog(interaction: discord.Interaction):
+    return interaction.client.get_cog("Economy")
+
+
+class AmountInput(discord.ui.Modal, title="Place Your Bet"):
+    def __init__(self, prediction, option, cog):
+        super().__init__()
+        self.prediction = prediction
+        self.option = option
+        self.cog = cog
+
+        self.amount = discord.ui.TextInput(
+            label=f"Enter amount to bet on {option}"[:45],
+            style=discord.TextStyle.short,
+            placeholder="Enter bet amount",
+            required=True,
+            min_length=1,
+            max_length=10,
+            default="100"
+        )
+        self.add_item(self.amount)
+
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        try:
+            amount = int(self.amount.value)
+            if amount <= 0:
+                await modal_interaction.response.send_message("Amount must be positive!", ephemeral=True)
+                return
+
+            # Check if prediction is still active
+            if not self.prediction.is_open:
+                await modal_interaction.response.send_message("This prediction has already ended!", ephemeral=True)
+                return
+
+            # Hold the stake against the user's balance, including bets and winnings
+            # not yet settled with DRIP, so concurrent bets can't overspend it
+            user_id = modal_interaction.user.id
+            if not await self.cog.reserve_points(user_id, amount):
+                balance = self.cog.journal.available(user_id, await self.cog.points_manager.get_balance(user_id))
+                await modal_interaction.response.send_message(f"You don't have enough Points! Your balance: {balance:,} Points", ephemeral=True)
+                return
+
+            # The market may have closed or been resolved while DRIP was being asked
+            if not self.prediction.is_open:
+                self.cog.journal.release(user_id, amount)
+                await modal_interaction.response.send_message("This prediction has ended, your bet wasn't placed.", ephemeral=True)
+                return
+
+            # Calculate potential shares and payout
+            pre_bet_prices = self.prediction.get_current_prices(amount)
+            potential_shares = pre_bet_prices[self.option]['potential_shares']
+            potential_payout = pre_bet_prices[self.option]['potential_payout']
+
+            # Place bet under the hold, the stake is escrowed locally and settled with DRIP later
+            if await self.cog.place_bet(user_id, self.prediction, self.option, amount, held=True):
+                await modal_interaction.response.send_message(
+                    f"Bet placed successfully!\n"
+                    f"Amount: {amount:,} Points\n"
+                    f"Potential shares: {potential_shares:.2f}\n"
+                    f"Potential payout: {potential_payout:.2f} Points",
+                    ephemeral=True
+                )
+            else:
+                await modal_interaction.response.send_message("That bet is too small to buy any shares.", ephemeral=True)
+        except ValueError:
+            await modal_interaction.response.send_message("Invalid amount entered!", ephemeral=True)
+        except ThrottledError as e:
+            await modal_interaction.response.send_message(f"The Points service is busy, please try again in {math.ceil(e.retry_after)}s.", ephemeral=True)
+        except CircuitOpenError as e:
+            await modal_interaction.response.send_message(f"The Points service is temporarily unavailable, please try again in {math.ceil(e.retry_after)}s.", ephemeral=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            await modal_interaction.response.send_message("The Points service isn't responding, please try again shortly.", ephemeral=True)
+
+
+class OptionButton(discord.ui.DynamicItem[discord.ui.Button], template=r"bet:option:(?P<market_id>[0-9]+):(?P<option>[0-9]+)"):
+    """Opens the bet modal for one option of one market"""
+
+    def __init__(self, market_id, option_index, label, price_info=None):
+        if price_info is not None:
+            label = (
+                f"{label}\n"
+                f"Price: {price_info['price_per_share']:.2f} pts/share"
+            )
+        super().__init__(discord.ui.Button(
+            label=label[:80],
+            style=discord.ButtonStyle.primary,
+            custom_id=f"bet:option:{market_id}:{option_index}"
+        ))
+        self.market_id = market_id
+        self.option_index = option_index
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["market_id"]), int(match["option"]), item.label or "")
+
+    async def callback(self, interaction: discord.Interaction):
+        cog = get_cog(interaction)
+        prediction = cog.get_market(self.market_id) if cog else None
+        if prediction is None or self.option_index >= len(prediction.options):
+            await interaction.response.send_message("This prediction no longer exists.", ephemeral=True)
+            return
+        if not prediction.is_open:
+            await interaction.response.send_message("This prediction has already ended!", ephemeral=True)
+            return
+        option = prediction.options[self.option_index]
+        await interaction.response.send_modal(AmountInput(prediction, option, cog))
+
+
+class OptionButtonView(discord.ui.View):
+    """One button per option of a market, showing its live price"""
+
+    def __init__(self, prediction, cog):
+        # Lives as long as the interaction token that can edit its message,
+        # the buttons themselves keep working after that
+        super().__init__(timeout=INTERACTION_TOKEN_TTL)
+        self.prediction = prediction
+        self.cog = cog
+        self.stored_interaction = None  # Store single interaction reference
+        self.update_buttons()
+
+    def update_buttons(self):
+        # Clear existing buttons
+        self.clear_items()
+        # Quote every option in one pass
+        prices = self.cog.quote_book.quote([self.prediction], 100)[0]
+        # Add updated buttons
+        for index, option in enumerate(self.prediction.options[:MAX_COMPONENTS]):
+            self.add_item(OptionButton(self.prediction.market_id, index, option, prices[option]))
+
+    def track(self, interaction: discord.Interaction):
+        """Keep the interaction that sent this view, its token can edit the message for 15 minutes"""
+        self.stored_interaction = interaction
+        self.cog.active_views.register(self.prediction.market_id, self)
+        self.cog.view_refresher.shown(self)
+
+    def price_signature(self):
+        """Prices as the buttons display them"""
+        prices = self.cog.quote_book.quote([self.prediction], 100)[0]
+        return tuple(f"{prices[option]['price_per_share']:.2f}" for option in self.prediction.options)
+
+    async def refresh_view(self, interaction: discord.Interaction):
+        self.update_buttons()
+        if self.stored_interaction:
+            try:
+                await self.stored_interaction.edit_original_response(view=self)
+                self.cog.active_views.touch(self)
+            except discord.NotFound:
+                # If the message was deleted, remove this view
+                self.cog.active_views.discard(self)
+
+
+class PredictionSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"bet:market"):
+    """Picks a market to bet on, option values are market IDs"""
+
+    def __init__(self, select: discord.ui.Select):
+        super().__init__(select)
+
+    @classmethod
+    def for_markets(cls, predictions):
+        options = [
+            discord.SelectOption(
+                label=prediction.question[:100],
+                description=f"Ends at {prediction.end_time.strftime('%Y-%m-%d %H:%M:%S UTC')} (Category: {prediction.category if prediction.category else 'None'})"[:100],
+                value=str(prediction.market_id)
+            )
+            for prediction in predictions[:MAX_COMPONENTS]
+        ]
+        return cls(discord.ui.Select(
+            placeholder="Select a prediction to bet on...", min_values=1, max_values=1,
+            options=options, custom_id="bet:market"
+        ))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match):
+        return cls(item)
+
+    async def callback(self, interaction: discord.Interaction):
+        cog = get_cog(interaction)
+        prediction = cog.get_market(int(self.item.values[0])) if cog else None
+        if prediction is None:
+            await interaction.response.send_message("This prediction no longer exists.", ephemeral=True)
+            return
+
+        # Check if the prediction is still active
+        if not prediction.is_open:
+            await interaction.response.send_message("This prediction has already ended!", ephemeral=True)
+            return
+
+        view = OptionButtonView(prediction, cog)
+        await interaction.response.send_message(content="Please select an option to bet on:", view=view, ephemeral=True)
+        view.track(interaction)
+
+
+class CategoryButton(discord.ui.DynamicItem[discord.ui.Button], template=r"bet:category:(?P<category>.*)"):
+    """Lists the open markets of a category, an empty category means all of them"""
+
+    def __init__(self, category):
+        category = category[:CATEGORY_ID_LENGTH]
+        super().__init__(discord.ui.Button(
+            label=(category or "All")[:80],
+            style=discord.ButtonStyle.primary,
+            custom_id=CATEGORY_PREFIX + category
+        ))
+        self.category = category
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["category"])
+
+    async def callback(self, interaction: discord.Interaction):
+        cog = get_cog(interaction)
+        if cog is None:
+            predictions = []
+        elif self.category:
+            # Categories longer than a custom_id allows were cut to fit it
+            predictions = [
+                prediction
+                for category in cog.markets.categories(interaction.guild_id)
+                if category[:CATEGORY_ID_LENGTH] == self.category
+                for prediction in cog.open_markets(interaction.guild_id, category)
+            ]
+            # Soonest to close first, a select holds at most 25 markets
+            predictions = heapq.nsmallest(MAX_COMPONENTS, predictions, key=lambda prediction: prediction.end_time)
+        else:
+            predictions = cog.markets.closing_soonest(interaction.guild_id, MAX_COMPONENTS)
+
+        if not predictions:
+            await interaction.response.send_message("No predictions available for this category.", ephemeral=True)
+            return
+
+        view = discord.ui.View(timeout=None)
+        view.add_item(PredictionSelect.for_markets(predictions))
+        await interaction.response.send_message(content="Please select a prediction to bet on:", view=view, ephemeral=True)
+
+
+class CategoryButtonView(discord.ui.View):
+    def __init__(self, categories):
+        super().__init__(timeout=None)
+        for category in categories[:MAX_COMPONENTS - 1]:
+            self.add_item(CategoryButton(category))
+        self.add_item(CategoryButton(""))
+
+
+# Registered once with bot.add_dynamic_items
+DYNAMIC_ITEMS = (CategoryButton, PredictionSelect, OptionButton)
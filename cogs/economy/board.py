@@ -0,0 +1,171 @@
+import datetime
+import math
+
+import discord
+
+from .scheduler import to_timestamp
+from .state import MarketState
+
+STATUS_TITLES = {
+    MarketState.OPEN: "🟢 Active Markets",
+    MarketState.CLOSED: "🟡 Pending Resolution",
+    MarketState.RESOLVED: "⭐ Resolved Markets",
+    MarketState.REFUNDED: "💰 Refunded Markets",
+}
+
+# Discord caps an embed at 6000 characters, a field name at 256 and a field value at 1024
+MAX_FIELD_LENGTH = 1024
+MAX_EMBED_LENGTH = 6000
+# Market names are cut shorter than Discord's cap so values keep most of the budget
+MAX_NAME_LENGTH = 100
+# Title, description, footer and one section header per status
+RESERVED_LENGTH = 500
+
+
+class MarketBoard:
+    """Renders pages of the market list for `/list_predictions`.
+
+    Only the markets on the requested page are formatted. Each market's
+    field is cached together with the prediction's version, so a market
+    that hasn't traded or changed status since it was last shown is never
+    quoted or formatted again.
+    """
+
+    def __init__(self, quote_book, page_size=5, points=100):
+        self.quote_book = quote_book
+        self.page_size = page_size
+        self.points = points
+        # A full page of names and values stays under the embed cap
+        self.field_length = min(MAX_FIELD_LENGTH, (MAX_EMBED_LENGTH - RESERVED_LENGTH) // page_size - MAX_NAME_LENGTH)
+        # market_id -> (version, name, value)
+        self._fields = {}
+        self.renders = 0
+        self.cache_hits = 0
+
+    def _format(self, prediction, prices):
+        """Create a PolyMarket-style display for a prediction"""
+        market_text = (
+            f"**Category:** {prediction.category or 'None'}\n"
+            f"**Total Volume:** {prediction.get_total_bets():,} Points\n"
+            f"**Ends:** <t:{int(to_timestamp(prediction.end_time))}:R>\n\n"
+            "**Current Odds:**\n"
+        )
+        for opt in prediction.options:
+            prob = prices[opt]['probability']
+            price = prices[opt]['price_per_share']
+            market_text += (
+                f"```\n"
+                f"{opt}\n"
+                f"Price: {price:.3f} Points\n"
+                f"Prob:  {prob:.1f}%\n"
+                f"```\n"
+            )
+        if len(market_text) > self.field_length:
+            market_text = market_text[:self.field_length - 1] + "…"
+        name = f"📊 {prediction.question}"
+        if len(name) > MAX_NAME_LENGTH:
+            name = name[:MAX_NAME_LENGTH - 1] + "…"
+        return name, market_text
+
+    def fields(self, predictions):
+        """(name, value) for each prediction, formatting only stale ones"""
+        stale = []
+        for prediction in predictions:
+            cached = self._fields.get(prediction.market_id)
+            if cached is not None and cached[0] == prediction.version:
+                self.cache_hits += 1
+            else:
+                stale.append(prediction)
+        if stale:
+            # Quote every stale market in one vectorized pass
+            for prediction, prices in zip(stale, self.quote_book.quote(stale, self.points)):
+                self._fields[prediction.market_id] = (prediction.version, *self._format(prediction, prices))
+                self.renders += 1
+        return [self._fields[prediction.market_id][1:] for prediction in predictions]
+
+    def forget(self, prediction):
+        self._fields.pop(prediction.market_id, None)
+
+    def page_count(self, total):
+        return max(1, math.ceil(total / self.page_size))
+
+    def render(self, total, get_markets, status=None, page=0):
+        """Embed for one page of `total` markets, returns (embed, page, page_count) with page clamped.
+
+        `get_markets(start, stop)` returns the (status, prediction) pairs at
+        those positions, only the visible page is ever asked for.
+        """
+        pages = self.page_count(total)
+        page = min(max(page, 0), pages - 1)
+        visible = get_markets(page * self.page_size, (page + 1) * self.page_size)
+
+        label = STATUS_TITLES[status] if status else "All markets"
+        embed = discord.Embed(
+            title="🎲 Prediction Markets",
+            description=f"{label} · {total:,} markets · page {page + 1}/{pages}",
+            color=discord.Color.blue(),
+            timestamp=datetime.datetime.utcnow()
+        )
+        if not visible:
+            embed.add_field(name="\u200b", value="No markets here yet.", inline=False)
+
+        section = None
+        for (status_of, _), (name, value) in zip(visible, self.fields([prediction for _, prediction in visible])):
+            if status_of != section:
+                section = status_of
+                embed.add_field(name=STATUS_TITLES[section], value="\u200b", inline=False)
+            embed.add_field(name=name, value=value, inline=False)
+
+        embed.set_footer(text="Use /bet to place bets on active markets")
+        return embed, page, pages
+
+    def stats(self):
+        return {"cached_fields": len(self._fields), "renders": self.renders, "cache_hits": self.cache_hits}
+
+
+class MarketBoardView(discord.ui.View):
+    """Prev/next buttons and a status filter over a MarketBoard"""
+
+    def __init__(self, board, count_markets, get_markets, timeout=300):
+        super().__init__(timeout=timeout)
+        self.board = board
+        # status or None -> number of markets on the board
+        self.count_markets = count_markets
+        # (status or None, start, stop) -> (status, prediction) pairs in board order
+        self.get_markets = get_markets
+        self.status = None
+        self.page = 0
+
+    def render(self):
+        embed, self.page, pages = self.board.render(
+            self.count_markets(self.status),
+            lambda start, stop: self.get_markets(self.status, start, stop),
+            self.status, self.page
+        )
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= pages - 1
+        for option in self.status_filter.options:
+            option.default = option.value == (self.status or "all")
+        return embed
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.select(
+        placeholder="Filter by status",
+        options=[discord.SelectOption(label="All markets", value="all")] + [
+            discord.SelectOption(label=title, value=status) for status, title in STATUS_TITLES.items()
+        ]
+    )
+    async def status_filter(self, interaction: discord.Interaction, select: discord.ui.Select):
+        value = select.values[0]
+        self.status = None if value == "all" else value
+        self.page = 0
+        await interaction.response.edit_message(embed=self.render(), view=self)
@@ -0,0 +1,147 @@
+from array import array
+from collections.abc import Mapping
+
+
+class BetLedger:
+    """Append-only, columnar record of every trade in a market.
+
+    Each column is a typed array, so a trade costs a few dozen bytes instead
+    of a tuple plus boxed ints and floats.
+    """
+
+    __slots__ = ("user_ids", "option_indices", "points", "shares", "timestamps")
+
+    def __init__(self):
+        self.user_ids = array('q')
+        self.option_indices = array('H')
+        self.points = array('q')
+        self.shares = array('d')
+        self.timestamps = array('d')
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __iter__(self):
+        return zip(self.user_ids, self.option_indices, self.points, self.shares, self.timestamps)
+
+    def __getitem__(self, index):
+        return (self.user_ids[index], self.option_indices[index], self.points[index],
+                self.shares[index], self.timestamps[index])
+
+    def append(self, user_id, option_index, points, shares, timestamp):
+        self.user_ids.append(user_id)
+        self.option_indices.append(option_index)
+        self.points.append(points)
+        self.shares.append(shares)
+        self.timestamps.append(timestamp)
+
+    def nbytes(self):
+        """Bytes used by the column buffers"""
+        return sum(column.itemsize * len(column) for column in (
+            self.user_ids, self.option_indices, self.points, self.shares, self.timestamps
+        ))
+
+
+class StakeTable:
+    """Running points staked per user and per (user, option).
+
+    Every user gets a slot; their per-option stakes are stored row-major in
+    one flat array, so a bettor costs one dict entry plus a few machine words.
+    """
+
+    __slots__ = ("num_options", "_slots", "_slot_users", "_user_points", "_user_option_points")
+
+    def __init__(self, num_options):
+        self.num_options = num_options
+        self._slots = {}
+        self._slot_users = array('q')
+        self._user_points = array('q')
+        self._user_option_points = array('q')
+
+    def __len__(self):
+        return len(self._slot_users)
+
+    def add(self, user_id, option_index, points):
+        slot = self._slots.get(user_id)
+        if slot is None:
+            slot = len(self._slot_users)
+            self._slots[user_id] = slot
+            self._slot_users.append(user_id)
+            self._user_points.append(0)
+            self._user_option_points.extend([0] * self.num_options)
+        self._user_points[slot] += points
+        self._user_option_points[slot * self.num_options + option_index] += points
+
+    def user_total(self, user_id):
+        slot = self._slots.get(user_id)
+        return 0 if slot is None else self._user_points[slot]
+
+    def user_option_total(self, user_id, option_index):
+        slot = self._slots.get(user_id)
+        return 0 if slot is None else self._user_option_points[slot * self.num_options + option_index]
+
+    def iter_option(self, option_index):
+        """Yield (user_id, points) for every user with a stake on an option"""
+        stakes = self._user_option_points
+        for slot, user_id in enumerate(self._slot_users):
+            points = stakes[slot * self.num_options + option_index]
+            if points:
+                yield user_id, points
+
+    def iter_users(self):
+        """Yield (user_id, points) for every user with a stake in the market"""
+        for user_id, points in zip(self._slot_users, self._user_points):
+            if points:
+                yield user_id, points
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in (
+            self._slot_users, self._user_points, self._user_option_points
+        ))
+
+
+class OptionBetsView(Mapping):
+    """Read-only {user_id: points} view of the stakes on one option"""
+
+    __slots__ = ("_stakes", "_option_index")
+
+    def __init__(self, stakes, option_index):
+        self._stakes = stakes
+        self._option_index = option_index
+
+    def __getitem__(self, user_id):
+        points = self._stakes.user_option_total(user_id, self._option_index)
+        if not points:
+            raise KeyError(user_id)
+        return points
+
+    def __iter__(self):
+        return (user_id for user_id, _ in self._stakes.iter_option(self._option_index))
+
+    def __len__(self):
+        return sum(1 for _ in self._stakes.iter_option(self._option_index))
+
+    def items(self):
+        return self._stakes.iter_option(self._option_index)
+
+    def values(self):
+        return (points for _, points in self._stakes.iter_option(self._option_index))
+
+
+class BetsView(Mapping):
+    """Read-only {option: {user_id: points}} view, shaped like the old bets dict"""
+
+    __slots__ = ("_stakes", "_option_index")
+
+    def __init__(self, stakes, option_index):
+        self._stakes = stakes
+        self._option_index = option_index
+
+    def __getitem__(self, option):
+        return OptionBetsView(self._stakes, self._option_index[option])
+
+    def __iter__(self):
+        return iter(self._option_index)
+
+    def __len__(self):
+        return len(self._option_index)
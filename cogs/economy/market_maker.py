@@ -0,0 +1,150 @@
+import math
+from abc import ABC, abstractmethod
+
+
+def _log_add_exp(x, y):
+    """Compute log(exp(x) + exp(y)) without overflowing"""
+    if x == -math.inf:
+        return y
+    if y == -math.inf:
+        return x
+    if x < y:
+        x, y = y, x
+    return x + math.log1p(math.exp(y - x))
+
+
+class MarketMaker(ABC):
+    """Base class for the pricing engines that sit behind a Prediction.
+
+    Engines work on option indices, the Prediction maps option labels to
+    indices. Any engine has to be able to quote and trade an arbitrary
+    number of outcomes.
+    """
+
+    @abstractmethod
+    def cost(self):
+        """Current value of the cost function"""
+
+    @abstractmethod
+    def price(self, index):
+        """Marginal price of one share of an outcome (0..1)"""
+
+    def prices(self):
+        """Marginal prices of every outcome, summing to 1"""
+        return [self.price(index) for index in range(self.num_outcomes)]
+
+    @abstractmethod
+    def cost_for_shares(self, index, shares):
+        """Points needed to buy `shares` of an outcome"""
+
+    @abstractmethod
+    def shares_for_points(self, index, points):
+        """Shares of an outcome that `points` buys"""
+
+    @abstractmethod
+    def buy(self, index, shares):
+        """Apply a trade of `shares` on an outcome (negative sells)"""
+
+    @abstractmethod
+    def get_state(self):
+        """Serializable engine state"""
+
+    @abstractmethod
+    def load_state(self, state):
+        """Restore engine state produced by get_state"""
+
+
+class LMSRMarketMaker(MarketMaker):
+    """Logarithmic market scoring rule (Hanson) for N outcomes.
+
+    C(q) = b * log(sum(exp(q_i / b))). The sum is kept as
+    offset + log(sum_exp) where offset is (roughly) the largest q, so every
+    exponent stays <= 0 and a trade only touches the traded outcome's term.
+    """
+
+    # Recompute the running sum from scratch every so often to stop
+    # floating point drift from accumulating
+    REBUILD_INTERVAL = 1024
+
+    def __init__(self, num_outcomes, liquidity=100.0, quantities=None):
+        if num_outcomes < 2:
+            raise ValueError("A market needs at least two outcomes")
+        if liquidity <= 0:
+            raise ValueError("Liquidity must be positive")
+        self.num_outcomes = num_outcomes
+        self.liquidity = float(liquidity)
+        self.quantities = [float(q) for q in quantities] if quantities else [0.0] * num_outcomes
+        self._rebuild()
+
+    def _rebuild(self):
+        b = self.liquidity
+        self._offset = max(self.quantities)
+        self._sum_exp = math.fsum(math.exp((q - self._offset) / b) for q in self.quantities)
+        self._trades_since_rebuild = 0
+
+    def _term(self, index):
+        return math.exp((self.quantities[index] - self._offset) / self.liquidity)
+
+    def _log_sum_exp(self):
+        """log(sum(exp(q_i / b))) relative to the offset"""
+        return math.log(self._sum_exp)
+
+    def cost(self):
+        return self._offset + self.liquidity * self._log_sum_exp()
+
+    def price(self, index):
+        return self._term(index) / self._sum_exp
+
+    def prices(self):
+        total = self._sum_exp
+        return [self._term(index) / total for index in range(self.num_outcomes)]
+
+    def cost_for_shares(self, index, shares):
+        b = self.liquidity
+        log_sum = self._log_sum_exp()
+        term = self._term(index)
+        rest = self._sum_exp - term
+        log_rest = math.log(rest) if rest > 0 else -math.inf
+        exponent = (self.quantities[index] + shares - self._offset) / b
+        return b * (_log_add_exp(log_rest, exponent) - log_sum)
+
+    def shares_for_points(self, index, points):
+        """Closed form inverse of cost_for_shares.
+
+        Solves b * log(S' / S) = points for the new quantity of the outcome:
+        shares = b * log(1 + r * (exp(points / b) - 1)) with r = S / term_i.
+        """
+        if points <= 0:
+            return 0.0
+        b = self.liquidity
+        x = points / b
+        # log(r) >= 0, computed in log space so a tiny term can't overflow r
+        log_r = self._log_sum_exp() - (self.quantities[index] - self._offset) / b
+        if x < 1 and log_r < 30:
+            return b * math.log1p(math.exp(log_r) * math.expm1(x))
+        return b * (x + log_r + math.log1p(math.expm1(-log_r) * math.exp(-x)))
+
+    def buy(self, index, shares):
+        b = self.liquidity
+        old_term = self._term(index)
+        self.quantities[index] += shares
+        new_quantity = self.quantities[index]
+        if new_quantity > self._offset:
+            # Re-base on the new maximum so every exponent stays <= 0
+            self._sum_exp = (self._sum_exp - old_term) * math.exp((self._offset - new_quantity) / b) + 1.0
+            self._offset = new_quantity
+        else:
+            self._sum_exp += math.exp((new_quantity - self._offset) / b) - old_term
+
+        self._trades_since_rebuild += 1
+        if shares < 0 or self._sum_exp < 1.0 or self._trades_since_rebuild >= self.REBUILD_INTERVAL:
+            self._rebuild()
+
+    def get_state(self):
+        return {"liquidity": self.liquidity, "quantities": list(self.quantities)}
+
+    def load_state(self, state):
+        self.liquidity = float(state["liquidity"])
+        self.quantities = [float(q) for q in state["quantities"]]
+        self.num_outcomes = len(self.quantities)
+        self._rebuild()
@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+
+import discord
+
+from helpers.SimplePointsManager import TokenBucket
+
+logger = logging.getLogger("discord_bot")
+
+# Discord's per-message limits
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+
+
+class Notification:
+    __slots__ = ("user_id", "content", "embed", "kind", "outcome", "attempts", "error", "created")
+
+    def __init__(self, user_id, content=None, embed=None, kind="message"):
+        self.user_id = user_id
+        self.content = content
+        self.embed = embed
+        self.kind = kind
+        # None while queued, then sent / closed / skipped / unknown_user / failed
+        self.outcome = None
+        self.attempts = 0
+        self.error = None
+        self.created = time.time()
+
+
+class NotificationDispatcher:
+    """Delivers DMs from a queue with a small pool of workers.
+
+    Notifications are grouped per user: while a user has messages waiting
+    they are queued once, and a worker sends everything pending for them
+    in as few DMs as Discord's limits allow. Sends share one token bucket
+    so bulk notifications stay under the DM rate limit. Users whose DMs
+    are closed are remembered and skipped for `closed_retry_after` seconds.
+    """
+
+    def __init__(self, bot, workers=4, rate=5.0, burst=5, max_attempts=3, backoff=1.0,
+                 user_cache_size=10000, closed_retry_after=86400.0):
+        self.bot = bot
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.user_cache_size = user_cache_size
+        self.closed_retry_after = closed_retry_after
+        self._queue = asyncio.Queue()
+        # user_id -> notifications not sent yet, the user is queued once
+        self._pending = {}
+        # Users fetched over REST, LRU ordered
+        self._users = OrderedDict()
+        # user_id -> time until which their closed DMs aren't retried
+        self.closed_dms = {}
+        self._tasks = []
+        self.outcomes = Counter()
+        self.messages_sent = 0
+        self.user_fetches = 0
+        self.recent_failures = deque(maxlen=100)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=10.0):
+        """Give queued notifications `timeout` seconds to go out, then stop the workers"""
+        if self._tasks and self._pending:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping notifications for {len(self._pending)} users on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send(self, user_id, content=None, embed=None, kind="message"):
+        """Queue a DM and return its Notification, never blocks"""
+        notification = Notification(user_id, content, embed, kind)
+        if self._is_closed(user_id):
+            self._finish(notification, "skipped")
+            return notification
+        pending = self._pending.get(user_id)
+        if pending is None:
+            self._pending[user_id] = [notification]
+            self._queue.put_nowait(user_id)
+        else:
+            pending.append(notification)
+        return notification
+
+    def _is_closed(self, user_id):
+        until = self.closed_dms.get(user_id)
+        if until is None:
+            return False
+        if time.time() >= until:
+            del self.closed_dms[user_id]
+            return False
+        return True
+
+    def _finish(self, notification, outcome, error=None):
+        notification.outcome = outcome
+        notification.error = error
+        self.outcomes[outcome] += 1
+        if outcome == "failed":
+            self.recent_failures.append((notification.user_id, notification.kind, error))
+
+    async def get_user(self, user_id):
+        """The gateway cache first, then users fetched before, then REST"""
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+            return user
+        self.user_fetches += 1
+        user = await self.bot.fetch_user(user_id)
+        self._users[user_id] = user
+        if len(self._users) > self.user_cache_size:
+            self._users.popitem(last=False)
+        return user
+
+    @staticmethod
+    def _split(text):
+        """Cut text into pieces Discord accepts, preferring line then word boundaries"""
+        pieces = []
+        while len(text) > MAX_CONTENT_LENGTH:
+            cut = text.rfind("\n", 0, MAX_CONTENT_LENGTH + 1)
+            if cut <= 0:
+                cut = text.rfind(" ", 0, MAX_CONTENT_LENGTH + 1)
+            if cut <= 0:
+                cut = MAX_CONTENT_LENGTH
+            pieces.append(text[:cut])
+            text = text[cut:].lstrip("\n ")
+        if text or not pieces:
+            pieces.append(text)
+        return pieces
+
+    @classmethod
+    def _pack(cls, notifications):
+        """Split a user's notifications into DMs of (content, embeds, notifications)
+
+        A notification too long for one DM is sent over several, each listing it.
+        """
+        messages = []
+        content, embeds, included = "", [], []
+        for notification in notifications:
+            *head, text = cls._split(notification.content or "")
+            if head:
+                if included:
+                    messages.append((content, embeds, included))
+                    content, embeds, included = "", [], []
+                messages.extend((piece, [], [notification]) for piece in head)
+            joined = f"{content}\n\n{text}" if content and text else content or text
+            if included and (len(joined) > MAX_CONTENT_LENGTH or
+                             (notification.embed is not None and len(embeds) >= MAX_EMBEDS)):
+                messages.append((content, embeds, included))
+                content, embeds, included = text, [], []
+            else:
+                content = joined
+            if notification.embed is not None:
+                embeds.append(notification.embed)
+            included.append(notification)
+        if included:
+            messages.append((content, embeds, included))
+        return messages
+
+    async def _worker(self):
+        while True:
+            user_id = await self._queue.get()
+            try:
+                notifications = self._pending.pop(user_id, [])
+                await self._deliver(user_id, notifications)
+            except Exception as e:
+                logger.error(f"Notification worker failed for {user_id}: {type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, user_id, notifications):
+        if self._is_closed(user_id):
+            for notification in notifications:
+                self._finish(notification, "skipped")
+            return
+        try:
+            user = await self.get_user(user_id)
+        except discord.NotFound:
+            for notification in notifications:
+                self._finish(notification, "unknown_user")
+            return
+        except discord.HTTPException as e:
+            for notification in notifications:
+                self._finish(notification, "failed", f"fetch_user: {e}")
+            return
+
+        messages = self._pack(notifications)
+        # A split notification is finished by its last DM, or by the first one that fails
+        last = {id(notification): i for i, (_, _, batch) in enumerate(messages) for notification in batch}
+        for i, (content, embeds, batch) in enumerate(messages):
+            batch = [notification for notification in batch if notification.outcome is None]
+            if not batch:
+                continue
+            outcome, error = await self._send(user, content, embeds, batch)
+            for notification in batch:
+                if outcome != "sent" or last[id(notification)] == i:
+                    self._finish(notification, outcome, error)
+            if outcome == "closed":
+                self.closed_dms[user_id] = time.time() + self.closed_retry_after
+                for notification in notifications:
+                    if notification.outcome is None:
+                        self._finish(notification, "skipped")
+                return
+
+    async def _send(self, user, content, embeds, batch):
+        error = None
+        for attempt in range(self.max_attempts):
+            for notification in batch:
+                notification.attempts = attempt + 1
+            await self.rate_limiter.acquire()
+            try:
+                if embeds:
+                    await user.send(content=content or None, embeds=embeds)
+                else:
+                    await user.send(content)
+                self.rate_limiter.on_success()
+                self.messages_sent += 1
+                return "sent", None
+            except discord.Forbidden as e:
+                return "closed", str(e)
+            except discord.HTTPException as e:
+                error = f"{e.status}: {e.text}"
+                if e.status == 429:
+                    retry_after = getattr(e.response, "headers", {}).get("Retry-After")
+                    self.rate_limiter.on_throttled(float(retry_after) if retry_after else self.backoff)
+                elif e.status < 500:
+                    return "failed", error
+                else:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+            except asyncio.TimeoutError:
+                error = "timed out"
+        return "failed", error
+
+    def stats(self):
+        return {
+            "queued_users": len(self._pending),
+            "queued_messages": sum(len(pending) for pending in self._pending.values()),
+            "messages_sent": self.messages_sent,
+            "user_fetches": self.user_fetches,
+            "cached_users": len(self._users),
+            "closed_dms": len(self.closed_dms),
+            **{f"outcome_{outcome}": count for outcome, count in self.outcomes.items()},
+        }
+
+
+class OutcomeDigest:
+    """Coalesces a user's market outcomes into one DM per window.
+
+    The first win, loss or refund for a user starts a `window` second
+    timer on the deadline scheduler; everything that lands before it fires
+    goes out as a single embed with the net result. A window of 0 sends
+    every outcome on its own.
+    """
+
+    # Embed descriptions are capped at 4096 characters
+    MAX_LINES = 25
+
+    def __init__(self, notifier, scheduler, window=60.0):
+        self.notifier = notifier
+        self.scheduler = scheduler
+        self.window = window
+        # user_id -> [(kind, question, staked, returned, message)]
+        self._buffers = {}
+        self.events = 0
+        self.digests_sent = 0
+
+    def add(self, user_id, kind, question, staked, returned, message):
+        """Buffer an outcome; `message` is what's sent if it ends up alone"""
+        self.events += 1
+        if self.window <= 0:
+            self.notifier.send(user_id, message, kind=kind)
+            return
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            self._buffers[user_id] = [(kind, question, staked, returned, message)]
+            self.scheduler.schedule(("digest", user_id), time.time() + self.window, lambda: self._fire(user_id))
+        else:
+            buffer.append((kind, question, staked, returned, message))
+
+    async def _fire(self, user_id):
+        self.flush_user(user_id)
+
+    def flush_user(self, user_id):
+        events = self._buffers.pop(user_id, None)
+        if not events:
+            return
+        self.scheduler.cancel(("digest", user_id))
+        if len(events) == 1:
+            kind, _, _, _, message = events[0]
+            self.notifier.send(user_id, message, kind=kind)
+            return
+        self.notifier.send(user_id, embed=self._build_embed(events), kind="digest")
+        self.digests_sent += 1
+
+    def flush(self):
+        """Send every buffered digest now, used on shutdown"""
+        for user_id in list(self._buffers):
+            self.flush_user(user_id)
+
+    def _build_embed(self, events):
+        net = sum(returned - staked for _, _, staked, returned, _ in events)
+        lines = []
+        for kind, question, staked, returned, _ in events[:self.MAX_LINES]:
+            if kind == "win":
+                lines.append(f"🎉 **{question}**: {staked:,} → {returned:,} (+{returned - staked:,})")
+            elif kind == "loss":
+                lines.append(f"❌ **{question}**: -{staked:,}")
+            else:
+                lines.append(f"💰 **{question}**: {returned:,} refunded")
+        if len(events) > self.MAX_LINES:
+            lines.append(f"…and {len(events) - self.MAX_LINES} more")
+
+        embed = discord.Embed(
+            title="Your market results",
+            description="\n".join(lines)[:4096],
+            color=discord.Color.green() if net >= 0 else discord.Color.red()
+        )
+        embed.add_field(name="Net", value=f"{net:+,} Points", inline=True)
+        embed.add_field(name="Markets", value=str(len({question for _, question, _, _, _ in events})), inline=True)
+        return embed
+
+    def stats(self):
+        return {
+            "buffered_users": len(self._buffers),
+            "events": self.events,
+            "digests_sent": self.digests_sent,
+        }
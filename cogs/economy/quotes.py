@@ -0,0 +1,156 @@
+import numpy as np
+
+from .market_maker import LMSRMarketMaker
+
+
+class QuoteBook:
+    """Keeps the LMSR state of many markets in contiguous NumPy arrays.
+
+    Row i of `_quantities` holds the outstanding shares of one market, padded
+    with masked columns up to the widest market. Quotes for any set of
+    markets are computed in one vectorized pass over those rows. Only open
+    markets are kept; the rest are quoted one by one by `quote`.
+    """
+
+    def __init__(self, capacity=64, max_options=2):
+        self._quantities = np.zeros((capacity, max_options), dtype=np.float64)
+        self._mask = np.zeros((capacity, max_options), dtype=bool)
+        self._liquidity = np.ones(capacity, dtype=np.float64)
+        self._rows = {}
+        self._owners = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, prediction):
+        return prediction in self._rows
+
+    def _grow(self, rows, columns):
+        capacity, width = self._quantities.shape
+        new_capacity = capacity
+        while new_capacity < rows:
+            new_capacity *= 2
+        new_width = max(width, columns)
+        if (new_capacity, new_width) == (capacity, width):
+            return
+        quantities = np.zeros((new_capacity, new_width), dtype=np.float64)
+        mask = np.zeros((new_capacity, new_width), dtype=bool)
+        liquidity = np.ones(new_capacity, dtype=np.float64)
+        quantities[:capacity, :width] = self._quantities
+        mask[:capacity, :width] = self._mask
+        liquidity[:capacity] = self._liquidity
+        self._quantities, self._mask, self._liquidity = quantities, mask, liquidity
+
+    def add(self, prediction):
+        """Allocate a row for a market and copy its pool into it"""
+        if prediction not in self._rows:
+            self._grow(self._size + 1, len(prediction.options))
+            self._rows[prediction] = self._size
+            self._owners.append(prediction)
+            self._size += 1
+        self.update(prediction)
+
+    def update(self, prediction):
+        """Copy a market's pool into its row, call after every trade"""
+        row = self._rows.get(prediction)
+        if row is None:
+            return
+        quantities = prediction.market_maker.quantities
+        self._grow(self._size, len(quantities))
+        self._quantities[row, :] = 0
+        self._quantities[row, :len(quantities)] = quantities
+        self._mask[row, :] = False
+        self._mask[row, :len(quantities)] = True
+        self._liquidity[row] = prediction.market_maker.liquidity
+
+    def remove(self, prediction):
+        """Free a market's row by moving the last row into its place"""
+        row = self._rows.pop(prediction, None)
+        if row is None:
+            return
+        last = self._size - 1
+        moved = self._owners.pop()
+        if row != last:
+            self._owners[row] = moved
+            self._quantities[row] = self._quantities[last]
+            self._mask[row] = self._mask[last]
+            self._liquidity[row] = self._liquidity[last]
+            self._rows[moved] = row
+        self._mask[last] = False
+        self._size -= 1
+
+    def quote_arrays(self, predictions, points_to_spend=100):
+        """Vectorized quote for a list of markets.
+
+        Returns (mask, potential_shares, price_per_share, probabilities) as
+        arrays of shape (len(predictions), max_options). Probabilities are
+        the normalized inverse price per share, in percent.
+        """
+        for prediction in predictions:
+            if prediction not in self._rows:
+                self.add(prediction)
+        rows = np.fromiter((self._rows[p] for p in predictions), dtype=np.intp, count=len(predictions))
+        mask = self._mask[rows]
+        b = self._liquidity[rows][:, None]
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            scaled = np.where(mask, self._quantities[rows] / b, -np.inf)
+            top = scaled.max(axis=1, keepdims=True)
+            log_sum = np.log(np.exp(scaled - top).sum(axis=1, keepdims=True)) + top
+            # log(S / term_i), see LMSRMarketMaker.shares_for_points
+            log_r = np.where(mask, log_sum - scaled, 0.0)
+            x = points_to_spend / b
+            small = (x < 1) & (log_r < 30)
+            shares_small = np.log1p(np.exp(np.minimum(log_r, 30)) * np.expm1(x))
+            shares_large = x + log_r + np.log1p(np.expm1(-log_r) * np.exp(-x))
+            shares = np.where(mask, b * np.where(small, shares_small, shares_large), 0.0)
+            if points_to_spend <= 0:
+                shares[:] = 0.0
+
+            price_per_share = np.where(shares > 0, points_to_spend / shares, np.inf)
+            raw_odds = np.where(mask & (price_per_share > 0), 1 / price_per_share, 0.0)
+            total_odds = raw_odds.sum(axis=1, keepdims=True)
+            probabilities = np.where(total_odds > 0, raw_odds / total_odds * 100, 0.0)
+
+        return mask, shares, price_per_share, probabilities
+
+    def quote(self, predictions, points_to_spend=100):
+        """Batch version of Prediction.get_current_prices.
+
+        Returns one dict per market shaped like get_current_prices, with an
+        extra 'probability' entry per option. Markets that don't use LMSR
+        fall back to their own get_current_prices, as do markets that aren't
+        in the book.
+        """
+        batched = [p for p in predictions if p in self._rows and isinstance(p.market_maker, LMSRMarketMaker)]
+        results = {}
+        if batched:
+            _, shares, price_per_share, probabilities = self.quote_arrays(batched, points_to_spend)
+            shares = shares.tolist()
+            price_per_share = price_per_share.tolist()
+            probabilities = probabilities.tolist()
+            for i, prediction in enumerate(batched):
+                results[prediction] = {
+                    option: {
+                        'price_per_share': price_per_share[i][index],
+                        'potential_shares': shares[i][index],
+                        'potential_payout': shares[i][index],
+                        'probability': probabilities[i][index]
+                    }
+                    for index, option in enumerate(prediction.options)
+                }
+
+        quotes = []
+        for prediction in predictions:
+            if prediction in results:
+                quotes.append(results[prediction])
+                continue
+            prices = prediction.get_current_prices(points_to_spend)
+            raw_odds = {opt: 1 / price['price_per_share'] if price['price_per_share'] > 0 else 0
+                        for opt, price in prices.items()}
+            total_odds = sum(raw_odds.values())
+            for opt, price in prices.items():
+                price['probability'] = raw_odds[opt] / total_odds * 100 if total_odds > 0 else 0
+            quotes.append(prices)
+        return quotes
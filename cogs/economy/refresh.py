@@ -0,0 +1,71 @@
+import logging
+import time
+import weakref
+
+logger = logging.getLogger("discord_bot")
+
+
+class ViewRefresher:
+    """Debounces message edits for views that show live prices.
+
+    A bet only marks its market's views dirty. Each dirty view gets one
+    flush on the deadline scheduler, no sooner than `interval` seconds
+    after its last edit, so a burst of bets becomes a single edit. The
+    flush is skipped when the prices the view displays are unchanged at
+    the precision it shows them.
+    """
+
+    def __init__(self, scheduler, interval=2.0, on_error=None):
+        self.scheduler = scheduler
+        self.interval = interval
+        # Called with a view whose edit failed, e.g. to drop it
+        self.on_error = on_error
+        # view -> (time of last edit, price signature it displays)
+        self._shown = weakref.WeakKeyDictionary()
+        self.marks = 0
+        self.edits = 0
+        self.coalesced = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def shown(self, view):
+        """Record what a freshly sent view displays"""
+        self._shown[view] = (time.time(), view.price_signature())
+
+    def mark_dirty(self, view):
+        self.marks += 1
+        key = ("refresh", id(view))
+        if key in self.scheduler:
+            self.coalesced += 1
+            return
+        last_edit, _ = self._shown.get(view, (0.0, None))
+        when = max(time.time(), last_edit + self.interval)
+        self.scheduler.schedule(key, when, lambda: self._flush(view))
+
+    async def _flush(self, view):
+        signature = view.price_signature()
+        _, shown = self._shown.get(view, (0.0, None))
+        if signature == shown:
+            self.unchanged += 1
+            return
+        try:
+            await view.refresh_view(view.stored_interaction)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Refreshing a view failed: {type(e).__name__}: {e}")
+            if self.on_error:
+                self.on_error(view)
+            return
+        self._shown[view] = (time.time(), signature)
+        self.edits += 1
+
+    def stats(self):
+        return {
+            "marks": self.marks,
+            "edits": self.edits,
+            # Bets that didn't cost an edit of their own
+            "saved": self.marks - self.edits - self.failed,
+            "coalesced": self.coalesced,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+        }
@@ -0,0 +1,232 @@
+import bisect
+import heapq
+import itertools
+import time
+
+from .scheduler import to_timestamp
+from .state import MarketState
+
+STATUSES = MarketState.ALL
+
+# 2024-01-01T00:00:00Z in milliseconds
+MARKET_EPOCH = 1704067200000
+
+
+class SnowflakeGenerator:
+    """Time-ordered 63-bit IDs: 41 bits of milliseconds, 10 of worker, 12 of sequence.
+
+    IDs sort by creation time and never depend on what's in the database,
+    so several bot processes with distinct worker IDs can create markets.
+    """
+
+    def __init__(self, worker_id=0, epoch=MARKET_EPOCH, clock=time.time):
+        if not 0 <= worker_id < 1024:
+            raise ValueError("worker_id must be between 0 and 1023")
+        self.worker_id = worker_id
+        self.epoch = epoch
+        self._clock = clock
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        # Never go backwards, even if the wall clock does
+        now_ms = max(int(self._clock() * 1000) - self.epoch, self._last_ms)
+        if now_ms == self._last_ms:
+            self._sequence = (self._sequence + 1) & 0xFFF
+            if self._sequence == 0:
+                # 4096 IDs this millisecond, borrow the next one
+                now_ms += 1
+        else:
+            self._sequence = 0
+        self._last_ms = now_ms
+        return (now_ms << 22) | (self.worker_id << 12) | self._sequence
+
+    @staticmethod
+    def timestamp(snowflake, epoch=MARKET_EPOCH):
+        """Creation time of an ID in epoch seconds"""
+        return ((snowflake >> 22) + epoch) / 1000
+
+
+class MarketRegistry:
+    """Every market by ID, plus secondary indexes for the commands.
+
+    Indexes map a guild, category, creator or state to the markets with
+    it, as insertion-ordered dicts so lookups and updates are O(1). Each
+    guild also keeps sorted lists of market IDs and of (end_time,
+    market_id) and a count per category for every state, so a page of the
+    board, the markets closing next or the categories with open markets
+    never walk the guild's other markets. Call
+    `update_status` after every transition of a market's state; it moves
+    the market to its new bucket and fires `on_transition(prediction,
+    old, new)`.
+    """
+
+    def __init__(self, on_transition=None):
+        self.on_transition = on_transition
+        self.transitions = 0
+        self._markets = {}
+        self._by_guild = {}
+        self._by_category = {}
+        self._by_creator = {}
+        self._by_status = {status: {} for status in STATUSES}
+        self._status = {}
+        # (guild_id, state) -> sorted market IDs
+        self._guild_status = {}
+        # (guild_id, state) -> sorted (end_time, market_id)
+        self._guild_end_times = {}
+        # (guild_id, state) -> {category: number of markets}
+        self._guild_categories = {}
+
+    def __len__(self):
+        return len(self._markets)
+
+    def __iter__(self):
+        return iter(self._markets.values())
+
+    def __contains__(self, market_id):
+        return market_id in self._markets
+
+    def get(self, market_id):
+        return self._markets.get(market_id)
+
+    def add(self, prediction):
+        market_id = prediction.market_id
+        if market_id in self._markets:
+            raise ValueError(f"Market {market_id} is already registered")
+        self._markets[market_id] = prediction
+        self._by_guild.setdefault(prediction.guild_id, {})[market_id] = prediction
+        self._by_category.setdefault(prediction.category, {})[market_id] = prediction
+        self._by_creator.setdefault(prediction.creator_id, {})[market_id] = prediction
+        self._status[market_id] = prediction.state
+        self._by_status[prediction.state][market_id] = prediction
+        self._index_guild_status(prediction, prediction.state)
+
+    def update_status(self, prediction):
+        """Move a market to the bucket of its current state, returns the new state"""
+        market_id = prediction.market_id
+        old = self._status.get(market_id)
+        new = prediction.state
+        if old != new:
+            if old is not None:
+                self._by_status[old].pop(market_id, None)
+                self._unindex_guild_status(prediction, old)
+            self._by_status[new][market_id] = prediction
+            self._index_guild_status(prediction, new)
+            self._status[market_id] = new
+            self.transitions += 1
+            if self.on_transition and old is not None:
+                self.on_transition(prediction, old, new)
+        return new
+
+    def _index_guild_status(self, prediction, state):
+        key = (prediction.guild_id, state)
+        bisect.insort(self._guild_status.setdefault(key, []), prediction.market_id)
+        bisect.insort(self._guild_end_times.setdefault(key, []), (to_timestamp(prediction.end_time), prediction.market_id))
+        if prediction.category:
+            categories = self._guild_categories.setdefault(key, {})
+            categories[prediction.category] = categories.get(prediction.category, 0) + 1
+
+    def _unindex_guild_status(self, prediction, state):
+        key = (prediction.guild_id, state)
+        market_ids = self._guild_status[key]
+        del market_ids[bisect.bisect_left(market_ids, prediction.market_id)]
+        end_times = self._guild_end_times[key]
+        del end_times[bisect.bisect_left(end_times, (to_timestamp(prediction.end_time), prediction.market_id))]
+        if prediction.category:
+            categories = self._guild_categories[key]
+            categories[prediction.category] -= 1
+            if not categories[prediction.category]:
+                del categories[prediction.category]
+
+    @staticmethod
+    def _guild_keys(guild_id):
+        """A guild sees its own markets plus ones created before markets had a guild"""
+        return (guild_id, None) if guild_id is not None else (None,)
+
+    def status(self, market_id):
+        return self._status.get(market_id)
+
+    def count(self, guild_id, statuses=STATUSES):
+        """Number of a guild's markets in any of `statuses`, without listing them"""
+        return sum(
+            len(self._guild_status.get((key, status), ()))
+            for key in self._guild_keys(guild_id) for status in statuses
+        )
+
+    def page(self, guild_id, status, start, stop):
+        """A guild's markets in `status` at positions [start, stop) in ID order.
+
+        Only the markets on the page are looked up; the guild's own and its
+        legacy markets are two sorted lists, merged from the page's start.
+        """
+        own = self._guild_status.get((guild_id, status), [])
+        legacy = self._guild_status.get((None, status), []) if guild_id is not None else []
+        stop = min(stop, len(own) + len(legacy))
+        if start >= stop:
+            return []
+        # Binary search for how many of the first `start` IDs come from `own`
+        lo, hi = max(0, start - len(legacy)), min(start, len(own))
+        while lo < hi:
+            taken = (lo + hi) // 2
+            if legacy[start - taken - 1] > own[taken]:
+                lo = taken + 1
+            else:
+                hi = taken
+        size = stop - start
+        merged = heapq.merge(own[lo:lo + size], legacy[start - lo:start - lo + size])
+        return [self._markets[market_id] for market_id in itertools.islice(merged, size)]
+
+    def query(self, guild_id=None, statuses=None, category=None, creator_id=None):
+        """Markets matching every given filter, walking the smallest index only"""
+        candidates = []
+        if statuses is not None:
+            candidates.append([self._by_status[status] for status in statuses])
+        if category is not None:
+            candidates.append([self._by_category.get(category, {})])
+        if creator_id is not None:
+            candidates.append([self._by_creator.get(creator_id, {})])
+        if guild_id is not None:
+            candidates.append([self._by_guild.get(guild_id, {}), self._by_guild.get(None, {})])
+        if not candidates:
+            return list(self._markets.values())
+
+        smallest = min(candidates, key=lambda indexes: sum(len(index) for index in indexes))
+        status_set = set(statuses) if statuses is not None else None
+        matches = []
+        for index in smallest:
+            for market_id, prediction in index.items():
+                if status_set is not None and self._status[market_id] not in status_set:
+                    continue
+                if category is not None and prediction.category != category:
+                    continue
+                if creator_id is not None and prediction.creator_id != creator_id:
+                    continue
+                if guild_id is not None and prediction.guild_id not in (guild_id, None):
+                    continue
+                matches.append(prediction)
+        # Snowflake IDs sort by creation time
+        matches.sort(key=lambda prediction: prediction.market_id)
+        return matches
+
+    def categories(self, guild_id=None, statuses=(MarketState.OPEN,)):
+        """Categories of a guild's markets in `statuses`, read from the per-guild category counts"""
+        return sorted({
+            category
+            for key in self._guild_keys(guild_id) for status in statuses
+            for category in self._guild_categories.get((key, status), ())
+        })
+
+    def closing_soonest(self, guild_id, limit, status=MarketState.OPEN):
+        """A guild's first `limit` markets in `status` by end_time, merged from its two sorted lists"""
+        end_times = [self._guild_end_times.get((key, status), []) for key in self._guild_keys(guild_id)]
+        return [self._markets[market_id] for _, market_id in itertools.islice(heapq.merge(*end_times), limit)]
+
+    def stats(self):
+        return {
+            "markets": len(self._markets),
+            "guilds": len(self._by_guild),
+            "categories": len(self._by_category),
+            "creators": len(self._by_creator),
+            "transitions": self.transitions,
+            **{f"status_{status}": len(index) for status, index in self._by_status.items()},
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger("discord_bot")
+
+
+def to_timestamp(when):
+    """Epoch seconds for a naive UTC datetime (or pass through a number)"""
+    if isinstance(when, datetime.datetime):
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        return when.timestamp()
+    return float(when)
+
+
+class DeadlineScheduler:
+    """Runs every market deadline (close, refund, ...) from a single task.
+
+    Deadlines live in a min-heap keyed by time. Cancelling or rescheduling
+    only updates `_entries`; the stale heap item is skipped when it surfaces,
+    and the heap is compacted once stale items outnumber live ones.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._heap = []
+        # key -> (when, seq, callback), the only live entry for that key
+        self._entries = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self._running = set()
+        self.fired = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop, deadlines already firing run to completion"""
+        if self._task:
+            # Not cancelled: wait_for can swallow a cancel that lands as the wakeup fires
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def schedule(self, key, when, callback):
+        """Run `await callback()` at `when`, replacing any deadline with the same key"""
+        when = to_timestamp(when)
+        seq = next(self._seq)
+        self._entries[key] = (when, seq, callback)
+        heapq.heappush(self._heap, (when, seq, key))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+        # Wake the loop in case this is now the earliest deadline
+        self._wakeup.set()
+
+    def reschedule(self, key, when):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        self.schedule(key, when, entry[2])
+        return True
+
+    def cancel(self, key):
+        return self._entries.pop(key, None) is not None
+
+    def deadline(self, key):
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def next_deadline(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def stats(self):
+        return {
+            "pending": len(self._entries),
+            "heap_size": len(self._heap),
+            "running": len(self._running),
+            "fired": self.fired,
+            "failed": self.failed,
+            "next_deadline": self.next_deadline(),
+        }
+
+    def _compact(self):
+        self._heap = [(when, seq, key) for key, (when, seq, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap:
+            when, seq, key = heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(heap)
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            next_when = self.next_deadline()
+            if next_when is None:
+                await self._wakeup.wait()
+                continue
+
+            delay = next_when - self._clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = self._clock()
+            while self._heap:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, _, key = heapq.heappop(self._heap)
+                _, _, callback = self._entries.pop(key)
+                task = asyncio.create_task(self._fire(key, callback))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key, callback):
+        try:
+            await callback()
+            self.fired += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Deadline {key} failed: {type(e).__name__}: {e}")
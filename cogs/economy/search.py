@@ -0,0 +1,97 @@
+import bisect
+import heapq
+import re
+
+WORD = re.compile(r"\w+")
+
+# Sorts after every other character, bounds a prefix range of the vocabulary
+MAX_CHAR = "\U0010ffff"
+
+
+def tokenize(text):
+    return WORD.findall(text.lower()) if text else []
+
+
+class MarketSearch:
+    """Prefix search over market questions and categories, for autocomplete.
+
+    An inverted index maps each word to the markets containing it, and a
+    sorted vocabulary turns a typed prefix into a range of words with two
+    bisects. The word with the fewest candidate markets picks the
+    candidates; every other typed word is checked against each candidate's
+    own words. Markets are added when created and removed once resolved or
+    refunded, so the index only holds markets someone can still pick.
+    """
+
+    def __init__(self):
+        # word -> {market_id: prediction}
+        self._postings = {}
+        # Every indexed word, sorted
+        self._vocabulary = []
+        # market_id -> its words
+        self._words = {}
+        self.searches = 0
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, market_id):
+        return market_id in self._words
+
+    def add(self, prediction):
+        market_id = prediction.market_id
+        if market_id in self._words:
+            return
+        words = frozenset(tokenize(prediction.question) + tokenize(prediction.category))
+        self._words[market_id] = words
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                bisect.insort(self._vocabulary, word)
+            postings[market_id] = prediction
+
+    def remove(self, prediction):
+        words = self._words.pop(prediction.market_id, None)
+        if words is None:
+            return
+        for word in words:
+            postings = self._postings[word]
+            del postings[prediction.market_id]
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+
+    def completions(self, prefix):
+        """Indexed words starting with `prefix`"""
+        lo = bisect.bisect_left(self._vocabulary, prefix)
+        hi = bisect.bisect_left(self._vocabulary, prefix + MAX_CHAR, lo)
+        return self._vocabulary[lo:hi]
+
+    def search(self, query, predicate=None, limit=25, key=lambda prediction: prediction.end_time):
+        """Up to `limit` markets with a word starting with every word of `query`, smallest `key` first"""
+        self.searches += 1
+        prefixes = set(tokenize(query))
+        if not prefixes:
+            return []
+
+        ranges = {prefix: self.completions(prefix) for prefix in prefixes}
+        # The most selective prefix supplies the candidates
+        first = min(prefixes, key=lambda prefix: sum(len(self._postings[word]) for word in ranges[prefix]))
+        rest = prefixes - {first}
+        candidates = {}
+        for word in ranges[first]:
+            candidates.update(self._postings[word])
+
+        matches = []
+        for market_id, prediction in candidates.items():
+            words = self._words[market_id]
+            if rest and not all(any(word.startswith(prefix) for word in words) for prefix in rest):
+                continue
+            if predicate is not None and not predicate(prediction):
+                continue
+            matches.append(prediction)
+        return heapq.nsmallest(limit, matches, key=key)
+
+    def stats(self):
+        return {"markets": len(self._words), "words": len(self._vocabulary), "searches": self.searches}
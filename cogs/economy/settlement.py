@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from helpers.SimplePointsManager import CircuitOpenError, Throttled, ThrottledError
+
+logger = logging.getLogger("discord_bot")
+
+
+class SettlementResult:
+    __slots__ = ("user_id", "amount", "ok", "attempts", "error", "rejected")
+
+    def __init__(self, user_id, amount):
+        self.user_id = user_id
+        self.amount = amount
+        self.ok = False
+        self.attempts = 0
+        self.error = None
+        # The points service answered and said no, as opposed to a transient failure
+        self.rejected = False
+
+
+class SettlementReport:
+    """Outcome of paying out or refunding one market"""
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def total_paid(self):
+        return sum(result.amount for result in self.results if result.ok)
+
+    def summary(self):
+        return (
+            f"{len(self.succeeded)}/{len(self.results)} settled "
+            f"({self.total_paid:,} Points net) in {self.elapsed:.1f}s"
+        )
+
+
+class SettlementExecutor:
+    """Credits many users concurrently with a bounded number of in-flight calls.
+
+    Failed credits are retried with exponential backoff, writes the points
+    service refuses are not; every user ends up in the report either
+    credited or failed, so nothing is dropped silently.
+    """
+
+    def __init__(self, points_manager, concurrency=20, retries=3, backoff=0.5):
+        self.points_manager = points_manager
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+
+    async def _credit(self, result, semaphore, apply):
+        for attempt in range(self.retries + 1):
+            result.attempts = attempt + 1
+            result.rejected = False
+            delay = self.backoff * 2 ** attempt
+            try:
+                async with semaphore:
+                    outcome = await apply(result.user_id, result.amount)
+                if outcome:
+                    result.ok = True
+                    result.error = None
+                    return result
+                if isinstance(outcome, Throttled):
+                    result.error = "throttled"
+                    delay = max(delay, outcome.retry_after)
+                else:
+                    # A refusal won't change on retry, don't spend more calls on it
+                    result.error = "rejected by points service"
+                    result.rejected = True
+                    break
+            except ThrottledError as e:
+                result.error = "throttled"
+                delay = max(delay, e.retry_after)
+            except CircuitOpenError as e:
+                result.error = "points service unavailable"
+                delay = max(delay, e.retry_after)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result.error = f"{type(e).__name__}: {e}"
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+        logger.warning(f"Failed to credit {result.amount} to {result.user_id}: {result.error}")
+        return result
+
+    async def run(self, credits, on_progress=None, progress_every=1.0, apply=None):
+        """Credit every (user_id, amount) pair.
+
+        `apply(user_id, amount)` performs one write and defaults to
+        add_points. `on_progress(done, total)` is awaited at most once per
+        `progress_every` seconds and once at the end.
+        """
+        apply = apply or self.points_manager.add_points
+        results = [SettlementResult(user_id, amount) for user_id, amount in credits if amount]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+        last_progress = started
+        done = 0
+
+        for task in asyncio.as_completed([self._credit(result, semaphore, apply) for result in results]):
+            await task
+            done += 1
+            now = time.monotonic()
+            if on_progress and now - last_progress >= progress_every and done < len(results):
+                last_progress = now
+                try:
+                    await on_progress(done, len(results))
+                except Exception as e:
+                    logger.warning(f"Settlement progress callback failed: {e}")
+
+        report = SettlementReport(results, time.monotonic() - started)
+        if on_progress:
+            try:
+                await on_progress(done, len(results))
+            except Exception as e:
+                logger.warning(f"Settlement progress callback failed: {e}")
+        return report
@@ -0,0 +1,42 @@
+class MarketState:
+    """Open -> closed at end_time -> resolved by its creator or refunded.
+
+    A creator may also resolve a market early, straight from open. Every
+    other move is refused; resolved and refunded are final. Transitions
+    are made by the deadline scheduler and /resolve_prediction, nothing
+    compares end_time to the clock to find out where a market stands.
+    """
+
+    OPEN = "open"
+    CLOSED = "closed"
+    RESOLVED = "resolved"
+    REFUNDED = "refunded"
+
+    # Board order
+    ALL = (OPEN, CLOSED, RESOLVED, REFUNDED)
+
+    TRANSITIONS = {
+        OPEN: (CLOSED, RESOLVED),
+        CLOSED: (RESOLVED, REFUNDED),
+        RESOLVED: (),
+        REFUNDED: (),
+    }
+
+    @classmethod
+    def can_transition(cls, old, new):
+        return new in cls.TRANSITIONS[old]
+
+    @classmethod
+    def is_final(cls, state):
+        return not cls.TRANSITIONS[state]
+
+    @classmethod
+    def from_flags(cls, resolved, refunded, closed=False):
+        """State of a market stored as resolved/refunded/closed flags, open unless one is set"""
+        if refunded:
+            return cls.REFUNDED
+        if resolved:
+            return cls.RESOLVED
+        if closed:
+            return cls.CLOSED
+        return cls.OPEN
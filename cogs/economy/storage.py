@@ -0,0 +1,289 @@
+import asyncio
+import datetime
+import json
+import logging
+
+import aiosqlite
+
+from .state import MarketState
+
+logger = logging.getLogger("discord_bot")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS markets (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL,
+    category TEXT,
+    creator_id INTEGER NOT NULL,
+    guild_id INTEGER,
+    end_time TEXT NOT NULL,
+    resolved INTEGER NOT NULL DEFAULT 0,
+    refunded INTEGER NOT NULL DEFAULT 0,
+    closed INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+
+CREATE TABLE IF NOT EXISTS options (
+    market_id INTEGER NOT NULL REFERENCES markets(id),
+    option_index INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (market_id, option_index)
+);
+
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    market_id INTEGER NOT NULL REFERENCES markets(id),
+    user_id INTEGER NOT NULL,
+    option_index INTEGER NOT NULL,
+    points INTEGER NOT NULL,
+    shares REAL NOT NULL,
+    timestamp REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS trades_by_market ON trades (market_id, id);
+
+CREATE TABLE IF NOT EXISTS journal_entries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    market_id INTEGER,
+    timestamp REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS postings (
+    entry_id INTEGER NOT NULL REFERENCES journal_entries(id),
+    account TEXT NOT NULL,
+    amount INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS postings_by_entry ON postings (entry_id);
+
+CREATE TABLE IF NOT EXISTS pool_snapshots (
+    market_id INTEGER PRIMARY KEY REFERENCES markets(id),
+    trade_count INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+"""
+
+
+class MarketStore:
+    """SQLite persistence for markets, options, trades and pool state.
+
+    Writes are queued and a single writer task commits them in groups, at
+    most every `flush_interval` seconds or once `max_batch` writes are
+    pending, so callers never wait on an fsync.
+    """
+
+    def __init__(self, path, flush_interval=0.05, max_batch=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.db = None
+        self._pending = []
+        # Markets whose pool changed, serialized once at commit time
+        self._pending_snapshots = {}
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._writer = None
+        self._stopping = False
+        self._committing = False
+        self.commits = 0
+        self.writes = 0
+
+    async def open(self):
+        self.db = await aiosqlite.connect(self.path)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only syncs on checkpoints, which is safe against corruption
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.execute("PRAGMA foreign_keys=ON")
+        await self.db.executescript(SCHEMA)
+        await self._migrate()
+        await self.db.commit()
+        self._stopping = False
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        """Commit everything queued, then close the database"""
+        if self._writer:
+            # Not cancelled: the writer finishes the commit it's in and drains the queue
+            self._stopping = True
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+        if self.db:
+            await self._commit_pending()
+            await self.db.close()
+            self.db = None
+
+    async def _migrate(self):
+        """Bring databases created by older versions up to SCHEMA"""
+        async with self.db.execute("PRAGMA table_info(markets)") as cursor:
+            columns = {row[1] async for row in cursor}
+        if "guild_id" not in columns:
+            await self.db.execute("ALTER TABLE markets ADD COLUMN guild_id INTEGER")
+        if "closed" not in columns:
+            await self.db.execute("ALTER TABLE markets ADD COLUMN closed INTEGER NOT NULL DEFAULT 0")
+
+    def _enqueue(self, sql, params):
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _write_loop(self):
+        # Stopped with _stopping rather than cancelled, wait_for can swallow a
+        # cancel that lands as the wakeup fires
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._commit_pending()
+            except Exception as e:
+                logger.error(f"Failed to commit market writes: {e}")
+
+    async def _commit_pending(self):
+        if not self._pending and not self._pending_snapshots:
+            return
+        batch, self._pending = self._pending, []
+        snapshots, self._pending_snapshots = self._pending_snapshots, {}
+        self._committing = True
+        try:
+            for sql, params in batch:
+                await self.db.execute(sql, params)
+            await self.db.executemany(
+                "INSERT OR REPLACE INTO pool_snapshots (market_id, trade_count, state) VALUES (?, ?, ?)",
+                [
+                    (market_id, len(prediction.ledger), json.dumps(prediction.market_maker.get_state()))
+                    for market_id, prediction in snapshots.items()
+                ]
+            )
+            await self.db.commit()
+            self.commits += 1
+            self.writes += len(batch) + len(snapshots)
+        except Exception:
+            # Put the batch back so the next group commit retries it
+            await self.db.rollback()
+            self._pending[:0] = batch
+            for market_id, snapshot in snapshots.items():
+                self._pending_snapshots.setdefault(market_id, snapshot)
+            raise
+        finally:
+            self._committing = False
+            async with self._flushed:
+                self._flushed.notify_all()
+
+    async def flush(self):
+        """Wait until everything queued so far is committed"""
+        if self._writer is None:
+            await self._commit_pending()
+            return
+        async with self._flushed:
+            while self._pending or self._pending_snapshots or self._committing:
+                self._wakeup.set()
+                await self._flushed.wait()
+
+    def record_market(self, prediction):
+        self._enqueue(
+            "INSERT OR REPLACE INTO markets (id, question, category, creator_id, guild_id, end_time, resolved, refunded, closed, result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (prediction.market_id, prediction.question, prediction.category, prediction.creator_id, prediction.guild_id,
+             prediction.end_time.isoformat(), int(prediction.resolved), int(prediction.refunded),
+             int(not prediction.is_open), prediction.result)
+        )
+        for index, label in enumerate(prediction.options):
+            self._enqueue(
+                "INSERT OR REPLACE INTO options (market_id, option_index, label) VALUES (?, ?, ?)",
+                (prediction.market_id, index, label)
+            )
+        self.record_snapshot(prediction)
+
+    def record_trade(self, prediction, user_id, option_index, points, shares, timestamp):
+        self._enqueue(
+            "INSERT INTO trades (market_id, user_id, option_index, points, shares, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            (prediction.market_id, user_id, option_index, points, shares, timestamp)
+        )
+        self.record_snapshot(prediction)
+
+    def record_snapshot(self, prediction):
+        self._pending_snapshots[prediction.market_id] = prediction
+
+    def record_status(self, prediction):
+        """Persist resolved/refunded/closed/result after a market changes state"""
+        self._enqueue(
+            "UPDATE markets SET resolved = ?, refunded = ?, closed = ?, result = ? WHERE id = ?",
+            (int(prediction.resolved), int(prediction.refunded), int(not prediction.is_open), prediction.result,
+             prediction.market_id)
+        )
+
+    def record_journal_entry(self, entry):
+        self._enqueue(
+            "INSERT INTO journal_entries (id, kind, market_id, timestamp) VALUES (?, ?, ?, ?)",
+            (entry.id, entry.kind, entry.market_id, entry.timestamp)
+        )
+        for account, amount in entry.postings:
+            self._enqueue(
+                "INSERT INTO postings (entry_id, account, amount) VALUES (?, ?, ?)",
+                (entry.id, account, amount)
+            )
+
+    async def load_journal(self, entry_factory):
+        """Yield every journal entry in order, built by
+        `entry_factory(entry_id, kind, market_id, postings, timestamp)`"""
+        postings = {}
+        async with self.db.execute("SELECT entry_id, account, amount FROM postings") as cursor:
+            async for entry_id, account, amount in cursor:
+                postings.setdefault(entry_id, []).append((account, amount))
+        entries = []
+        async with self.db.execute("SELECT id, kind, market_id, timestamp FROM journal_entries ORDER BY id") as cursor:
+            async for entry_id, kind, market_id, timestamp in cursor:
+                entries.append(entry_factory(entry_id, kind, market_id, tuple(postings.get(entry_id, ())), timestamp))
+        return entries
+
+    async def load_predictions(self, prediction_factory):
+        """Rebuild every stored market.
+
+        `prediction_factory(market_id, question, end_time, options, creator_id, category, guild_id)`
+        must return a fresh Prediction; trades and pool state are then
+        restored into it.
+        """
+        predictions = {}
+        async with self.db.execute(
+            "SELECT id, question, category, creator_id, guild_id, end_time, resolved, refunded, closed, result "
+            "FROM markets ORDER BY id"
+        ) as cursor:
+            markets = await cursor.fetchall()
+
+        options = {}
+        async with self.db.execute(
+            "SELECT market_id, label FROM options ORDER BY market_id, option_index"
+        ) as cursor:
+            async for market_id, label in cursor:
+                options.setdefault(market_id, []).append(label)
+
+        for market_id, question, category, creator_id, guild_id, end_time, resolved, refunded, closed, result in markets:
+            prediction = prediction_factory(
+                market_id, question, datetime.datetime.fromisoformat(end_time),
+                options.get(market_id, []), creator_id, category, guild_id
+            )
+            prediction.state = MarketState.from_flags(resolved, refunded, closed)
+            prediction.result = result
+            predictions[market_id] = prediction
+
+        async with self.db.execute(
+            "SELECT market_id, user_id, option_index, points, shares, timestamp FROM trades ORDER BY id"
+        ) as cursor:
+            async for market_id, user_id, option_index, points, shares, timestamp in cursor:
+                prediction = predictions.get(market_id)
+                if prediction is not None:
+                    prediction.restore_trade(user_id, option_index, points, shares, timestamp)
+
+        async with self.db.execute("SELECT market_id, trade_count, state FROM pool_snapshots") as cursor:
+            async for market_id, trade_count, state in cursor:
+                prediction = predictions.get(market_id)
+                # A snapshot that lags the trades is ignored, restore_trade
+                # already rebuilt the pool from the trades themselves
+                if prediction is not None and trade_count == len(prediction.ledger):
+                    prediction.market_maker.load_state(json.loads(state))
+
+        return list(predictions.values())
@@ -0,0 +1,143 @@
+import logging
+import time
+import weakref
+from collections import OrderedDict
+
+logger = logging.getLogger("discord_bot")
+
+# Discord invalidates an interaction token 15 minutes after the interaction
+INTERACTION_TOKEN_TTL = 15 * 60
+
+
+class _Entry:
+    __slots__ = ("ref", "market_id", "expires")
+
+    def __init__(self, view, market_id, expires):
+        self.ref = weakref.ref(view)
+        self.market_id = market_id
+        self.expires = expires
+
+
+class ViewRegistry:
+    """Live views per market, bounded in size and in time.
+
+    Views are held by weak reference, so the registry never keeps one
+    alive on its own. A view is dropped once its interaction token can no
+    longer edit the message, when its market has more than `per_market`
+    views, or when the registry is over `capacity` and it's the least
+    recently refreshed. Dropped views are stopped, which also removes them
+    from discord.py's own view store. `sweep()` runs every
+    `sweep_interval` seconds on the deadline scheduler.
+    """
+
+    def __init__(self, scheduler, capacity=1000, per_market=50, token_ttl=INTERACTION_TOKEN_TTL - 30,
+                 sweep_interval=60.0, clock=time.time):
+        self.scheduler = scheduler
+        self.capacity = capacity
+        self.per_market = per_market
+        self.token_ttl = token_ttl
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        # market_id -> [_Entry], oldest first
+        self._by_market = {}
+        # Every live _Entry, least recently used first
+        self._lru = OrderedDict()
+        # view -> its _Entry
+        self._entries = weakref.WeakKeyDictionary()
+        self.registered = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    def start(self):
+        self.scheduler.schedule(("sweep_views",), self._clock() + self.sweep_interval, self._sweep_and_reschedule)
+
+    async def _sweep_and_reschedule(self):
+        try:
+            removed = self.sweep()
+            if removed:
+                logger.info(f"Swept {removed} stale views, {len(self)} live")
+        finally:
+            self.start()
+
+    def register(self, market_id, view):
+        """Track a view whose message was just sent with a fresh interaction"""
+        entry = _Entry(view, market_id, self._clock() + self.token_ttl)
+        self.discard(view)
+        self._by_market.setdefault(market_id, []).append(entry)
+        self._lru[entry] = None
+        self._entries[view] = entry
+        self.registered += 1
+
+        entries = self._by_market[market_id]
+        while len(entries) > self.per_market:
+            self._remove(entries[0], stop=True)
+            self.evicted += 1
+        while len(self._lru) > self.capacity:
+            self._remove(next(iter(self._lru)), stop=True)
+            self.evicted += 1
+
+    def touch(self, view):
+        """Mark a view as recently refreshed"""
+        entry = self._entries.get(view)
+        if entry is not None:
+            self._lru.move_to_end(entry)
+
+    def discard(self, view):
+        entry = self._entries.get(view)
+        if entry is not None:
+            self._remove(entry, stop=False)
+
+    def discard_market(self, market_id):
+        """Drop every view of a market, e.g. once it's resolved"""
+        for entry in list(self._by_market.get(market_id, ())):
+            self._remove(entry, stop=True)
+
+    def views(self, market_id):
+        """Live views of a market whose messages can still be edited"""
+        now = self._clock()
+        live = []
+        for entry in list(self._by_market.get(market_id, ())):
+            view = entry.ref()
+            if view is None or entry.expires <= now:
+                self._remove(entry, stop=True)
+                self.expired += 1
+            else:
+                live.append(view)
+        return live
+
+    def sweep(self):
+        """Drop dead and expired views across all markets, returns how many"""
+        now = self._clock()
+        stale = [entry for entry in self._lru if entry.ref() is None or entry.expires <= now]
+        for entry in stale:
+            self._remove(entry, stop=True)
+        self.expired += len(stale)
+        return len(stale)
+
+    def _remove(self, entry, stop):
+        view = entry.ref()
+        self._lru.pop(entry, None)
+        if view is not None:
+            self._entries.pop(view, None)
+        entries = self._by_market.get(entry.market_id)
+        if entries is not None:
+            try:
+                entries.remove(entry)
+            except ValueError:
+                pass
+            if not entries:
+                del self._by_market[entry.market_id]
+        if stop and view is not None and not view.is_finished():
+            view.stop()
+
+    def stats(self):
+        return {
+            "live": len(self._lru),
+            "markets": len(self._by_market),
+            "registered": self.registered,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,182 @@
+"""Stand-in for the DRIP API, for load testing the bot offline.
+
+Implements the member, tokenBalance and transfer endpoints used by
+PointsManagerSingleton with in-memory balances, plus configurable latency
+and fault injection. Point the bot at it with API_BASE_URL:
+
+    python -m helpers.FakeDripServer --port 8081 --latency 0.05 --throttle-rate 0.02
+    API_BASE_URL=http://127.0.0.1:8081 python bot.py
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+
+from aiohttp import web
+
+
+class LatencyModel:
+    """Samples per-request latency in seconds."""
+
+    DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+    def __init__(self, distribution: str = "constant", mean: float = 0.0, jitter: float = 0.0, rng=None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean = mean
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            return max(0.0, self.rng.uniform(self.mean - self.jitter, self.mean + self.jitter))
+        if self.distribution == "exponential":
+            return self.rng.expovariate(1 / self.mean)
+        if self.distribution == "lognormal":
+            # jitter is sigma of the underlying normal; scaled so the mean stays `mean`
+            sigma = self.jitter or 0.5
+            return self.rng.lognormvariate(math.log(self.mean) - sigma ** 2 / 2, sigma)
+        return self.mean
+
+
+class FakeDripServer:
+    """In-memory DRIP realm with fault injection."""
+
+    def __init__(self, initial_balance: int = 10000, latency: LatencyModel = None,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 reset_rate: float = 0.0, rng=None):
+        self.initial_balance = initial_balance
+        self.rng = rng or random.Random()
+        self.latency = latency or LatencyModel(rng=self.rng)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.reset_rate = reset_rate
+        self.balances = {}
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "throttled": 0,
+            "resets": 0,
+            "balance_reads": 0,
+            "token_updates": 0,
+            "transfers": 0,
+            "rejected": 0,
+        }
+
+    def balance(self, user_id: str) -> int:
+        return self.balances.setdefault(user_id, self.initial_balance)
+
+    @web.middleware
+    async def faults(self, request: web.Request, handler):
+        if not request.path.startswith("/api/"):
+            return await handler(request)
+
+        self.stats["requests"] += 1
+        await asyncio.sleep(self.latency.sample())
+
+        roll = self.rng.random()
+        if roll < self.reset_rate:
+            self.stats["resets"] += 1
+            # Drop the socket without a response, the client sees a disconnect
+            request.transport.abort()
+            return web.Response(status=500)
+        roll -= self.reset_rate
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.json_response(
+                {"message": "Too many requests"}, status=429,
+                headers={"Retry-After": f"{self.retry_after:g}"}
+            )
+        roll -= self.throttle_rate
+        if roll < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"message": "Injected server error"}, status=500)
+        return await handler(request)
+
+    async def index(self, request: web.Request) -> web.Response:
+        return web.Response(text="fake DRIP")
+
+    async def get_member(self, request: web.Request) -> web.Response:
+        self.stats["balance_reads"] += 1
+        member_id = request.match_info["member_id"]
+        return web.json_response({
+            "id": member_id,
+            "balances": {request.match_info["realm_id"]: self.balance(member_id)},
+        })
+
+    async def token_balance(self, request: web.Request) -> web.Response:
+        self.stats["token_updates"] += 1
+        member_id = request.match_info["member_id"]
+        data = await request.json()
+        tokens = int(data.get("tokens", 0))
+        if self.balance(member_id) + tokens < 0:
+            self.stats["rejected"] += 1
+            return web.json_response({"message": "Insufficient balance"}, status=400)
+        self.balances[member_id] += tokens
+        return web.json_response({"balance": self.balances[member_id]})
+
+    async def transfer(self, request: web.Request) -> web.Response:
+        self.stats["transfers"] += 1
+        member_id = request.match_info["member_id"]
+        data = await request.json()
+        recipient_id = str(data.get("recipientId"))
+        tokens = int(data.get("tokens", 0))
+        if tokens <= 0 or self.balance(member_id) < tokens:
+            self.stats["rejected"] += 1
+            return web.json_response({"message": "Insufficient balance"}, status=400)
+        self.balances[member_id] -= tokens
+        self.balances[recipient_id] = self.balance(recipient_id) + tokens
+        return web.json_response({"balance": self.balances[member_id]})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "members": len(self.balances), "time": time.time()})
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.faults])
+        member = "/api/v4/realms/{realm_id}/members/{member_id}"
+        app.add_routes([
+            web.get("/", self.index),
+            web.get("/_stats", self.get_stats),
+            web.get(member, self.get_member),
+            web.patch(member + "/tokenBalance", self.token_balance),
+            web.patch(member + "/transfer", self.transfer),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake DRIP API for offline load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--initial-balance", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean latency in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.0,
+                        help="Half-width for uniform, sigma for lognormal")
+    parser.add_argument("--distribution", choices=LatencyModel.DISTRIBUTIONS, default="constant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429s")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="Fraction of connections reset")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    server = FakeDripServer(
+        initial_balance=args.initial_balance,
+        latency=LatencyModel(args.distribution, args.latency, args.latency_jitter, rng),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        reset_rate=args.reset_rate,
+        rng=rng,
+    )
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
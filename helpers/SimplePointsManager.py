@@ -1,5 +1,233 @@
 import aiohttp
-from typing import Optional
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("discord_bot")
+
+class BalanceCache:
+    """Per-user balance cache with a TTL and an LRU size bound."""
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[int]:
+        """Cached balance, or None if missing or expired."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= self._clock():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, user_id: int, balance: int):
+        self._entries[user_id] = (balance, self._clock() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def adjust(self, user_id: int, delta: int):
+        """Apply a confirmed balance change to a cached entry, keeping its expiry."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries[user_id] = (entry[0] + delta, entry[1])
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class TokenBucket:
+    """Async token bucket with AIMD rate adaptation.
+
+    Every 429 halves the refill rate and pauses refills for the server's
+    Retry-After; every success creeps the rate back up towards max_rate.
+    """
+
+    def __init__(self, rate: float, capacity: float, min_rate: float = 1.0,
+                 increase: float = 0.5, clock=time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.increase = increase
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        # Created on first use so it binds to the running loop
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = self._clock()
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                now = self._clock()
+                wait = max(self._paused_until - now, 0) + (1 - self._tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self, retry_after: float):
+        # 429s from requests already in flight belong to the same episode,
+        # only back off once per pause
+        if self._clock() >= self._paused_until:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self._refill()
+        self._tokens = 0
+        self._paused_until = max(self._paused_until, self._clock() + retry_after)
+
+class Throttled:
+    """Result of a write the API kept rejecting with 429. Falsy, like a failed write."""
+
+    __slots__ = ("retry_after",)
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"Throttled(retry_after={self.retry_after:.1f})"
+
+class ThrottledError(Exception):
+    """Raised by reads the API kept rejecting with 429."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"DRIP API throttled, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class ServerError(aiohttp.ClientError):
+    """Raised by writes the API answered with a 5xx, which may succeed on retry."""
+
+    def __init__(self, status: int):
+        super().__init__(f"DRIP API returned {status}")
+        self.status = status
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"DRIP API unavailable, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe -> closed.
+
+    While open every call fails immediately, so a slow or down API can't tie
+    up bets until their interactions expire.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started = 0.0
+        self.consecutive_failures = 0
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        now = self._clock()
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        elif self._state == self.HALF_OPEN and self._probes and now - self._probe_started >= self.reset_timeout:
+            # A probe that never reported back (e.g. cancelled) mustn't wedge the breaker
+            self._probes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not go out."""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probes >= self.half_open_max_calls):
+            self.rejected += 1
+            raise CircuitOpenError(self.retry_after())
+        if state == self.HALF_OPEN:
+            self._probes += 1
+            self._probe_started = self._clock()
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self._state != self.CLOSED:
+            logger.info("DRIP circuit breaker closed")
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._state == self.HALF_OPEN or (
+            self._state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self.opens += 1
+            logger.warning(f"DRIP circuit breaker opened after {self.consecutive_failures} failures")
+
+    def metrics(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after() if self._state == self.OPEN else 0.0,
+        }
 
 class PointsManagerSingleton:
     _instance = None
@@ -10,81 +238,287 @@ class PointsManagerSingleton:
             cls._instance = super().__new__(cls)
         return cls._instance
     
-    def __init__(self, base_url: str = None, api_key: str = None, realm_id: str = None):
+    def __init__(self, base_url: str = None, api_key: str = None, realm_id: str = None,
+                 balance_cache_ttl: float = 30.0, balance_cache_size: int = 10000,
+                 pool_limit: int = 100, pool_limit_per_host: int = 50,
+                 keepalive_timeout: float = 60.0, dns_cache_ttl: int = 300,
+                 request_timeout: float = 10.0, connect_timeout: float = 3.0,
+                 rate_limit: float = 20.0, rate_burst: float = 40.0, max_retries: int = 3,
+                 retry_backoff: float = 0.5, latency_budgets: Optional[Dict[str, float]] = None,
+                 hedge_delay: Optional[float] = 0.5, breaker_failure_threshold: int = 5,
+                 breaker_reset_timeout: float = 30.0):
         if not self._initialized and all([base_url, api_key, realm_id]):
             self.base_url = base_url.rstrip('/')
             self.api_key = api_key
             self.realm_id = realm_id
+            self._members_url = f"{self.base_url}/api/v4/realms/{self.realm_id}/members"
             self.session: Optional[aiohttp.ClientSession] = None
+            self.connector: Optional[aiohttp.TCPConnector] = None
+            self.pool_limit = pool_limit
+            self.pool_limit_per_host = pool_limit_per_host
+            self.keepalive_timeout = keepalive_timeout
+            self.dns_cache_ttl = dns_cache_ttl
+            self.timeout = aiohttp.ClientTimeout(total=request_timeout, connect=connect_timeout)
+            # Cached balances only pre-check bets, the transfer itself is authoritative
+            self.balance_cache = BalanceCache(balance_cache_ttl, balance_cache_size)
+            self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+            self.max_retries = max_retries
+            self.retry_backoff = retry_backoff
+            self.queued = 0
+            self.in_flight = 0
+            self.requests = 0
+            self.throttled = 0
+            # user_id -> in-flight balance lookup shared by concurrent callers
+            self._balance_inflight = {}
+            self.balance_fetches = 0
+            self.balance_coalesced = 0
+            self.breaker = CircuitBreaker(breaker_failure_threshold, breaker_reset_timeout)
+            # Seconds a single attempt may take per endpoint before it counts as a failure
+            self.latency_budgets = {"balance": 2.0, "tokenBalance": 5.0, "transfer": 5.0}
+            self.latency_budgets.update(latency_budgets or {})
+            # Balance reads still pending after this long get a duplicate request
+            self.hedge_delay = hedge_delay
+            self.hedged = 0
+            self.hedge_wins = 0
             self._initialized = True
     
     async def initialize(self):
-        """Initialize the aiohttp session if it doesn't exist."""
+        """Create the pooled aiohttp session if it doesn't exist."""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            self.connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=self.connector,
+                timeout=self.timeout,
+                # Auth header is sent with every request, no need to rebuild it per call
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+
+    async def warm(self, connections: int = 4):
+        """Open keep-alive connections to the API ahead of the first bets."""
+        await self.initialize()
+
+        async def touch():
+            try:
+                async with self.session.get(self.base_url) as response:
+                    await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Failed to warm DRIP connection: {e}")
+
+        await asyncio.gather(*(touch() for _ in range(connections)))
+        logger.info(f"Warmed DRIP connection pool: {self.pool_stats()}")
+
+    def pool_stats(self) -> dict:
+        """Connection pool utilization."""
+        if not self.connector:
+            return {"limit": self.pool_limit, "limit_per_host": self.pool_limit_per_host, "in_use": 0, "idle": 0}
+        # aiohttp doesn't expose these publicly
+        in_use = len(getattr(self.connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(self.connector, "_conns", {}).values())
+        return {
+            "limit": self.connector.limit,
+            "limit_per_host": self.connector.limit_per_host,
+            "in_use": in_use,
+            "idle": idle,
+        }
+
+    def metrics(self) -> dict:
+        """Rate limiter, balance cache, connection pool and request counters."""
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "balance_fetches": self.balance_fetches,
+            "balance_coalesced": self.balance_coalesced,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "breaker": self.breaker.metrics(),
+            "balance_cache": self.balance_cache.stats(),
+            "pool": self.pool_stats(),
+            "rate_limit": self.rate_limiter.rate,
+            "tokens": self.rate_limiter.tokens,
+        }
+
+    def _retry_after(self, response: aiohttp.ClientResponse, attempt: int) -> float:
+        """Seconds to wait from a Retry-After header, or exponential backoff."""
+        header = response.headers.get("Retry-After")
+        if header:
+            try:
+                return max(0.0, float(header))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return self.retry_backoff * 2 ** attempt
+
+    async def _request(self, method: str, url: str, endpoint: str, json: dict = None,
+                       read_body: bool = False) -> Tuple[int, Optional[dict]]:
+        """Send a request under the circuit breaker and rate limiter, retrying 429s.
+
+        Returns (status, body). Raises CircuitOpenError while the breaker is
+        open and ThrottledError once 429 retries run out. Timeouts over the
+        endpoint's latency budget, connection errors and 5xx count as
+        breaker failures.
+        """
+        self.breaker.before_call()
+        timeout = aiohttp.ClientTimeout(total=self.latency_budgets.get(endpoint), connect=self.timeout.connect)
+        retry_after = 0.0
+        for attempt in range(self.max_retries + 1):
+            self.queued += 1
+            try:
+                await self.rate_limiter.acquire()
+            finally:
+                self.queued -= 1
+
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                async with self.session.request(method, url, json=json, timeout=timeout) as response:
+                    if response.status == 429:
+                        self.throttled += 1
+                        retry_after = self._retry_after(response, attempt)
+                        self.rate_limiter.on_throttled(retry_after)
+                        continue
+                    self.rate_limiter.on_success()
+                    body = await response.json(content_type=None) if read_body else None
+                if response.status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return response.status, body
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+                raise
+            finally:
+                self.in_flight -= 1
+        # Throttling means the API is up, it doesn't count against the breaker
+        self.breaker.record_success()
+        raise ThrottledError(retry_after)
 
     async def cleanup(self):
         """Cleanup the aiohttp session."""
         if self.session:
             await self.session.close()
             self.session = None
+            self.connector = None
 
-    async def _get_headers(self) -> dict:
-        """Get headers with API key authentication."""
-        return {"Authorization": f"Bearer {self.api_key}"}
+    async def get_balance(self, user_id: int, use_cache: bool = True) -> int:
+        """Get the point balance for a user, from the cache when fresh."""
+        if use_cache:
+            balance = self.balance_cache.get(user_id)
+            if balance is not None:
+                return balance
 
-    async def get_balance(self, user_id: int) -> int:
-        """Get the point balance for a user."""
-        if not self.session:
-            await self.initialize()
-            
-        headers = await self._get_headers()
-        
-        async with self.session.get(
-            f"{self.base_url}/api/v4/realms/{self.realm_id}/members/{user_id}",
-            headers=headers
-        ) as response:
-            if response.status == 200:
-                data = await response.json()
-                if not data.get('balances'):
-                    return 0
-                realm_point_ids = list(data['balances'].keys())
-                return data['balances'].get(realm_point_ids[0], 0)
+        # Single-flight: concurrent lookups for the same user share one request
+        task = self._balance_inflight.get(user_id)
+        if task is not None:
+            self.balance_coalesced += 1
+        else:
+            self.balance_fetches += 1
+            task = asyncio.ensure_future(self._hedged(lambda: self._fetch_balance(user_id)))
+            self._balance_inflight[user_id] = task
+            task.add_done_callback(lambda _: self._balance_inflight.pop(user_id, None))
+        # Shielded so one caller giving up doesn't cancel the others' request
+        return await asyncio.shield(task)
+
+    async def _hedged(self, make_call):
+        """Run an idempotent read, firing a duplicate if it is slower than hedge_delay.
+
+        The first successful response wins and the other request is cancelled.
+        """
+        first = asyncio.ensure_future(make_call())
+        if self.hedge_delay is None:
+            return await first
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        except asyncio.CancelledError:
+            # asyncio.wait doesn't cancel what it waits on
+            first.cancel()
+            raise
+        if done or self.breaker.state != CircuitBreaker.CLOSED:
+            return await first
+
+        self.hedged += 1
+        second = asyncio.ensure_future(make_call())
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _fetch_balance(self, user_id: int) -> int:
+        status, data = await self._request("GET", f"{self._members_url}/{user_id}", "balance", read_body=True)
+        if status == 200:
+            if not data.get('balances'):
+                balance = 0
             else:
-                error_data = await response.json()
-                raise Exception(f"Failed to get balance: {error_data}")
+                realm_point_ids = list(data['balances'].keys())
+                balance = data['balances'].get(realm_point_ids[0], 0)
+            self.balance_cache.set(user_id, balance)
+            return balance
+        else:
+            raise Exception(f"Failed to get balance: {data}")
 
-    async def add_points(self, user_id: int, amount: int) -> bool:
-        """Add points to a user's balance."""
-        if not self.session:
-            await self.initialize()
-            
-        headers = await self._get_headers()
-        
-        async with self.session.patch(
-            f"{self.base_url}/api/v4/realms/{self.realm_id}/members/{user_id}/tokenBalance",
-            headers=headers,
-            json={"tokens": amount}
-        ) as response:
-            return response.status == 200
-
-    async def remove_points(self, user_id: int, amount: int) -> bool:
+    async def add_points(self, user_id: int, amount: int):
+        """Add points to a user's balance. Returns True, False or Throttled, raises ServerError on a 5xx."""
+        try:
+            status, _ = await self._request(
+                "PATCH",
+                f"{self._members_url}/{user_id}/tokenBalance",
+                "tokenBalance",
+                json={"tokens": amount}
+            )
+        except ThrottledError as e:
+            return Throttled(e.retry_after)
+        if status == 200:
+            self.balance_cache.adjust(user_id, amount)
+            return True
+        self.balance_cache.invalidate(user_id)
+        if status >= 500:
+            raise ServerError(status)
+        return False
+
+    async def remove_points(self, user_id: int, amount: int):
         """Remove points from a user's balance."""
         return await self.add_points(user_id, -amount)
 
-    async def transfer_points(self, from_user_id: int, to_user_id: int, amount: int) -> bool:
-        """Transfer points from one user to another."""
-        if not self.session:
-            await self.initialize()
-            
-        headers = await self._get_headers()
-        
-        async with self.session.patch(
-            f"{self.base_url}/api/v4/realms/{self.realm_id}/members/{from_user_id}/transfer",
-            headers=headers,
-            json={
-                "recipientId": to_user_id,
-                "tokens": amount
-            }
-        ) as response:
-            return response.status == 200
\ No newline at end of file
+    async def transfer_points(self, from_user_id: int, to_user_id: int, amount: int):
+        """Transfer points from one user to another. Returns True, False or Throttled, raises ServerError on a 5xx."""
+        try:
+            status, _ = await self._request(
+                "PATCH",
+                f"{self._members_url}/{from_user_id}/transfer",
+                "transfer",
+                json={
+                    "recipientId": to_user_id,
+                    "tokens": amount
+                }
+            )
+        except ThrottledError as e:
+            return Throttled(e.retry_after)
+        if status == 200:
+            self.balance_cache.adjust(from_user_id, -amount)
+            self.balance_cache.adjust(to_user_id, amount)
+            return True
+        # A failed transfer usually means our view of the balance is wrong
+        self.balance_cache.invalidate(from_user_id)
+        self.balance_cache.invalidate(to_user_id)
+        if status >= 500:
+            raise ServerError(status)
+        return False
\ No newline at end of file
@@ -0,0 +1,284 @@
+"""HTTP endpoints served from the bot's own event loop.
+
+Started from DiscordBot.setup_hook with an AppRunner, so the bot and the
+web app share one loop and one process:
+
+    GET /healthz                         200 when connected to Discord, else 503
+    GET /metrics                         Prometheus text format
+    GET /api/markets                     ?guild_id= &state= &category= &creator_id= &offset= &limit=
+    GET /api/markets/{id}                one market with its option totals
+    GET /api/markets/{id}/quotes         ?points= cost of buying each option
+    GET /api/markets/{id}/trades         ?offset= &limit= raw trades, oldest first
+
+Market responses carry a weak ETag built from the market's version, which
+changes on every trade and state change. A request whose If-None-Match
+still matches gets a 304 before anything is quoted or serialized. IDs are
+strings in JSON because Discord and market snowflakes don't fit in a
+JavaScript number.
+"""
+import datetime
+import hashlib
+import logging
+import math
+
+from aiohttp import ETag, web
+
+from cogs.economy.state import MarketState
+
+logger = logging.getLogger("discord_bot")
+
+METRIC_PREFIX = "lpm"
+MAX_PAGE_SIZE = 1000
+
+
+def _iso(moment):
+    return moment.replace(tzinfo=datetime.timezone.utc).isoformat()
+
+
+def _number(value):
+    """JSON has no infinity, an option nobody can buy has no price"""
+    return value if math.isfinite(value) else None
+
+
+def _int_param(request, name, default=None, minimum=None, maximum=None):
+    raw = request.query.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be an integer")
+    if minimum is not None and value < minimum:
+        raise web.HTTPBadRequest(text=f"{name} must be at least {minimum}")
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def _not_modified(request, etag):
+    """True when the client's If-None-Match already names this ETag"""
+    tags = request.if_none_match
+    return bool(tags) and any(tag.value in (etag, "*") for tag in tags)
+
+
+def _json(request, etag, build):
+    """JSON response with a weak ETag, `build` only runs when the client's copy is stale"""
+    if _not_modified(request, etag):
+        response = web.Response(status=304)
+    else:
+        response = web.json_response(build())
+    response.etag = ETag(value=etag, is_weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def market_summary(prediction):
+    return {
+        "id": str(prediction.market_id),
+        "guild_id": None if prediction.guild_id is None else str(prediction.guild_id),
+        "question": prediction.question,
+        "category": prediction.category,
+        "state": prediction.state,
+        "options": prediction.options,
+        "end_time": _iso(prediction.end_time),
+        "total_bets": prediction.total_bets,
+        "result": prediction.result,
+        "version": prediction.version,
+    }
+
+
+def market_detail(prediction):
+    return {
+        **market_summary(prediction),
+        "creator_id": str(prediction.creator_id),
+        "option_totals": {option: prediction.get_option_total_bets(option) for option in prediction.options},
+        "trades": len(prediction.ledger),
+    }
+
+
+class WebServer:
+    """Health, metrics and read-only market data for the running bot"""
+
+    def __init__(self, bot, host="127.0.0.1", port=8080):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.requests = 0
+        self.not_modified = 0
+        self.app = web.Application(middlewares=[self._count])
+        self.app.add_routes([
+            web.get("/", self.index),
+            web.get("/healthz", self.healthz),
+            web.get("/metrics", self.metrics),
+            web.get("/api/markets", self.list_markets),
+            web.get("/api/markets/{market_id:[0-9]+}", self.get_market),
+            web.get("/api/markets/{market_id:[0-9]+}/quotes", self.get_quotes),
+            web.get("/api/markets/{market_id:[0-9]+}/trades", self.get_trades),
+        ])
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Web server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    @web.middleware
+    async def _count(self, request, handler):
+        self.requests += 1
+        response = await handler(request)
+        if response.status == 304:
+            self.not_modified += 1
+        return response
+
+    @property
+    def economy(self):
+        cog = self.bot.get_cog("Economy")
+        if cog is None:
+            raise web.HTTPServiceUnavailable(text="Markets aren't loaded yet")
+        return cog
+
+    def _market(self, request):
+        prediction = self.economy.get_market(int(request.match_info["market_id"]))
+        if prediction is None:
+            raise web.HTTPNotFound(text="No such market")
+        return prediction
+
+    async def index(self, request):
+        return web.Response(text="Hello world")
+
+    async def healthz(self, request):
+        ready = self.bot.is_ready() and not self.bot.is_closed()
+        cog = self.bot.get_cog("Economy")
+        breaker = self.bot.points_manager.breaker
+        body = {
+            "status": "ok" if ready and cog is not None else "unavailable",
+            "discord_ready": ready,
+            "latency": _number(self.bot.latency) if ready else None,
+            "markets_loaded": cog is not None,
+            "points_service": breaker.state,
+        }
+        return web.json_response(body, status=200 if body["status"] == "ok" else 503)
+
+    def _samples(self):
+        """(name, labels, value) for every numeric counter the bot keeps"""
+        yield "discord_ready", "", int(self.bot.is_ready())
+        yield "discord_guilds", "", len(self.bot.guilds)
+        if self.bot.is_ready() and math.isfinite(self.bot.latency):
+            yield "discord_latency_seconds", "", self.bot.latency
+        yield "web_requests", "", self.requests
+        yield "web_not_modified", "", self.not_modified
+
+        components = {"points": self.bot.points_manager.metrics()}
+        cog = self.bot.get_cog("Economy")
+        if cog is not None:
+            components.update(cog.component_stats())
+        for component, stats in components.items():
+            yield from self._flatten(component, stats)
+
+    def _flatten(self, prefix, stats):
+        for key, value in stats.items():
+            name = f"{prefix}_{key}"
+            if isinstance(value, dict):
+                yield from self._flatten(name, value)
+            elif isinstance(value, str):
+                # States become a labelled gauge, e.g. points_breaker_state{state="open"} 1
+                yield name, f'{{state="{value}"}}', 1
+            elif isinstance(value, (int, float)):
+                yield name, "", value
+
+    async def metrics(self, request):
+        lines = []
+        seen = set()
+        for name, labels, value in self._samples():
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{labels} {float(value)!r}")
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def list_markets(self, request):
+        state = request.query.get("state")
+        if state is not None and state not in MarketState.ALL:
+            raise web.HTTPBadRequest(text=f"state must be one of {', '.join(MarketState.ALL)}")
+        predictions = self.economy.markets.query(
+            guild_id=_int_param(request, "guild_id"),
+            statuses=(state,) if state else None,
+            category=request.query.get("category"),
+            creator_id=_int_param(request, "creator_id"),
+        )
+        offset = _int_param(request, "offset", 0, minimum=0)
+        limit = _int_param(request, "limit", 100, minimum=1, maximum=MAX_PAGE_SIZE)
+        page = predictions[offset:offset + limit]
+        # The page changes when any market on it changes, or when markets come and go
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"{len(predictions)}:{offset}:{limit}".encode())
+        for prediction in page:
+            digest.update(f";{prediction.market_id}.{prediction.version}".encode())
+        return _json(request, digest.hexdigest(), lambda: {
+            "total": len(predictions),
+            "offset": offset,
+            "limit": limit,
+            "markets": [market_summary(prediction) for prediction in page],
+        })
+
+    async def get_market(self, request):
+        prediction = self._market(request)
+        return _json(request, f"{prediction.market_id}-{prediction.version}", lambda: market_detail(prediction))
+
+    async def get_quotes(self, request):
+        prediction = self._market(request)
+        points = _int_param(request, "points", 100, minimum=1)
+
+        def build():
+            prices = self.economy.quote_book.quote([prediction], points)[0]
+            return {
+                "id": str(prediction.market_id),
+                "version": prediction.version,
+                "points": points,
+                "quotes": {
+                    option: {
+                        "price_per_share": _number(prices[option]["price_per_share"]),
+                        "potential_shares": _number(prices[option]["potential_shares"]),
+                        "probability": _number(prices[option]["probability"]),
+                    }
+                    for option in prediction.options
+                },
+            }
+        return _json(request, f"{prediction.market_id}-{prediction.version}-q{points}", build)
+
+    async def get_trades(self, request):
+        prediction = self._market(request)
+        offset = _int_param(request, "offset", 0, minimum=0)
+        limit = _int_param(request, "limit", 100, minimum=1, maximum=MAX_PAGE_SIZE)
+
+        def build():
+            ledger = prediction.ledger
+            options = prediction.options
+            trades = []
+            for index in range(offset, min(offset + limit, len(ledger))):
+                user_id, option_index, points, shares, timestamp = ledger[index]
+                trades.append({
+                    "user_id": str(user_id),
+                    "option": options[option_index],
+                    "points": points,
+                    "shares": shares,
+                    "timestamp": timestamp,
+                })
+            return {
+                "id": str(prediction.market_id),
+                "version": prediction.version,
+                "total": len(ledger),
+                "offset": offset,
+                "limit": limit,
+                "trades": trades,
+            }
+        return _json(request, f"{prediction.market_id}-{prediction.version}-t{offset}-{limit}", build)
@@ -0,0 +1,47 @@
+"""Test doubles shared by the economy tests"""
+import datetime
+from types import SimpleNamespace
+
+from cogs.economy import Economy, Prediction
+
+BOT_ID = 1
+
+
+class FakePoints:
+    """Points service that records every write and refuses debits past `balances`"""
+
+    def __init__(self, balances=None):
+        self.balances = dict(balances or {})
+        self.calls = []
+
+    async def add_points(self, user_id, amount):
+        self.calls.append(("add", user_id, amount))
+        self.balances[user_id] = self.balances.get(user_id, 0) + amount
+        return True
+
+    async def transfer_points(self, from_id, to_id, amount):
+        self.calls.append(("transfer", from_id, amount))
+        if self.balances.get(from_id, 0) < amount:
+            return False
+        self.balances[from_id] -= amount
+        return True
+
+    async def get_balance(self, user_id, use_cache=True):
+        return self.balances.get(user_id, 0)
+
+
+def make_economy(balances):
+    bot = SimpleNamespace(
+        points_manager=FakePoints(balances), user=SimpleNamespace(id=BOT_ID), dispatch=lambda *args: None
+    )
+    economy = Economy(bot)
+    economy.settlement.backoff = 0
+    return economy
+
+
+def add_market(economy, market_id=100):
+    end_time = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    prediction = Prediction("Will it rain?", end_time, ["Yes", "No"], creator_id=2, market_id=market_id, guild_id=5)
+    economy.markets.add(prediction)
+    economy.quote_book.add(prediction)
+    return prediction
@@ -0,0 +1,201 @@
+import asyncio
+
+import pytest
+
+from cogs.economy.accounting import (
+    HOUSE_ACCOUNT, REMOTE_ACCOUNT, Journal, NetSettler, escrow_account, user_account,
+)
+from cogs.economy.settlement import SettlementExecutor
+from fakes import FakePoints
+
+BOT_ID = 1
+
+
+def make_settler(journal, points, **kwargs):
+    executor = SettlementExecutor(points, retries=0, backoff=0)
+    return NetSettler(journal, executor, points, lambda: BOT_ID, **kwargs)
+
+
+def test_entries_must_balance():
+    journal = Journal()
+    with pytest.raises(ValueError):
+        journal.post("bet", [(user_account(5), -10), (escrow_account(1), 9)])
+
+
+def test_bets_and_payouts_move_points_through_escrow():
+    persisted = []
+    journal = Journal(on_entry=persisted.append)
+    journal.record_bet(1, 10, 100)
+    journal.record_bet(1, 20, 50)
+    assert journal.balance(escrow_account(1)) == 150
+    assert journal.pending(10) == -100
+
+    journal.record_payouts(1, {10: 149})
+    assert journal.balance(escrow_account(1)) == 0
+    assert journal.balance(HOUSE_ACCOUNT) == 1
+    assert journal.pending(10) == 49
+    assert sorted(journal.unsettled_users()) == [10, 20]
+    assert [entry.kind for entry in persisted] == ["bet", "bet", "payout", "house"]
+    assert sum(journal.balances.values()) == 0
+
+
+def test_restore_replays_entries_and_continues_ids():
+    journal = Journal()
+    entries = [journal.record_bet(1, 10, 100), journal.record_refunds(1, {10: 100})]
+    restored = Journal()
+    for entry in entries:
+        restored.restore(entry)
+    assert restored.balances == journal.balances
+    assert restored.next_entry_id == journal.next_entry_id
+    assert restored.unsettled_count() == 0
+
+
+def test_holds_stop_concurrent_bets_from_overspending():
+    journal = Journal()
+    assert journal.hold(10, 60, remote_balance=100)
+    assert not journal.hold(10, 60, remote_balance=100)
+    journal.release(10, 60)
+    assert journal.hold(10, 100, remote_balance=100)
+    assert journal.available(10, 100) == 0
+
+
+def test_pending_debits_count_against_the_remote_balance():
+    journal = Journal()
+    journal.record_bet(1, 10, 70)
+    assert journal.available(10, 100) == 30
+    assert not journal.hold(10, 31, remote_balance=100)
+
+
+def test_reconcile_reports_a_clean_journal():
+    journal = Journal()
+    journal.record_bet(1, 10, 100)
+    report = journal.reconcile()
+    assert report["problems"] == []
+    assert report["pending_debits"] == 100
+    assert report["escrow"] == 100
+
+
+def test_flush_nets_every_user_into_one_write():
+    async def scenario():
+        journal = Journal()
+        points = FakePoints({10: 500, 20: 500})
+        for _ in range(5):
+            journal.record_bet(1, 10, 20)
+        journal.record_bet(1, 20, 50)
+        journal.record_payouts(1, {10: 150})
+        report = await make_settler(journal, points).flush()
+        return journal, points, report
+
+    journal, points, report = asyncio.run(scenario())
+    assert len(report.succeeded) == 2
+    assert sorted(points.calls) == [("add", 10, 50), ("transfer", 20, 50)]
+    assert journal.unsettled_count() == 0
+    assert journal.balance(REMOTE_ACCOUNT) == 0
+    assert points.balances == {10: 550, 20: 450}
+
+
+def test_bets_booked_during_a_flush_stay_pending():
+    async def scenario():
+        journal = Journal()
+        points = FakePoints({10: 500})
+        journal.record_bet(1, 10, 100)
+
+        class SlowPoints(FakePoints):
+            async def transfer_points(self, from_id, to_id, amount):
+                journal.record_bet(1, 10, 40)
+                return await super().transfer_points(from_id, to_id, amount)
+
+        slow = SlowPoints(points.balances)
+        await make_settler(journal, slow).flush()
+        return journal
+
+    journal = asyncio.run(scenario())
+    assert journal.pending(10) == -40
+
+
+def test_refused_debits_are_handed_to_on_rejected():
+    async def scenario():
+        journal = Journal()
+        points = FakePoints({10: 30})
+        journal.record_bet(1, 10, 100)
+        rejected = []
+
+        async def on_rejected(user_id, amount):
+            rejected.append((user_id, amount))
+
+        settler = make_settler(journal, points, on_rejected=on_rejected)
+        await settler.flush()
+        return journal, settler, rejected
+
+    journal, settler, rejected = asyncio.run(scenario())
+    assert rejected == [(10, -100)]
+    assert settler.rejected_debits == 1
+    assert journal.pending(10) == -100
+
+
+def test_notify_wakes_the_settler_past_the_threshold():
+    async def scenario():
+        journal = Journal()
+        points = FakePoints({user_id: 100 for user_id in range(10, 13)})
+        settler = make_settler(journal, points, interval=60, threshold=3)
+        settler.start()
+        for user_id in range(10, 13):
+            journal.record_bet(1, user_id, 10)
+            settler.notify()
+        await asyncio.sleep(0.05)
+        await settler.stop()
+        return journal, settler
+
+    journal, settler = asyncio.run(scenario())
+    assert settler.flushes == 1
+    assert journal.unsettled_count() == 0
+
+
+def test_stop_right_after_notify_does_not_hang():
+    async def scenario():
+        journal = Journal()
+        points = FakePoints({10: 100})
+        settler = make_settler(journal, points, interval=60, threshold=1)
+        settler.start()
+        await asyncio.sleep(0.01)
+        # The wakeup and the stop land in the same tick
+        journal.record_bet(1, 10, 10)
+        settler.notify()
+        stopping = asyncio.ensure_future(settler.stop())
+        done, _ = await asyncio.wait({stopping}, timeout=1)
+        if not done:
+            settler._task.cancel()
+            settler._task.cancel()
+            await asyncio.wait({stopping})
+        return settler, bool(done)
+
+    settler, stopped = asyncio.run(scenario())
+    assert stopped
+    assert settler._task is None
+
+
+def test_a_settled_credit_is_never_available_twice():
+    async def scenario():
+        journal = Journal()
+        journal.record_bet(1, 20, 1000)
+        journal.record_payouts(1, {10: 1000})
+        seen = []
+
+        class SlowPoints(FakePoints):
+            async def add_points(self, user_id, amount):
+                result = await super().add_points(user_id, amount)
+                await asyncio.sleep(0.01)
+                return result
+
+            async def transfer_points(self, from_id, to_id, amount):
+                # Written after user 10's credit, while the flush is still running
+                await asyncio.sleep(0.05)
+                seen.append(journal.available(10, self.balances[10]))
+                return await super().transfer_points(from_id, to_id, amount)
+
+        slow = SlowPoints({10: 0, 20: 1000})
+        await make_settler(journal, slow).flush()
+        seen.append(journal.available(10, slow.balances[10]))
+        return seen
+
+    assert asyncio.run(scenario()) == [1000, 1000]
@@ -0,0 +1,65 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from cogs.economy import Prediction
+from cogs.economy.accounting import Journal
+from cogs.economy.betting import AmountInput
+
+
+def make_prediction():
+    end_time = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    return Prediction("Will it rain?", end_time, ["Yes", "No"], creator_id=1, market_id=100)
+
+
+def test_bets_are_refused_once_betting_has_ended():
+    closed = make_prediction()
+    assert closed.close()
+    assert not closed.place_bet(10, "Yes", 100)
+
+    resolved = make_prediction()
+    assert resolved.resolve("No")
+    assert not resolved.place_bet(10, "Yes", 100)
+    assert resolved.total_bets == 0 and len(resolved.ledger) == 0
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content, **kwargs):
+        self.messages.append(content)
+
+
+class FakeCog:
+    """Resolves the market while the balance check is waiting on DRIP"""
+
+    def __init__(self, prediction):
+        self.prediction = prediction
+        self.journal = Journal()
+        self.placed = []
+
+    async def reserve_points(self, user_id, amount):
+        held = self.journal.hold(user_id, amount, remote_balance=1000)
+        self.prediction.resolve("No")
+        return held
+
+    async def place_bet(self, user_id, prediction, option, amount, held=False):
+        self.placed.append((user_id, option, amount))
+        return True
+
+
+def test_submit_releases_the_hold_when_the_market_ends_during_the_balance_check():
+    async def scenario():
+        prediction = make_prediction()
+        cog = FakeCog(prediction)
+        modal = AmountInput(prediction, "Yes", cog)
+        modal.amount._value = "250"
+        interaction = SimpleNamespace(user=SimpleNamespace(id=10), response=FakeResponse())
+        await modal.on_submit(interaction)
+        return cog, interaction
+
+    cog, interaction = asyncio.run(scenario())
+    assert cog.placed == []
+    assert cog.journal.holds == {}
+    assert interaction.response.messages == ["This prediction has ended, your bet wasn't placed."]
@@ -0,0 +1,43 @@
+import datetime
+
+from cogs.economy import Prediction
+from cogs.economy.board import MAX_EMBED_LENGTH, MarketBoard
+from cogs.economy.quotes import QuoteBook
+from cogs.economy.state import MarketState
+
+
+def make_board(count, question_length=300, options=12):
+    quote_book = QuoteBook()
+    board = MarketBoard(quote_book)
+    end_time = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    markets = []
+    for market_id in range(count):
+        prediction = Prediction(
+            "Q" * question_length, end_time, [f"Option number {i} " * 4 for i in range(options)],
+            creator_id=1, category="C" * 100, market_id=market_id
+        )
+        quote_book.add(prediction)
+        markets.append((MarketState.OPEN, prediction))
+    return board, markets
+
+
+def test_a_page_of_long_markets_fits_in_one_embed():
+    board, markets = make_board(12)
+    for page in range(3):
+        embed, _, pages = board.render(len(markets), lambda start, stop: markets[start:stop], page=page)
+        assert pages == 3
+        assert len(embed) <= MAX_EMBED_LENGTH
+        assert all(len(field.name) <= 256 and len(field.value) <= 1024 for field in embed.fields)
+
+
+def test_unchanged_markets_are_rendered_from_the_cache():
+    board, markets = make_board(5, question_length=20, options=2)
+    board.render(len(markets), lambda start, stop: markets[start:stop])
+    board.render(len(markets), lambda start, stop: markets[start:stop])
+    assert board.renders == 5
+    assert board.cache_hits == 5
+
+    prediction = markets[0][1]
+    prediction.place_bet(10, prediction.options[0], 100)
+    board.render(len(markets), lambda start, stop: markets[start:stop])
+    assert board.renders == 6
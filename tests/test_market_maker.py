@@ -0,0 +1,78 @@
+import math
+
+import pytest
+
+from cogs.economy.market_maker import LMSRMarketMaker, MarketMaker
+
+
+def reference_cost(quantities, b):
+    return b * math.log(math.fsum(math.exp(q / b) for q in quantities))
+
+
+def test_incomplete_engine_fails_at_construction():
+    class PriceOnly(MarketMaker):
+        def price(self, index):
+            return 0.5
+
+    with pytest.raises(TypeError):
+        PriceOnly()
+
+
+def test_new_market_prices_every_outcome_equally():
+    maker = LMSRMarketMaker(4, liquidity=100)
+    assert maker.prices() == pytest.approx([0.25] * 4)
+    assert maker.cost() == pytest.approx(reference_cost([0, 0, 0, 0], 100))
+
+
+def test_buying_raises_the_price_and_prices_sum_to_one():
+    maker = LMSRMarketMaker(3, liquidity=50)
+    before = maker.price(1)
+    maker.buy(1, 40)
+    assert maker.price(1) > before
+    assert math.fsum(maker.prices()) == pytest.approx(1.0)
+
+
+def test_cost_for_shares_matches_the_cost_function():
+    maker = LMSRMarketMaker(3, liquidity=100, quantities=[10, 250, -30])
+    expected = reference_cost([10, 290, -30], 100) - reference_cost([10, 250, -30], 100)
+    assert maker.cost_for_shares(1, 40) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("points", [0.5, 10, 500, 50_000])
+def test_shares_for_points_inverts_cost_for_shares(points):
+    maker = LMSRMarketMaker(3, liquidity=100, quantities=[0, 400, 20])
+    for index in range(3):
+        shares = maker.shares_for_points(index, points)
+        assert maker.cost_for_shares(index, shares) == pytest.approx(points, rel=1e-9)
+
+
+def test_incremental_sum_agrees_with_a_rebuild_after_many_trades():
+    maker = LMSRMarketMaker(5, liquidity=20)
+    for step in range(3000):
+        maker.buy(step % 5, 3.0 + step % 7)
+    incremental = maker.cost()
+    maker._rebuild()
+    assert incremental == pytest.approx(maker.cost(), rel=1e-12)
+
+
+def test_large_quantities_do_not_overflow():
+    maker = LMSRMarketMaker(2, liquidity=1, quantities=[0, 10_000])
+    assert maker.price(1) == pytest.approx(1.0)
+    assert math.isfinite(maker.cost())
+    assert maker.shares_for_points(0, 5) > 0
+
+
+def test_state_round_trips():
+    maker = LMSRMarketMaker(3, liquidity=75)
+    maker.buy(2, 12.5)
+    restored = LMSRMarketMaker(3)
+    restored.load_state(maker.get_state())
+    assert restored.prices() == pytest.approx(maker.prices())
+    assert restored.liquidity == 75
+
+
+def test_rejects_degenerate_markets():
+    with pytest.raises(ValueError):
+        LMSRMarketMaker(1)
+    with pytest.raises(ValueError):
+        LMSRMarketMaker(2, liquidity=0)
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from cogs.economy.notifications import MAX_CONTENT_LENGTH, NotificationDispatcher
+
+
+class FakeUser:
+    def __init__(self, fail_with=None):
+        self.sent = []
+        self.fail_with = fail_with
+
+    async def send(self, content=None, embeds=None):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.sent.append((content, embeds))
+
+
+def deliver(user, *contents):
+    async def scenario():
+        bot = SimpleNamespace(get_user=lambda user_id: user)
+        dispatcher = NotificationDispatcher(bot, rate=1000, burst=1000, backoff=0)
+        notifications = [dispatcher.send(5, content) for content in contents]
+        await dispatcher._deliver(5, dispatcher._pending.pop(5))
+        return dispatcher, notifications
+
+    return asyncio.run(scenario())
+
+
+def test_long_dm_is_split_at_line_boundaries():
+    lines = [f"Market {i}: you won {i * 10} points" for i in range(150)]
+    user = FakeUser()
+    dispatcher, (notification,) = deliver(user, "\n".join(lines))
+
+    assert len(user.sent) > 1
+    assert all(len(content) <= MAX_CONTENT_LENGTH for content, _ in user.sent)
+    assert "\n".join(content for content, _ in user.sent).split("\n") == lines
+    assert notification.outcome == "sent"
+    assert dispatcher.outcomes["sent"] == 1
+    assert dispatcher.messages_sent == len(user.sent)
+
+
+def test_dm_without_breaks_is_cut_at_the_limit():
+    user = FakeUser()
+    deliver(user, "x" * (2 * MAX_CONTENT_LENGTH + 10))
+    assert [len(content) for content, _ in user.sent] == [MAX_CONTENT_LENGTH, MAX_CONTENT_LENGTH, 10]
+
+
+def test_short_dms_around_a_long_one_are_still_batched():
+    user = FakeUser()
+    long_text = "word " * 500
+    dispatcher, notifications = deliver(user, "before", long_text, "after")
+
+    assert user.sent[0][0] == "before"
+    assert user.sent[-1][0].endswith("\n\nafter")
+    assert all(len(content) <= MAX_CONTENT_LENGTH for content, _ in user.sent)
+    assert [notification.outcome for notification in notifications] == ["sent"] * 3
+
+
+def test_split_dm_fails_once_when_a_part_is_rejected():
+    response = SimpleNamespace(status=400, reason="Bad Request")
+    user = FakeUser(fail_with=discord.HTTPException(response, "Invalid Form Body"))
+    dispatcher, (notification,) = deliver(user, "y" * (3 * MAX_CONTENT_LENGTH))
+
+    assert notification.outcome == "failed"
+    assert notification.attempts == 1
+    assert dispatcher.outcomes["failed"] == 1
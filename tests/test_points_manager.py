@@ -0,0 +1,382 @@
+import asyncio
+import contextlib
+import time
+
+import pytest
+from aiohttp import web
+
+from helpers.FakeDripServer import FakeDripServer, LatencyModel
+from helpers.SimplePointsManager import (
+    CircuitBreaker, CircuitOpenError, PointsManagerSingleton, ThrottledError, TokenBucket,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@contextlib.asynccontextmanager
+async def drip(server, **options):
+    """A fresh PointsManagerSingleton talking to `server` on a random local port"""
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    PointsManagerSingleton._instance = None
+    manager = PointsManagerSingleton(f"http://127.0.0.1:{port}", "key", "realm", **options)
+    await manager.initialize()
+    try:
+        yield manager
+    finally:
+        await manager.cleanup()
+        await runner.cleanup()
+        PointsManagerSingleton._instance = None
+
+
+def test_metrics_include_balance_cache_stats():
+    async def scenario():
+        async with drip(FakeDripServer(initial_balance=500)) as manager:
+            assert await manager.get_balance(7) == 500
+            assert await manager.get_balance(7) == 500
+            return manager.metrics()
+
+    metrics = run(scenario())
+    assert metrics["balance_cache"]["hits"] == 1
+    assert metrics["balance_cache"]["misses"] == 1
+    assert metrics["balance_cache"]["size"] == 1
+
+
+def test_metrics_include_connection_pool():
+    async def scenario():
+        async with drip(FakeDripServer(), pool_limit=8, pool_limit_per_host=4) as manager:
+            await manager.get_balance(7)
+            return manager.metrics()
+
+    metrics = run(scenario())
+    assert metrics["pool"]["limit"] == 8
+    assert metrics["pool"]["limit_per_host"] == 4
+    assert metrics["pool"]["in_use"] == 0
+    assert metrics["pool"]["idle"] == 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Rolls:
+    """rng for FakeDripServer that replays fixed fault rolls, then never faults"""
+
+    def __init__(self, *rolls):
+        self.rolls = list(rolls)
+
+    def random(self):
+        return self.rolls.pop(0) if self.rolls else 1.0
+
+
+def test_token_bucket_halves_once_per_throttle_episode_and_recovers_additively():
+    clock = Clock()
+    bucket = TokenBucket(rate=20, capacity=40, min_rate=4, increase=2, clock=clock)
+
+    bucket.on_throttled(1.0)
+    assert bucket.rate == 10
+    # Another 429 from a request already in flight during the pause
+    bucket.on_throttled(1.0)
+    assert bucket.rate == 10
+
+    clock.now += 1.0
+    bucket.on_throttled(1.0)
+    assert bucket.rate == 5
+    clock.now += 1.0
+    bucket.on_throttled(1.0)
+    assert bucket.rate == 4
+
+    for _ in range(3):
+        bucket.on_success()
+    assert bucket.rate == 10
+    for _ in range(10):
+        bucket.on_success()
+    assert bucket.rate == 20
+
+
+def test_token_bucket_does_not_refill_until_retry_after_passes():
+    clock = Clock()
+    bucket = TokenBucket(rate=10, capacity=10, clock=clock)
+
+    bucket.on_throttled(2.0)
+    assert bucket.tokens == 0
+    clock.now += 1.5
+    assert bucket.tokens == 0
+    clock.now += 1.0
+    # Only the 0.5s after the pause refill, at the halved rate
+    assert bucket.tokens == 2.5
+
+
+def test_429_honors_retry_after_then_succeeds():
+    async def scenario():
+        server = FakeDripServer(initial_balance=300, throttle_rate=0.5, retry_after=0.2, rng=Rolls(0.0))
+        async with drip(server, rate_limit=10, rate_burst=10) as manager:
+            started = time.monotonic()
+            balance = await manager.get_balance(7)
+            return balance, time.monotonic() - started, manager, server
+
+    balance, elapsed, manager, server = run(scenario())
+    assert balance == 300
+    assert elapsed >= 0.2
+    assert server.stats["throttled"] == 1
+    assert manager.throttled == 1
+    # Halved by the 429, then one success added `increase` back
+    assert manager.rate_limiter.rate == 5.5
+
+
+def test_429_past_max_retries_raises_throttled_error():
+    async def scenario():
+        server = FakeDripServer(throttle_rate=1.0, retry_after=0.01)
+        async with drip(server, max_retries=2) as manager:
+            with pytest.raises(ThrottledError) as error:
+                await manager.get_balance(7)
+            return error.value, manager, server
+
+    error, manager, server = run(scenario())
+    assert error.retry_after == 0.01
+    assert server.stats["throttled"] == 3
+    assert manager.throttled == 3
+    # Throttling means the API is up
+    assert manager.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_concurrent_balance_lookups_share_one_request():
+    async def scenario():
+        server = FakeDripServer(initial_balance=250, latency=LatencyModel(mean=0.05))
+        async with drip(server, hedge_delay=None) as manager:
+            balances = await asyncio.gather(*(manager.get_balance(7, use_cache=False) for _ in range(10)))
+            return balances, manager, server
+
+    balances, manager, server = run(scenario())
+    assert balances == [250] * 10
+    assert server.stats["balance_reads"] == 1
+    assert manager.balance_fetches == 1
+    assert manager.balance_coalesced == 9
+    assert manager._balance_inflight == {}
+
+
+def test_shared_balance_lookup_failure_reaches_every_waiter():
+    async def scenario():
+        server = FakeDripServer(latency=LatencyModel(mean=0.05), error_rate=1.0)
+        async with drip(server, hedge_delay=None) as manager:
+            results = await asyncio.gather(
+                *(manager.get_balance(7, use_cache=False) for _ in range(5)), return_exceptions=True
+            )
+            # The failed lookup isn't left behind for later callers
+            assert manager._balance_inflight == {}
+            return results, server
+
+    results, server = run(scenario())
+    assert server.stats["requests"] == 1
+    assert all(isinstance(result, Exception) and "Failed to get balance" in str(result) for result in results)
+    assert len({id(result) for result in results}) == 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_lookup():
+    async def scenario():
+        server = FakeDripServer(initial_balance=250, latency=LatencyModel(mean=0.05))
+        async with drip(server, hedge_delay=None) as manager:
+            impatient = asyncio.ensure_future(manager.get_balance(7, use_cache=False))
+            patient = asyncio.ensure_future(manager.get_balance(7, use_cache=False))
+            await asyncio.sleep(0.01)
+            impatient.cancel()
+            return await patient, impatient.cancelled(), server
+
+    balance, cancelled, server = run(scenario())
+    assert balance == 250
+    assert cancelled
+    assert server.stats["balance_reads"] == 1
+
+
+def test_breaker_opens_after_consecutive_failures_and_rejects_calls():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opens == 1
+
+    clock.now += 4
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 6
+    assert breaker.rejected == 1
+    assert breaker.metrics()["retry_after"] == 6
+
+
+def test_breaker_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, clock=Clock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opens == 2
+    assert breaker.retry_after() == 10
+
+
+def test_probe_that_never_reports_back_does_not_wedge_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_server_errors_open_the_breaker_and_stop_requests():
+    async def scenario():
+        server = FakeDripServer(error_rate=1.0)
+        async with drip(server, breaker_failure_threshold=2, hedge_delay=None) as manager:
+            for _ in range(2):
+                with pytest.raises(Exception, match="Failed to get balance"):
+                    await manager.get_balance(7, use_cache=False)
+            with pytest.raises(CircuitOpenError):
+                await manager.get_balance(7, use_cache=False)
+            return manager, server
+
+    manager, server = run(scenario())
+    assert server.stats["requests"] == 2
+    assert manager.metrics()["breaker"]["state"] == CircuitBreaker.OPEN
+
+
+class Latencies:
+    """Latency model for FakeDripServer that replays fixed delays, then answers at once"""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+
+    def sample(self):
+        return self.delays.pop(0) if self.delays else 0.0
+
+
+def test_hedged_read_wins_over_a_slow_request():
+    async def scenario():
+        server = FakeDripServer(initial_balance=400, latency=Latencies(0.3))
+        async with drip(server, hedge_delay=0.05) as manager:
+            started = time.monotonic()
+            balance = await manager.get_balance(7)
+            return balance, time.monotonic() - started, manager
+
+    balance, elapsed, manager = run(scenario())
+    assert balance == 400
+    assert elapsed < 0.25
+    assert manager.hedged == 1
+    assert manager.hedge_wins == 1
+
+
+def test_hedged_read_loses_to_the_original_request():
+    async def scenario():
+        server = FakeDripServer(initial_balance=400, latency=Latencies(0.1, 0.3))
+        async with drip(server, hedge_delay=0.05) as manager:
+            started = time.monotonic()
+            balance = await manager.get_balance(7)
+            return balance, time.monotonic() - started, manager
+
+    balance, elapsed, manager = run(scenario())
+    assert balance == 400
+    assert elapsed < 0.25
+    assert manager.hedged == 1
+    assert manager.hedge_wins == 0
+
+
+def test_fast_read_is_not_hedged():
+    async def scenario():
+        async with drip(FakeDripServer(), hedge_delay=0.5) as manager:
+            await manager.get_balance(7)
+            return manager
+
+    manager = run(scenario())
+    assert manager.hedged == 0
+
+
+def test_cancelling_a_hedged_read_cancels_both_requests():
+    async def scenario():
+        server = FakeDripServer(latency=Latencies(0.3, 0.3))
+        async with drip(server, hedge_delay=0.05) as manager:
+            cancelled = []
+
+            async def call():
+                try:
+                    return await manager._fetch_balance(7)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+
+            read = asyncio.ensure_future(manager._hedged(call))
+            await asyncio.sleep(0.1)
+            read.cancel()
+            await asyncio.gather(read, return_exceptions=True)
+            await asyncio.sleep(0)
+            return cancelled, manager
+
+    cancelled, manager = run(scenario())
+    assert manager.hedged == 1
+    assert cancelled == [True, True]
+    assert manager.in_flight == 0
+
+
+def test_cancelling_before_the_hedge_fires_cancels_the_request():
+    async def scenario():
+        server = FakeDripServer(latency=Latencies(0.3))
+        async with drip(server, hedge_delay=0.2) as manager:
+            cancelled = []
+
+            async def call():
+                try:
+                    return await manager._fetch_balance(7)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+
+            read = asyncio.ensure_future(manager._hedged(call))
+            await asyncio.sleep(0.05)
+            read.cancel()
+            await asyncio.gather(read, return_exceptions=True)
+            await asyncio.sleep(0)
+            return cancelled, manager
+
+    cancelled, manager = run(scenario())
+    assert manager.hedged == 0
+    assert cancelled == [True]
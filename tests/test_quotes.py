@@ -0,0 +1,66 @@
+import datetime
+import random
+
+import pytest
+
+from cogs.economy import Prediction
+from cogs.economy.quotes import QuoteBook
+from fakes import add_market, make_economy
+
+
+def make_prediction(market_id, options):
+    end_time = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    return Prediction("Q", end_time, [f"Option {i}" for i in range(options)], creator_id=1, market_id=market_id)
+
+
+def test_batch_quotes_match_the_scalar_lmsr_prices():
+    rng = random.Random(3)
+    book = QuoteBook(capacity=2)
+    predictions = []
+    for market_id in range(40):
+        prediction = make_prediction(market_id, rng.randint(2, 7))
+        for _ in range(rng.randint(0, 30)):
+            prediction.place_bet(rng.randint(1, 5), rng.choice(prediction.options), rng.randint(1, 5000))
+        book.add(prediction)
+        predictions.append(prediction)
+
+    for points in (1, 100, 250_000):
+        for prediction, quote in zip(predictions, book.quote(predictions, points)):
+            expected = prediction.get_current_prices(points)
+            for option in prediction.options:
+                assert quote[option]['potential_shares'] == pytest.approx(expected[option]['potential_shares'], rel=1e-9)
+                assert quote[option]['price_per_share'] == pytest.approx(expected[option]['price_per_share'], rel=1e-9)
+            assert sum(price['probability'] for price in quote.values()) == pytest.approx(100)
+
+
+def test_updates_follow_trades_and_removal_keeps_other_rows():
+    book = QuoteBook()
+    first, second, third = (make_prediction(market_id, 3) for market_id in range(3))
+    for prediction in (first, second, third):
+        book.add(prediction)
+    first.place_bet(1, "Option 0", 500)
+    book.update(first)
+    third.place_bet(1, "Option 2", 200)
+    book.update(third)
+
+    book.remove(first)
+    assert len(book) == 2 and first not in book
+    # The last row moved into the freed one and still quotes its own market
+    for prediction, quote in zip((second, third), book.quote([second, third])):
+        expected = prediction.get_current_prices(100)
+        assert quote["Option 2"]['potential_shares'] == pytest.approx(expected["Option 2"]['potential_shares'])
+
+    # Markets that left the book are quoted one by one and not added back
+    quote = book.quote([first])[0]
+    assert quote["Option 0"]['potential_shares'] == pytest.approx(first.get_current_prices(100)["Option 0"]['potential_shares'])
+    book.update(first)
+    assert first not in book
+
+
+def test_markets_leave_the_book_when_betting_ends():
+    economy = make_economy({})
+    prediction = add_market(economy)
+    assert prediction in economy.quote_book
+    prediction.close()
+    economy.markets.update_status(prediction)
+    assert prediction not in economy.quote_book
@@ -0,0 +1,98 @@
+import datetime
+import random
+
+import pytest
+
+from cogs.economy import Prediction
+from cogs.economy.registry import MarketRegistry, SnowflakeGenerator
+from cogs.economy.scheduler import to_timestamp
+from cogs.economy.state import MarketState
+
+GUILD = 5
+OTHER_GUILD = 6
+
+
+def make_registry(count=200, seed=1):
+    rng = random.Random(seed)
+    transitions = []
+    registry = MarketRegistry(on_transition=lambda prediction, old, new: transitions.append((old, new)))
+    now = datetime.datetime.utcnow()
+    # Legacy markets without a guild are interleaved with the guilds' own
+    for market_id in rng.sample(range(1, 10 * count), count):
+        guild_id = rng.choice([GUILD, GUILD, OTHER_GUILD, None])
+        category = rng.choice([None, "sports", "weather", "politics"])
+        end_time = now + datetime.timedelta(minutes=rng.randrange(60, 600))
+        prediction = Prediction("Q", end_time, ["A", "B"], creator_id=1, category=category,
+                                market_id=market_id, guild_id=guild_id)
+        registry.add(prediction)
+    for prediction in list(registry):
+        roll = rng.random()
+        if roll < 0.3:
+            prediction.close()
+        elif roll < 0.5:
+            prediction.resolve("A")
+        registry.update_status(prediction)
+    return registry, transitions
+
+
+def brute_force(registry, guild_id, status):
+    return sorted(
+        (prediction for prediction in registry
+         if prediction.state == status and prediction.guild_id in (guild_id, None)),
+        key=lambda prediction: prediction.market_id
+    )
+
+
+@pytest.mark.parametrize("guild_id", [GUILD, OTHER_GUILD])
+def test_pages_match_a_full_sort(guild_id):
+    registry, _ = make_registry()
+    for status in MarketState.ALL:
+        expected = brute_force(registry, guild_id, status)
+        assert registry.count(guild_id, (status,)) == len(expected)
+        for start in range(0, len(expected) + 3):
+            for size in (1, 5, 7):
+                assert registry.page(guild_id, status, start, start + size) == expected[start:start + size]
+
+
+def test_counts_and_categories_follow_transitions():
+    registry, transitions = make_registry()
+    assert transitions
+    assert registry.count(GUILD) == sum(
+        1 for prediction in registry if prediction.guild_id in (GUILD, None)
+    )
+    for status in MarketState.ALL:
+        expected = sorted({
+            prediction.category for prediction in brute_force(registry, GUILD, status) if prediction.category
+        })
+        assert registry.categories(GUILD, (status,)) == expected
+
+
+@pytest.mark.parametrize("guild_id", [GUILD, OTHER_GUILD])
+def test_closing_soonest_matches_a_full_sort(guild_id):
+    registry, _ = make_registry()
+    for status in MarketState.ALL:
+        expected = sorted(
+            brute_force(registry, guild_id, status),
+            key=lambda prediction: (to_timestamp(prediction.end_time), prediction.market_id)
+        )
+        for limit in (1, 25, len(expected) + 1):
+            assert registry.closing_soonest(guild_id, limit, status) == expected[:limit]
+
+
+def test_query_filters_by_every_index():
+    registry, _ = make_registry()
+    matches = registry.query(guild_id=GUILD, statuses=(MarketState.OPEN,), category="sports")
+    assert matches == [
+        prediction for prediction in brute_force(registry, GUILD, MarketState.OPEN) if prediction.category == "sports"
+    ]
+
+
+def test_snowflakes_are_unique_and_time_ordered():
+    now = [1_800_000_000.0]
+    generator = SnowflakeGenerator(worker_id=3, clock=lambda: now[0])
+    ids = [generator.next_id() for _ in range(5000)]
+    now[0] -= 10  # the wall clock going backwards never reorders IDs
+    ids.append(generator.next_id())
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert (ids[0] >> 12) & 0x3FF == 3
+    assert SnowflakeGenerator.timestamp(ids[0]) == pytest.approx(now[0] + 10)
@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+
+from cogs.economy import Prediction
+from cogs.economy.accounting import Journal, escrow_account
+from cogs.economy.settlement import SettlementExecutor
+from fakes import FakePoints, add_market, make_economy
+
+
+def test_refused_writes_are_not_retried():
+    async def scenario():
+        executor = SettlementExecutor(FakePoints(), retries=3, backoff=0)
+        calls = []
+
+        async def refuse(user_id, amount):
+            calls.append(user_id)
+            return False
+
+        report = await executor.run([(10, -50)], apply=refuse)
+        return report, calls
+
+    report, calls = asyncio.run(scenario())
+    assert calls == [10]
+    assert report.failed[0].rejected and report.failed[0].attempts == 1
+
+
+def test_a_refused_stake_is_reversed_before_the_market_pays_out():
+    async def scenario():
+        # User 10 can't cover their bet on DRIP, user 20 can
+        economy = make_economy({10: 0, 20: 1000})
+        prediction = add_market(economy)
+        await economy.place_bet(10, prediction, "Yes", 300)
+        await economy.place_bet(20, prediction, "Yes", 100)
+        await economy.place_bet(20, prediction, "No", 100)
+        assert prediction.resolve("Yes")
+        economy.markets.update_status(prediction)
+        payouts = await economy.book_outcome(prediction)
+        return economy, prediction, payouts
+
+    economy, prediction, payouts = asyncio.run(scenario())
+    # Only user 20's stakes were collected, so only they are paid
+    assert payouts == {20: 200}
+    assert economy.journal.pending(10) == 0
+    assert economy.journal.balance(escrow_account(prediction.market_id)) == 0
+    assert economy.journal.unconfirmed_users(prediction.market_id) == []
+    assert economy.journal.reconcile(economy.markets)["problems"] == []
+
+
+def test_payouts_wait_while_drip_cannot_confirm_the_bets():
+    async def scenario():
+        economy = make_economy({10: 1000})
+        prediction = add_market(economy)
+        await economy.place_bet(10, prediction, "Yes", 100)
+
+        async def unavailable(*args):
+            raise asyncio.TimeoutError()
+
+        economy.points_manager.transfer_points = unavailable
+        economy.settlement.retries = 0
+        assert prediction.resolve("Yes")
+        payouts = await economy.book_outcome(prediction)
+        return economy, prediction, payouts
+
+    economy, prediction, payouts = asyncio.run(scenario())
+    assert payouts is None
+    assert not economy.journal.is_paid_out(prediction.market_id)
+    assert (prediction.market_id, "payout") in economy.scheduler
+
+
+def test_unconfirmed_bets_are_rebuilt_from_the_journal():
+    async def scenario():
+        economy = make_economy({10: 1000})
+        prediction = add_market(economy)
+        entries = []
+        economy.journal._on_entry = entries.append
+        await economy.place_bet(10, prediction, "Yes", 100)
+        await economy.net_settler.flush()
+        await economy.place_bet(10, prediction, "No", 50)
+        await economy.net_settler.flush()
+        await economy.place_bet(10, prediction, "Yes", 30)
+        await economy.place_bet(10, prediction, "No", 20)
+        return economy, prediction, entries
+
+    economy, prediction, entries = asyncio.run(scenario())
+    # Reverse the newest bet, as roll_back_bets would
+    trade = economy.journal.unconfirmed_bets(10)[-1]
+    prediction.reverse_trade(trade[1])
+    entries.append(economy.journal.record_reversal(prediction.market_id, 10, 20, trade))
+
+    restored = Journal()
+    for entry in entries:
+        restored.restore(entry)
+    restored.restore_unconfirmed(entries, {prediction.market_id: prediction})
+    # Bets after the second-to-last settlement, without the reversed one
+    assert [index for _, index in restored.unconfirmed_bets(10)] == [1, 2]
+    assert restored.unconfirmed_users(prediction.market_id) == [10]
+
+
+def test_paid_out_markets_are_not_rebuilt():
+    journal = Journal()
+    end_time = datetime.datetime.utcnow()
+    prediction = Prediction("Q", end_time, ["A", "B"], creator_id=2, market_id=7)
+    prediction.place_bet(10, "A", 100)
+    entries = [journal.record_bet(7, 10, 100), journal.record_payouts(7, {10: 100})]
+    restored = Journal()
+    for entry in entries:
+        restored.restore(entry)
+    restored.restore_unconfirmed(entries, {7: prediction})
+    assert restored.is_paid_out(7)
+    assert restored.unconfirmed_bets(10) == []
+
+
+def test_a_failed_refund_booking_is_retried():
+    async def scenario():
+        economy = make_economy({10: 1000})
+        prediction = add_market(economy)
+        await economy.place_bet(10, prediction, "Yes", 100)
+        prediction.close()
+        economy.markets.update_status(prediction)
+
+        async def broken(prediction):
+            raise RuntimeError("database is locked")
+
+        economy.book_outcome = broken
+        await economy.auto_refund(prediction)
+        return economy, prediction
+
+    economy, prediction = asyncio.run(scenario())
+    assert prediction.refunded
+    assert (prediction.market_id, "payout") in economy.scheduler
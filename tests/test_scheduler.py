@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+import time
+
+from cogs.economy.scheduler import DeadlineScheduler, to_timestamp
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_to_timestamp_treats_naive_datetimes_as_utc():
+    when = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    assert to_timestamp(when) == datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc).timestamp()
+    assert to_timestamp(5) == 5.0
+
+
+def test_deadlines_fire_in_time_order():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+
+        def record(name):
+            async def callback():
+                fired.append(name)
+            return callback
+
+        now = time.time()
+        scheduler.schedule("late", now + 0.06, record("late"))
+        scheduler.schedule("early", now + 0.02, record("early"))
+        scheduler.schedule("past", now - 1, record("past"))
+        scheduler.start()
+        await asyncio.sleep(0.15)
+        await scheduler.stop()
+        return fired, scheduler
+
+    fired, scheduler = run(scenario())
+    assert fired == ["past", "early", "late"]
+    assert len(scheduler) == 0
+    assert scheduler.fired == 3
+
+
+def test_cancel_and_reschedule_replace_the_live_entry():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+
+        async def callback():
+            fired.append(time.time())
+
+        now = time.time()
+        scheduler.schedule("cancelled", now + 0.02, callback)
+        scheduler.schedule("moved", now + 10, callback)
+        assert scheduler.cancel("cancelled")
+        assert not scheduler.cancel("cancelled")
+        assert scheduler.reschedule("moved", now + 0.03)
+        assert not scheduler.reschedule("missing", now)
+        assert scheduler.deadline("moved") == now + 0.03
+        scheduler.start()
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        return fired
+
+    assert len(run(scenario())) == 1
+
+
+def test_stale_heap_items_are_compacted():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+
+        async def callback():
+            pass
+
+        for i in range(1000):
+            scheduler.schedule("same", time.time() + 60 + i, callback)
+        return scheduler
+
+    scheduler = run(scenario())
+    assert len(scheduler) == 1
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 65
+    assert scheduler.next_deadline() == scheduler.deadline("same")
+
+
+def test_a_failing_callback_does_not_stop_the_loop():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        async def callback():
+            fired.append(True)
+
+        scheduler.schedule("broken", time.time(), broken)
+        scheduler.schedule("ok", time.time() + 0.02, callback)
+        scheduler.start()
+        await asyncio.sleep(0.08)
+        await scheduler.stop()
+        return fired, scheduler
+
+    fired, scheduler = run(scenario())
+    assert fired == [True]
+    assert scheduler.failed == 1
+
+
+def test_stop_right_after_schedule_does_not_hang():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+
+        async def callback():
+            pass
+
+        scheduler.schedule("first", time.time() + 60, callback)
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        # The wakeup and the stop land in the same tick
+        scheduler.schedule("second", time.time() + 30, callback)
+        stopping = asyncio.ensure_future(scheduler.stop())
+        done, _ = await asyncio.wait({stopping}, timeout=1)
+        if not done:
+            scheduler._task.cancel()
+            scheduler._task.cancel()
+            await asyncio.wait({stopping})
+        return scheduler, bool(done)
+
+    scheduler, stopped = run(scenario())
+    assert stopped
+    assert scheduler._task is None
+    assert len(scheduler) == 2
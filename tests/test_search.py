@@ -0,0 +1,90 @@
+import datetime
+
+from cogs.economy import Prediction
+from cogs.economy.search import MarketSearch
+from fakes import add_market, make_economy
+
+NOW = datetime.datetime(2024, 6, 1)
+
+
+def make_market(market_id, question, category=None, hours=1, guild_id=5):
+    return Prediction(question, NOW + datetime.timedelta(hours=hours), ["Yes", "No"], creator_id=2,
+                      category=category, market_id=market_id, guild_id=guild_id)
+
+
+def ids(predictions):
+    return [prediction.market_id for prediction in predictions]
+
+
+def test_every_query_word_matches_a_word_prefix():
+    search = MarketSearch()
+    search.add(make_market(1, "Will it rain in Paris?", "weather", hours=1))
+    search.add(make_market(2, "Will the Rams win the final?", "sports", hours=2))
+    search.add(make_market(3, "Rainfall above 10mm?", "weather", hours=3))
+
+    assert ids(search.search("rai")) == [1, 3]
+    assert ids(search.search("ra")) == [1, 2, 3]
+    assert ids(search.search("RAIN par")) == [1]
+    assert ids(search.search("wea")) == [1, 3]
+    # Prefixes only, not substrings
+    assert search.search("ain") == []
+    assert search.search("rain snow") == []
+    assert search.search("  ?! ") == []
+    assert search.completions("ra") == ["rain", "rainfall", "rams"]
+
+
+def test_results_are_ranked_by_key_and_limited():
+    search = MarketSearch()
+    search.add(make_market(1, "Rain on Monday?", hours=3))
+    search.add(make_market(2, "Rain on Tuesday?", hours=1))
+    search.add(make_market(3, "Rain on Wednesday?", hours=2))
+
+    assert ids(search.search("rain")) == [2, 3, 1]
+    assert ids(search.search("rain", limit=2)) == [2, 3]
+    assert ids(search.search("rain", key=lambda prediction: -prediction.market_id)) == [3, 2, 1]
+    assert ids(search.search("rain", lambda prediction: prediction.market_id != 2)) == [3, 1]
+
+
+def test_removed_markets_leave_no_words_behind():
+    search = MarketSearch()
+    first = make_market(1, "Will it snow?")
+    search.add(first)
+    search.add(make_market(2, "Will it rain?"))
+
+    search.remove(first)
+    search.remove(first)
+    assert 1 not in search
+    assert search.search("snow") == []
+    assert ids(search.search("will")) == [2]
+    assert search.completions("s") == []
+    assert search.stats()["words"] == 3
+
+
+def test_edited_market_is_found_by_its_new_question_only():
+    search = MarketSearch()
+    prediction = make_market(1, "Will it snow?")
+    search.add(prediction)
+
+    # Reindexing is remove then add, remove goes by the words stored at add time
+    prediction.question = "Will it hail?"
+    search.remove(prediction)
+    search.add(prediction)
+    assert search.search("snow") == []
+    assert ids(search.search("hail")) == [1]
+    assert len(search) == 1
+
+
+def test_resolved_markets_drop_out_of_search():
+    economy = make_economy({})
+    prediction = add_market(economy)
+    economy.search.add(prediction)
+    assert ids(economy.search.search("rain")) == [100]
+
+    prediction.close()
+    economy.markets.update_status(prediction)
+    assert ids(economy.search.search("rain")) == [100]
+
+    prediction.resolve("Yes")
+    economy.markets.update_status(prediction)
+    assert economy.search.search("rain") == []
+    assert 100 not in economy.search
@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+import sqlite3
+from types import SimpleNamespace
+
+from cogs.economy import Economy, Prediction
+from cogs.economy.accounting import Journal, escrow_account, user_account
+from cogs.economy.state import MarketState
+from cogs.economy.storage import MarketStore
+from fakes import FakePoints
+
+
+def make_prediction(market_id, end_time):
+    return Prediction("Will it rain?", end_time, ["Yes", "No"], creator_id=2, market_id=market_id, guild_id=5)
+
+
+def store_markets(path, predictions):
+    async def scenario():
+        store = MarketStore(path)
+        await store.open()
+        for prediction in predictions:
+            store.record_market(prediction)
+        await store.close()
+    asyncio.run(scenario())
+
+
+def test_markets_round_trip_with_their_state_and_trades(tmp_path):
+    path = str(tmp_path / "markets.db")
+    future = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    open_market, closed_market, resolved_market = (make_prediction(market_id, future) for market_id in (1, 2, 3))
+    open_market.place_bet(10, "Yes", 100)
+    closed_market.close()
+    resolved_market.resolve("No")
+
+    async def scenario():
+        store = MarketStore(path)
+        await store.open()
+        for prediction in (open_market, closed_market, resolved_market):
+            store.record_market(prediction)
+        store.record_trade(open_market, *open_market.ledger[-1])
+        await store.close()
+
+        store = MarketStore(path)
+        await store.open()
+        loaded = await store.load_predictions(
+            lambda market_id, question, end_time, options, creator_id, category, guild_id: Prediction(
+                question, end_time, options, creator_id, category, market_id=market_id, guild_id=guild_id
+            )
+        )
+        await store.close()
+        return {prediction.market_id: prediction for prediction in loaded}
+
+    loaded = asyncio.run(scenario())
+    assert [loaded[market_id].state for market_id in (1, 2, 3)] == [
+        MarketState.OPEN, MarketState.CLOSED, MarketState.RESOLVED
+    ]
+    assert loaded[3].result == "No"
+    assert loaded[1].get_user_total_bets(10) == 100
+    assert loaded[1].market_maker.prices() == open_market.market_maker.prices()
+
+
+def test_creators_are_reminded_of_markets_that_ended_while_offline(tmp_path, monkeypatch):
+    path = str(tmp_path / "markets.db")
+    monkeypatch.setenv("DATABASE_PATH", path)
+    past = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+    ended_offline = make_prediction(1, past)
+    already_closed = make_prediction(2, past)
+    already_closed.close()
+    store_markets(path, [ended_offline, already_closed])
+
+    async def scenario():
+        bot = SimpleNamespace(
+            points_manager=FakePoints(), user=SimpleNamespace(id=1), dispatch=lambda *args: None,
+            add_dynamic_items=lambda *items: None, remove_dynamic_items=lambda *items: None,
+        )
+        economy = Economy(bot)
+        sent = []
+        economy.notifier.send = lambda user_id, content=None, **kwargs: sent.append((user_id, kwargs.get("kind")))
+        await economy.cog_load()
+        states = {prediction.market_id: prediction.state for prediction in economy.markets}
+        await economy.cog_unload()
+        return sent, states
+
+    sent, states = asyncio.run(scenario())
+    assert states == {1: MarketState.CLOSED, 2: MarketState.CLOSED}
+    assert sent == [(2, "betting_closed")]
+    # The close was persisted, the next restart doesn't remind again
+    sent, _ = asyncio.run(scenario())
+    assert sent == []
+
+
+def test_closing_mid_commit_saves_every_queued_entry(tmp_path):
+    path = str(tmp_path / "markets.db")
+
+    async def scenario():
+        store = MarketStore(path)
+        await store.open()
+        journal = Journal(on_entry=store.record_journal_entry)
+        for user_id in range(3000):
+            journal.post("bet", [(user_account(user_id), -10), (escrow_account(1), 10)], 1)
+        store._wakeup.set()
+        while not store._committing:
+            await asyncio.sleep(0)
+        await store.close()
+
+    asyncio.run(scenario())
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM journal_entries").fetchone()[0] == 3000
+        assert db.execute("SELECT COUNT(*) FROM postings").fetchone()[0] == 6000